@@ -6,10 +6,11 @@ from flask.logging import default_handler
 from flask_wtf.csrf import CSRFProtect
 from werkzeug import Response
 
+from .database.categories import init_category_registry
 from .database.creator import sync_categorical_values
 from .database.model import db as orm_db
 from .landing_page import render_landing_page
-from .serve import get_segment_download, get_track_download
+from .serve import get_archive_download, get_segment_download, get_track_download
 from .utils.debug import initialize_flask_server_debugger_if_needed
 
 logger = logging.getLogger(__name__)
@@ -77,9 +78,43 @@ def create_app(
 
     orm_db.init_app(app)
 
+    if app.config.metrics.enabled:
+        from .metrics import init_metrics
+
+        logger.debug("Initializing metrics")
+        init_metrics(app)
+
+    if app.config.tracing.enabled:
+        from .tracing import init_tracing
+
+        logger.debug("Initializing tracing")
+        init_tracing(app)
+
+    if app.config.profiling.enabled:
+        from .profiling import init_profiling
+
+        logger.debug("Initializing request profiling")
+        init_profiling(app)
+
+    if app.config.query_budget.enabled:
+        from .query_budget import init_query_budget
+
+        logger.debug("Initializing query budget")
+        init_query_budget(app)
+
+    from .routing import init_router_cache
+
+    init_router_cache(app)
+
+    from .zones import init_zone_registry
+
+    init_zone_registry(app)
+
     if cfg.settings.EXTENSIONS:
         app.config.load_extensions()
 
+    init_category_registry(app)
+
     with app.app_context():
         orm_db.create_all()
         sync_categorical_values(orm_db)
@@ -116,6 +151,12 @@ def create_app(
 
         return send_file(data, download_name=name, as_attachment=True)  # type: ignore
 
+    @app.route("/download/archive", methods=["GET"])
+    def download_archive() -> Response:
+        return get_archive_download(
+            request.args.getlist("year", type=int), request.args.getlist("ride_type")
+        )
+
     from cycle_analytics.segments import bp as segments
 
     app.register_blueprint(segments)
@@ -156,4 +197,12 @@ def create_app(
 
     app.register_blueprint(track)
 
+    from cycle_analytics.perf import bp as perf
+
+    app.register_blueprint(perf)
+
+    from cycle_analytics.cli import cli
+
+    app.cli.add_command(cli)
+
     return app
@@ -30,6 +30,7 @@ from wtforms import (
 )
 from wtforms.validators import DataRequired, NumberRange, Optional
 
+from cycle_analytics.cache import entity_tag, invalidate_tags, year_tag
 from cycle_analytics.database.model import (
     Bike,
     DatabaseEvent,
@@ -47,6 +48,7 @@ from cycle_analytics.database.retriever import (
     get_locations,
     get_unique_model_objects_in_db,
 )
+from cycle_analytics.efforts import update_ride_efforts
 from cycle_analytics.locations import _match_location_to_tracks
 from cycle_analytics.model.base import MapData, MapPathData
 from cycle_analytics.model.goal import (
@@ -58,6 +60,7 @@ from cycle_analytics.track import _match_locations
 from cycle_analytics.utils import get_month_mapping
 from cycle_analytics.utils.base import convert_locations_to_markers, unwrap
 from cycle_analytics.utils.forms import flash_form_error, get_track_from_wtf_form
+from cycle_analytics.utils.spatial import encode_polyline
 from cycle_analytics.utils.track import init_db_track_and_enhance
 
 logger = logging.getLogger(__name__)
@@ -320,6 +323,7 @@ def add_ride() -> str | Response:
             flash("Error: %s" % e, "alert-danger")
             insert_succ = False
         else:
+            invalidate_tags(entity_tag("ride"), year_tag(ride.ride_date.year))
             flash("Ride Added", "alert-success")
             insert_succ = True
 
@@ -348,6 +352,7 @@ def add_ride() -> str | Response:
                     flash(f"{len(tracks_to_insert)} tracks added", "alert-success")
                     for track in tracks_to_insert:
                         _match_locations(track)
+                    update_ride_efforts(ride)
 
         return redirect("/overview")
 
@@ -398,12 +403,12 @@ def add_event() -> str | Response:
         track = ride.track
         if track:
             track_segment_data = track.get_track_data()
-            lats = track_segment_data[track_segment_data.moving].latitude.to_list()
-            lats = ",".join([str(l) for l in lats])  # noqa: E741
-            longs = track_segment_data[track_segment_data.moving].longitude.to_list()
-            longs = ",".join([str(l) for l in longs])  # noqa: E741
+            moving_data = track_segment_data[track_segment_data.moving]
+            path = encode_polyline(
+                moving_data.latitude.to_numpy(), moving_data.longitude.to_numpy()
+            )
 
-            map_data = MapData(paths=[MapPathData(latitudes=lats, longitudes=longs)])
+            map_data = MapData(paths=[MapPathData(path=path)])
         else:
             map_data = None
 
@@ -432,6 +437,7 @@ def add_event() -> str | Response:
         except IntegrityError as e:
             flash("Error: %s" % e, "alert-danger")
         else:
+            invalidate_tags(entity_tag("event"), year_tag(event.event_date.year))
             flash("Event Added", "alert-success")
 
     elif request.method == "POST":
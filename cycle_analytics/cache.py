@@ -1,3 +1,138 @@
+import hashlib
+import logging
+from functools import wraps
+from typing import Callable, Iterable, ParamSpec, TypeVar, cast
+from uuid import uuid4
+
 from flask_caching import Cache
 
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
 cache = Cache()
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+TAG_VERSION_PREFIX = "tag_version_"
+
+
+def ride_tag(id_ride: int) -> str:
+    return f"ride_{id_ride}"
+
+
+def track_tag(id_track: int) -> str:
+    return f"track_{id_track}"
+
+
+def year_tag(year: int) -> str:
+    return f"year_{year}"
+
+
+def entity_tag(entity: str) -> str:
+    return f"entity_{entity}"
+
+
+def _get_tag_versions(tags: list[str], create: bool) -> dict[str, None | str]:
+    """
+    Get the current version token of each tag. If create is set, tags without
+    a version (never used or evicted by the backend) get a fresh one.
+    """
+    versions: dict[str, None | str] = dict(
+        zip(tags, cache.get_many(*[TAG_VERSION_PREFIX + tag for tag in tags]))
+    )
+    if create:
+        missing = {tag: uuid4().hex for tag, v in versions.items() if v is None}
+        if missing:
+            cache.set_many(
+                {TAG_VERSION_PREFIX + tag: v for tag, v in missing.items()},
+                timeout=0,
+            )
+            versions.update(missing)
+    return versions
+
+
+def get_tag_version(tag: str) -> str:
+    """
+    Current version token of the tag. The token changes when the tag is invalidated,
+    so it can be used in cache keys of data that depends on the tagged entities.
+    """
+    version = _get_tag_versions([tag], create=True)[tag]
+    assert version is not None
+    return version
+
+
+def set_tagged(
+    key: str, value: object, tags: Iterable[str], timeout: None | int = None
+) -> bool:
+    """
+    Store a value in the cache together with the current versions of the passed
+    tags. The entry is considered stale as soon as one of the tags is invalidated.
+    """
+    versions = _get_tag_versions(list(dict.fromkeys(tags)), create=True)
+    return bool(cache.set(key, (versions, value), timeout=timeout))
+
+
+def get_tagged(key: str) -> object:
+    """
+    Get a value stored with set_tagged. Returns None if missing, stale or not stored
+    with set_tagged.
+    """
+    entry = cache.get(key)
+    if not (
+        isinstance(entry, tuple) and len(entry) == 2 and isinstance(entry[0], dict)
+    ):
+        if metrics.enabled:
+            metrics.count_cache_access(key, "miss")
+        return None
+    versions, value = entry
+    if versions and _get_tag_versions(list(versions), create=False) != versions:
+        logger.debug("Tagged entry %s is stale", key)
+        if metrics.enabled:
+            metrics.count_cache_access(key, "stale")
+        return None
+    if metrics.enabled:
+        metrics.count_cache_access(key, "hit")
+    return value
+
+
+def invalidate_tags(*tags: str) -> None:
+    """
+    Invalidate all entries tagged with any of the passed tags. This only bumps the
+    version tokens and therefore works on every backend without key scans.
+    """
+    if not tags:
+        return
+    logger.debug("Invalidating cache tags %s", tags)
+    cache.set_many({TAG_VERSION_PREFIX + tag: uuid4().hex for tag in tags}, timeout=0)
+
+
+def memoize_tagged(
+    tags: Callable[..., Iterable[str]], timeout: None | int = None
+) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """
+    Memoize a function with tagged entries. The tags callable is called with the
+    same arguments as the decorated function.
+    """
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        prefix = f"{func.__module__}.{func.__qualname__}"
+
+        @wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            arg_hash = hashlib.md5(
+                repr((args, sorted(kwargs.items()))).encode()
+            ).hexdigest()
+            key = f"{prefix}_{arg_hash}"
+            data = get_tagged(key)
+            if data is None:
+                result = func(*args, **kwargs)
+                set_tagged(key, result, tags(*args, **kwargs), timeout=timeout)
+                return result
+            logger.debug("Hit on %s", key)
+            return cast(R, data)
+
+        return wrapper
+
+    return decorator
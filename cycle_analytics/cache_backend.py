@@ -0,0 +1,295 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from uuid import uuid4
+
+from flask import Flask
+from flask_caching.backends.rediscache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LocalLRU:
+    """
+    Thread-safe LRU store that is bounded by the (serialized) size of the entries
+    instead of the number of entries.
+
+    The generation is increased by every delete and clear. Values read from another
+    store can be set with the generation from before the read, so they are dropped
+    if the key was invalidated in the meantime.
+    """
+
+    def __init__(self, max_bytes: int, default_timeout: int = 300) -> None:
+        self.max_bytes = max_bytes
+        self.default_timeout = default_timeout
+        self.current_bytes = 0
+        self.generation = 0
+        self._entries: OrderedDict[str, tuple[float, int, object]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> object:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, size, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(
+        self,
+        key: str,
+        value: object,
+        size: int,
+        timeout: None | int = None,
+        generation: None | int = None,
+    ) -> None:
+        if size > self.max_bytes:
+            self.delete(key)
+            return
+        timeout = (
+            self.default_timeout if not timeout else min(timeout, self.default_timeout)
+        )
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + timeout, size, value)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self.generation += 1
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+
+class TwoTierCache(RedisCache):
+    """
+    Redis cache with a size-bounded in-process LRU in front of it. Writes and
+    deletes are published on a redis channel so the local tiers of all other
+    processes drop the affected keys.
+
+    Values served from the local tier are shared between requests of the same
+    process and must not be modified.
+
+    Set cache_type to cycle_analytics.cache_backend.TwoTierCache and configure the
+    local tier with CACHE_LOCAL_MAX_BYTES and CACHE_LOCAL_TIMEOUT. Redis is
+    configured with the regular CACHE_REDIS_* settings.
+    """
+
+    def __init__(
+        self,
+        local_max_bytes: int = 64 * 1024 * 1024,
+        local_timeout: int = 300,
+        channel: str = "cycle_analytics_cache_invalidation",
+        **kwargs: object,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.local = LocalLRU(local_max_bytes, local_timeout)
+        self.channel = channel
+        self._instance_id = uuid4().hex
+        self._listener_pid: None | int = None
+        self._listener: None | threading.Thread = None
+        self._listener_lock = threading.Lock()
+
+    @classmethod
+    def factory(
+        cls: type["TwoTierCache"], app: Flask, config: dict, args: list, kwargs: dict
+    ) -> "TwoTierCache":
+        kwargs.update(
+            dict(
+                local_max_bytes=int(
+                    config.get("CACHE_LOCAL_MAX_BYTES", 64 * 1024 * 1024)
+                ),
+                local_timeout=int(config.get("CACHE_LOCAL_TIMEOUT", 300)),
+            )
+        )
+        channel = config.get("CACHE_INVALIDATION_CHANNEL")
+        if channel:
+            kwargs["channel"] = channel
+        return super().factory(app, config, args, kwargs)  # type: ignore
+
+    def _ensure_listener(self) -> None:
+        """
+        Start the pub/sub listener thread. This is done lazily and again after a
+        fork (e.g. gunicorn workers) because threads do not survive it.
+        """
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._listener_lock:
+            if self._listener_pid == pid:
+                return
+            self.local.clear()
+            try:
+                pubsub = self._read_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{self.channel: self._handle_message})
+                self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True)
+            except Exception as e:
+                logger.error("Could not subscribe to %s: %s", self.channel, e)
+                self._listener = None
+            self._listener_pid = pid
+
+    def _handle_message(self, message: dict) -> None:
+        data = message["data"]
+        if isinstance(data, bytes):
+            data = data.decode()
+        sender, _, key = data.partition(":")
+        if sender == self._instance_id:
+            return
+        if key == "*":
+            self.local.clear()
+        else:
+            self.local.delete(key)
+
+    def _publish(self, *keys: str) -> None:
+        for key in keys:
+            self.local.delete(key)
+        # Published even if the listener of this process failed, the other
+        # processes may still be subscribed
+        pipe = self._write_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.publish(self.channel, f"{self._instance_id}:{key}")
+        pipe.execute()
+
+    def get(self, key: str) -> object:
+        self._ensure_listener()
+        value = self.local.get(key)
+        if value is not _MISSING:
+            return value
+        generation = self.local.generation
+        raw = self._read_client.get(f"{self._get_prefix()}{key}")
+        if raw is None:
+            return None
+        value = self.serializer.loads(raw)
+        self.local.set(key, value, len(raw), generation=generation)
+        return value
+
+    def get_many(self, *keys: str) -> list[object]:
+        self._ensure_listener()
+        values = [self.local.get(key) for key in keys]
+        missing = [key for key, value in zip(keys, values) if value is _MISSING]
+        if missing:
+            generation = self.local.generation
+            raws = self._read_client.mget(
+                [f"{self._get_prefix()}{key}" for key in missing]
+            )
+            fetched: dict[str, object] = {}
+            for key, raw in zip(missing, raws):
+                if raw is None:
+                    fetched[key] = None
+                    continue
+                fetched[key] = self.serializer.loads(raw)
+                self.local.set(key, fetched[key], len(raw), generation=generation)
+            values = [
+                fetched[key] if value is _MISSING else value
+                for key, value in zip(keys, values)
+            ]
+        return values
+
+    def has(self, key: str) -> bool:
+        self._ensure_listener()
+        if self.local.get(key) is not _MISSING:
+            return True
+        return super().has(key)
+
+    def set(self, key: str, value: object, timeout: None | int = None) -> bool:
+        self._ensure_listener()
+        timeout = self._normalize_timeout(timeout)
+        dump = self.serializer.dumps(value)
+        name = f"{self._get_prefix()}{key}"
+        if timeout == -1:
+            result = self._write_client.set(name=name, value=dump)
+        else:
+            result = self._write_client.setex(name=name, value=dump, time=timeout)
+        self._publish(key)
+        if result:
+            self.local.set(key, value, len(dump), None if timeout == -1 else timeout)
+        return bool(result)
+
+    def set_many(
+        self, mapping: dict[str, object], timeout: None | int = None
+    ) -> list[str]:
+        self._ensure_listener()
+        timeout = self._normalize_timeout(timeout)
+        dumps = {key: self.serializer.dumps(value) for key, value in mapping.items()}
+        pipe = self._write_client.pipeline(transaction=False)
+        for key, dump in dumps.items():
+            name = f"{self._get_prefix()}{key}"
+            if timeout == -1:
+                pipe.set(name=name, value=dump)
+            else:
+                pipe.setex(name=name, value=dump, time=timeout)
+        results = pipe.execute()
+        self._publish(*mapping.keys())
+        set_keys = [k for k, was_set in zip(mapping.keys(), results) if was_set]
+        for key in set_keys:
+            self.local.set(
+                key,
+                mapping[key],
+                len(dumps[key]),
+                None if timeout == -1 else timeout,
+            )
+        return set_keys
+
+    def add(self, key: str, value: object, timeout: None | int = None) -> bool:
+        self._ensure_listener()
+        created = super().add(key, value, timeout)
+        if created:
+            self._publish(key)
+        return created
+
+    def delete(self, key: str) -> bool:
+        self._ensure_listener()
+        result = super().delete(key)
+        self._publish(key)
+        return result
+
+    def delete_many(self, *keys: str) -> list[str]:
+        self._ensure_listener()
+        result = super().delete_many(*keys)
+        self._publish(*keys)
+        return result
+
+    def clear(self) -> bool:
+        self._ensure_listener()
+        result = super().clear()
+        self._publish("*")
+        self.local.clear()
+        return result
+
+    def inc(self, key: str, delta: int = 1) -> int:
+        self._ensure_listener()
+        result = super().inc(key, delta)
+        self._publish(key)
+        return result
+
+    def dec(self, key: str, delta: int = 1) -> int:
+        self._ensure_listener()
+        result = super().dec(key, delta)
+        self._publish(key)
+        return result
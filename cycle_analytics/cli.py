@@ -0,0 +1,221 @@
+import logging
+import os
+import time
+from typing import Literal
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import select
+
+from .database.model import Bike, TerrainType
+from .database.model import db as orm_db
+
+logger = logging.getLogger(__name__)
+
+cli = AppGroup("cycle-analytics", help="Maintenance commands for CycleAnalytics")
+
+
+@cli.command("import")
+@click.argument("source", type=click.Path(exists=True))
+@click.option("--bike", "bike_name", help="Name of the bike. Defaults to defaults.bike")
+@click.option(
+    "--ride-type", help="Terrain type of the rides. Defaults to defaults.ride_type"
+)
+@click.option("--workers", type=int, default=None, help="Number of processes")
+@click.option("--batch-size", type=int, default=50, show_default=True)
+@click.option("--match-locations/--no-match-locations", default=True, show_default=True)
+def import_command(
+    source: str,
+    bike_name: None | str,
+    ride_type: None | str,
+    workers: None | int,
+    batch_size: int,
+    match_locations: bool,
+) -> None:
+    """Import all GPX and FIT files in SOURCE (directory or zip archive) as rides"""
+    from .importer import import_tracks
+
+    config = current_app.config
+    bike_name = bike_name or config.defaults.bike
+    ride_type = ride_type or config.defaults.ride_type
+    bike = orm_db.session.scalars(select(Bike).filter(Bike.name == bike_name)).first()
+    if bike is None:
+        raise click.ClickException(f"No bike with name {bike_name}")
+    terrain_type = orm_db.session.scalars(
+        select(TerrainType).filter(TerrainType.text == ride_type)
+    ).first()
+    if terrain_type is None:
+        raise click.ClickException(f"No ride type {ride_type}")
+
+    result = import_tracks(
+        source,
+        bike,
+        terrain_type,
+        extensions=config.ALLOWED_TRACK_EXTENSIONS,
+        workers=workers,
+        batch_size=batch_size,
+        max_distance=config.matching.distance if match_locations else None,
+    )
+
+    click.echo(
+        f"Imported {len(result.imported)} rides, skipped {len(result.duplicates)} "
+        f"duplicates, {len(result.failed)} failed"
+    )
+    for file_name, error in result.failed:
+        click.echo(f"  {file_name}: {error}", err=True)
+
+
+@cli.command("export")
+@click.argument("output", type=click.Path(dir_okay=False, writable=True))
+@click.option("--year", "years", type=int, multiple=True, help="Defaults to all years")
+@click.option("--ride-type", "ride_types", multiple=True, help="Defaults to all")
+@click.option("--batch-size", type=int, default=20, show_default=True)
+def export_command(
+    output: str, years: tuple[int, ...], ride_types: tuple[str, ...], batch_size: int
+) -> None:
+    """Export the rides as zip archive with GPX files and a CSV manifest to OUTPUT"""
+    from .exporter import iter_export_archive
+
+    n_bytes = 0
+    with open(output, "wb") as f:
+        for chunk in iter_export_archive(
+            list(years) if years else "All",
+            list(ride_types) if ride_types else "Any",
+            batch_size=batch_size,
+        ):
+            f.write(chunk)
+            n_bytes += len(chunk)
+
+    click.echo(f"Wrote {n_bytes / 1024 / 1024:.1f} MB to {output}")
+
+
+@cli.command("recompute-overviews")
+@click.option("--year", "years", type=int, multiple=True, help="Only rides of year")
+@click.option("--track-id", "track_ids", type=int, multiple=True)
+@click.option("--workers", type=int, default=None, help="Number of processes")
+@click.option("--batch-size", type=int, default=50, show_default=True)
+@click.option("--dry-run", is_flag=True, help="Only report the changes")
+@click.option(
+    "--checkpoint",
+    "checkpoint_path",
+    type=click.Path(dir_okay=False),
+    help="Defaults to recompute_overviews.json in the instance folder",
+)
+@click.option("--restart", is_flag=True, help="Ignore an existing checkpoint")
+def recompute_overviews_command(
+    years: tuple[int, ...],
+    track_ids: tuple[int, ...],
+    workers: None | int,
+    batch_size: int,
+    dry_run: bool,
+    checkpoint_path: None | str,
+    restart: bool,
+) -> None:
+    """Recompute the overviews of all tracks and update the changed values"""
+    from .recompute import (
+        CheckpointMismatchError,
+        RecomputeResult,
+        get_track_ids,
+        recompute_overviews,
+    )
+
+    if checkpoint_path is None:
+        os.makedirs(current_app.instance_path, exist_ok=True)
+        checkpoint_path = os.path.join(
+            current_app.instance_path, "recompute_overviews.json"
+        )
+    if restart and os.path.isfile(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    ids = get_track_ids(list(years), list(track_ids))
+
+    def _progress(result: RecomputeResult) -> None:
+        click.echo(
+            f"{result.processed}/{len(ids)} tracks "
+            f"({result.tracks_per_second:.1f} tracks/s), "
+            f"{result.changed_tracks} changed"
+        )
+
+    try:
+        result = recompute_overviews(
+            ids,
+            checkpoint_path=None if dry_run else checkpoint_path,
+            workers=workers,
+            batch_size=batch_size,
+            dry_run=dry_run,
+            progress=_progress,
+            selection=dict(years=sorted(years), track_ids=sorted(track_ids)),
+        )
+    except CheckpointMismatchError as e:
+        raise click.ClickException(f"{e}. Pass --restart to ignore it") from e
+
+    click.echo(
+        f"{'Would update' if dry_run else 'Updated'} {result.changed_tracks} of "
+        f"{result.processed} tracks ({result.updated} updated, {result.inserted} "
+        f"inserted, {result.deleted} deleted overviews) in {result.duration:.1f}s: "
+        f"{result.tracks_per_second:.1f} tracks/s"
+    )
+    if result.failed:
+        click.echo(f"Failed tracks: {result.failed}", err=True)
+
+
+@cli.command("backfill-efforts")
+@click.option("--ride-id", "ride_ids", type=int, multiple=True)
+@click.option("--segment-id", "segment_ids", type=int, multiple=True)
+@click.option("--workers", type=int, default=None, help="Number of processes")
+@click.option("--batch-size", type=int, default=50, show_default=True)
+def backfill_efforts_command(
+    ride_ids: tuple[int, ...],
+    segment_ids: tuple[int, ...],
+    workers: None | int,
+    batch_size: int,
+) -> None:
+    """Detect the segment efforts in all rides and replace the stored efforts"""
+    from .efforts import BackfillResult, backfill_efforts
+
+    def _progress(result: BackfillResult) -> None:
+        click.echo(
+            f"{result.processed} rides ({result.rides_per_second:.1f} rides/s), "
+            f"{result.efforts} efforts"
+        )
+
+    result = backfill_efforts(
+        list(ride_ids),
+        list(segment_ids),
+        workers=workers,
+        batch_size=batch_size,
+        progress=_progress,
+    )
+
+    click.echo(
+        f"Found {result.efforts} efforts in {result.processed} rides in "
+        f"{result.duration:.1f}s: {result.rides_per_second:.1f} rides/s"
+    )
+    if result.failed:
+        click.echo(f"Failed rides: {result.failed}", err=True)
+
+
+@cli.command("compile-graph")
+@click.argument("osm_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("output", type=click.Path(dir_okay=False, writable=True))
+@click.option(
+    "--file-type",
+    type=click.Choice(["xml", "gz", "bz2", "pbf"]),
+    help="Derived from the file name by default",
+)
+def compile_graph_command(
+    osm_file: str, output: str, file_type: None | Literal["xml", "gz", "bz2", "pbf"]
+) -> None:
+    """Compile the OSM extract OSM_FILE into a routing graph file OUTPUT"""
+    from .routing_graph import compile_graph
+
+    start = time.perf_counter()
+    info = compile_graph(
+        osm_file, output, list(current_app.config.routing.access), file_type
+    )
+    click.echo(
+        f"Compiled {info.n_nodes} nodes and {info.n_edges} edges in "
+        f"{time.perf_counter() - start:.1f}s. Set routing_cache.graph_file to "
+        f"{output} to use it"
+    )
@@ -0,0 +1,109 @@
+"""
+Process wide registry of the categorical values (terrain types, event types, ...).
+The tables only change when sync_categorical_values adds the configured values, so
+the values are loaded once and lookups do not query the database.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass, field
+
+from flask import Flask, current_app
+from sqlalchemy import select
+
+from .model import (
+    CategoryModelType,
+    Difficulty,
+    EventType,
+    Material,
+    SegmentType,
+    Severity,
+    TerrainType,
+    TypeSpecification,
+)
+from .model import db as orm_db
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "category_registry"
+
+# CategoryModelType is the union of the category model classes
+CATEGORY_MODELS: tuple[CategoryModelType, ...] = (
+    TerrainType,
+    TypeSpecification,
+    Material,
+    EventType,
+    Severity,
+    SegmentType,
+    Difficulty,
+)
+
+
+@dataclass
+class CategoryValues:
+    # Ordered by id
+    ids: dict[str, int] = field(default_factory=dict)
+    texts: dict[int, str] = field(default_factory=dict)
+
+
+class CategoryRegistry:
+    def __init__(self) -> None:
+        self._values: dict[CategoryModelType, CategoryValues] = {}
+        self._lock = threading.Lock()
+
+    def load(self, *category_model_types: CategoryModelType) -> None:
+        """Load the values of the passed tables or of all tables if none are passed"""
+        for category_model_type in category_model_types or CATEGORY_MODELS:
+            rows = orm_db.session.execute(
+                select(category_model_type.id, category_model_type.text).order_by(
+                    category_model_type.id
+                )
+            ).all()
+            values = CategoryValues(
+                ids={text: id for id, text in rows},
+                texts={id: text for id, text in rows},
+            )
+            with self._lock:
+                self._values[category_model_type] = values
+            logger.debug(
+                "Loaded %s values of %s", len(rows), category_model_type.__name__
+            )
+
+    def _get(self, category_model_type: CategoryModelType) -> CategoryValues:
+        values = self._values.get(category_model_type)
+        if values is None:
+            self.load(category_model_type)
+            values = self._values[category_model_type]
+        return values
+
+    def get_texts(self, category_model_type: CategoryModelType) -> list[str]:
+        return list(self._get(category_model_type).ids)
+
+    def get_id(self, category_model_type: CategoryModelType, text: str) -> None | int:
+        return self._get(category_model_type).ids.get(text)
+
+    def get_text(self, category_model_type: CategoryModelType, id: int) -> None | str:
+        return self._get(category_model_type).texts.get(id)
+
+    def get_ids(
+        self, category_model_type: CategoryModelType, texts: list[str]
+    ) -> list[int]:
+        """Ids of the passed values that exist, ordered by id"""
+        ids = self._get(category_model_type).ids
+        if any(text not in ids for text in texts):
+            # The value could have been added by another process
+            self.load(category_model_type)
+            ids = self._get(category_model_type).ids
+        return sorted(ids[text] for text in set(texts) if text in ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+def init_category_registry(app: Flask) -> None:
+    app.extensions[EXTENSION_KEY] = CategoryRegistry()
+
+
+def get_category_registry() -> CategoryRegistry:
+    return current_app.extensions[EXTENSION_KEY]
@@ -1,7 +1,7 @@
 import logging
 from copy import deepcopy
 from dataclasses import asdict
-from typing import Literal, Type
+from typing import Any, Literal, Sequence, Type
 
 import pandas as pd
 from geo_track_analyzer import Track
@@ -18,50 +18,102 @@ from .model import (
 
 logger = logging.getLogger(__name__)
 
+month_labels = {
+    1: "Jan",
+    2: "Feb",
+    3: "Mar",
+    4: "Apr",
+    5: "Mai",
+    6: "Jun",
+    7: "Jul",
+    8: "Aug",
+    9: "Sep",
+    10: "Oct",
+    11: "Nov",
+    12: "Dec",
+}
+
+ride_columns = [
+    "id_ride",
+    "ride_type",
+    "date",
+    "distance",
+    "total_time",
+    "ride_time",
+    "bike",
+]
+
+overview_columns = [
+    "moving_time_seconds",
+    "total_time_seconds",
+    "moving_distance",
+    "total_distance",
+    "max_velocity",
+    "avg_velocity",
+    "max_elevation",
+    "min_elevation",
+    "uphill_elevation",
+    "downhill_elevation",
+    "moving_distance_km",
+    "total_distance_km",
+    "max_velocity_kmh",
+    "avg_velocity_kmh",
+    "bounds_min_lat",
+    "bounds_max_lat",
+    "bounds_min_lng",
+    "bounds_max_lng",
+]
+
+
+def add_year_and_month_columns(data: pd.DataFrame) -> pd.DataFrame:
+    """Add *year* and *month* (as label) columns derived from the *date* column"""
+    if not data.empty:
+        dates = pd.to_datetime(data["date"])
+        data["year"] = dates.dt.year
+        data["month"] = dates.dt.month.map(month_labels)
+
+    return data
+
+
+def convert_ride_rows_to_df(rows: Sequence[Sequence[Any]]) -> pd.DataFrame:
+    """
+    Convert rows from a joined ride/overview query to the same dataframe as
+    returned by convert_rides_to_df. The rows are expected to contain the
+    columns from *ride_columns*, the id of the overview, and the columns in
+    *overview_columns* (in that order).
+
+    :param rows: Result rows of the query
+    :return: Dataframe with one row per ride
+    """
+    data = pd.DataFrame.from_records(
+        rows, columns=[*ride_columns, "id_overview", *overview_columns]
+    )
+    if data.empty:
+        return data.drop(columns="id_overview")
+
+    no_overview = data.id_overview.isna()
+    data = data.drop(columns="id_overview").astype(
+        {c: object for c in overview_columns}
+    )
+    data.loc[no_overview, "total_time_seconds"] = pd.to_timedelta(
+        data.loc[no_overview, "total_time"]
+    ).dt.seconds
+    with_ride_duration = no_overview & data.ride_time.notna()
+    data.loc[with_ride_duration, "moving_time_seconds"] = pd.to_timedelta(
+        data.loc[with_ride_duration, "ride_time"]
+    ).dt.seconds
+    data = data.infer_objects()
+
+    return add_year_and_month_columns(data)
 
-def convert_rides_to_df(rides: list[Ride]) -> pd.DataFrame:
-    data = {
-        "id_ride": [],
-        "ride_type": [],
-        "date": [],
-        "distance": [],
-        "total_time": [],
-        "ride_time": [],
-        "bike": [],
-        "moving_time_seconds": [],
-        "total_time_seconds": [],
-        "moving_distance": [],
-        "total_distance": [],
-        "max_velocity": [],
-        "avg_velocity": [],
-        "max_elevation": [],
-        "min_elevation": [],
-        "uphill_elevation": [],
-        "downhill_elevation": [],
-        "moving_distance_km": [],
-        "total_distance_km": [],
-        "max_velocity_kmh": [],
-        "avg_velocity_kmh": [],
-        "bounds_min_lat": [],
-        "bounds_max_lat": [],
-        "bounds_min_lng": [],
-        "bounds_max_lng": [],
-    }
-    month_labels = {
-        1: "Jan",
-        2: "Feb",
-        3: "Mar",
-        4: "Apr",
-        5: "Mai",
-        6: "Jun",
-        7: "Jul",
-        8: "Aug",
-        9: "Sep",
-        10: "Oct",
-        11: "Nov",
-        12: "Dec",
-    }
 
+def convert_rides_to_df(rides: list[Ride]) -> pd.DataFrame:
+    """
+    Convert already loaded rides. This loads the track overview of each ride
+    separately, use get_rides_df_in_timeframe to load the rides of a timeframe with
+    a single query.
+    """
+    data: dict[str, list] = {key: [] for key in [*ride_columns, *overview_columns]}
     for ride in rides:
         data["id_ride"].append(ride.id)
         data["date"].append(ride.ride_date)
@@ -69,26 +121,13 @@ def convert_rides_to_df(rides: list[Ride]) -> pd.DataFrame:
         data["ride_type"].append(ride.terrain_type.text)
         data["total_time"].append(ride.total_duration)
         data["ride_time"].append(ride.ride_duration)
-        data["bike"].append(ride.bike.name)
+        data["bike"].append(None if ride.id_bike is None else ride.bike.name)
         try:
             overview = ride.track_overview
         except RuntimeError:
             overview = None
 
-        for key in [
-            key
-            for key in data
-            if key
-            not in [
-                "distance",
-                "date",
-                "id_ride",
-                "ride_type",
-                "total_time",
-                "ride_time",
-                "bike",
-            ]
-        ]:
+        for key in overview_columns:
             if overview is None:
                 if key == "total_time_seconds":
                     data[key].append(ride.total_duration.seconds)
@@ -99,12 +138,7 @@ def convert_rides_to_df(rides: list[Ride]) -> pd.DataFrame:
             else:
                 data[key].append(getattr(overview, key))
 
-    data_df = pd.DataFrame(data)
-    if not data_df.empty:
-        data_df["year"] = data_df.apply(lambda r: r.date.year, axis=1)
-        data_df["month"] = data_df.apply(lambda r: month_labels[r.date.month], axis=1)
-
-    return data_df
+    return add_year_and_month_columns(pd.DataFrame(data))
 
 
 def summarize_rides_in_year(data: pd.DataFrame) -> list[tuple[str, str]]:
@@ -326,3 +360,60 @@ def convert_ride_overview_container_to_df(
         data_dict["avg_velocity"].append(row.overview_avg_vel)
 
     return pd.DataFrame(data_dict)
+
+
+def convert_ride_overview_rows_to_frame(
+    rows: Sequence[Sequence[Any]],
+) -> pd.DataFrame:
+    """
+    Convert the rows returned by get_ride_with_latest_track_id to a dataframe with
+    one column per RideOverviewContainer field. The columns are validated and
+    coerced once for the whole batch instead of building a model per row.
+
+    :param rows: Result rows of the query
+    :return: Dataframe with the RideOverviewContainer fields as columns
+    """
+    frame = pd.DataFrame.from_records(
+        rows, columns=list(RideOverviewContainer.model_fields)
+    )
+
+    frame["id_ride"] = frame.id_ride.astype(int)
+    frame["ride_date"] = pd.to_datetime(frame.ride_date)
+    frame["ride_duration"] = pd.to_timedelta(frame.ride_duration)
+    frame["total_duration"] = pd.to_timedelta(frame.total_duration)
+    for column in [
+        "distance_raw",
+        "overview_distance",
+        "overview_avg_vel",
+        "overview_uphill",
+        "overview_downhill",
+    ]:
+        frame[column] = frame[column].astype(float)
+    if frame.total_duration.isna().any():
+        raise ValueError("total_duration is required for all rides")
+
+    return frame
+
+
+def convert_ride_overview_frame_to_df(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    Vectorized version of convert_ride_overview_container_to_df operating on the
+    output of convert_ride_overview_rows_to_frame.
+    """
+    total_time = frame.total_duration.dt.total_seconds()
+    return pd.DataFrame(
+        {
+            "id_ride": frame.id_ride,
+            "date": frame.ride_date.dt.date,
+            "year": frame.ride_date.dt.year,
+            "month": frame.ride_date.dt.month,
+            "distance": frame.distance_raw,
+            "ride_time": frame.ride_duration.dt.total_seconds().fillna(total_time),
+            "total_time": total_time,
+            "ride_type": frame.terrain_type,
+            "bike": frame.bike,
+            "uphill": frame.overview_uphill.fillna(0),
+            "downhill": frame.overview_downhill.fillna(0),
+            "avg_velocity": frame.overview_avg_vel,
+        }
+    )
@@ -4,6 +4,7 @@ from flask import current_app
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import select
 
+from .categories import EXTENSION_KEY
 from .model import (
     CategoryModelType,
     Difficulty,
@@ -45,3 +46,6 @@ def sync_categorical_values(database: SQLAlchemy) -> None:
     _sync_categorical_values(
         database, values_to_sync["type_secification"], TypeSpecification
     )
+    registry = current_app.extensions.get(EXTENSION_KEY)
+    if registry is not None:
+        registry.load()
@@ -13,7 +13,8 @@ from sqlalchemy.orm import (
     relationship,
 )
 
-from ..cache import cache
+from ..cache import get_tagged, ride_tag, set_tagged, track_tag
+from .serialization import SerializationError, deserialize_track, serialize_track
 
 logger = logging.getLogger(__name__)
 
@@ -340,15 +341,25 @@ class Ride(Base):
         if not track:
             return None
 
-        key = f"bytetrack_for_ride_{track.id}"
-        data = cache.get(key)
-        if data is None:
-            byte_track = ByteTrack(track.content)
-            cache.set(key, byte_track, timeout=60 * 60 * 24)
-            return byte_track
-        else:
-            logger.debug("Hit on %s. Returning cached ByteTrack", key)
-            return data
+        key = f"track_for_ride_{track.id}"
+        data = get_tagged(key)
+        if isinstance(data, bytes):
+            try:
+                compact_track = deserialize_track(data)
+            except SerializationError as e:
+                logger.warning("Ignoring cached track %s: %s", key, e)
+            else:
+                logger.debug("Hit on %s. Returning cached track", key)
+                return compact_track
+
+        byte_track = ByteTrack(track.content)
+        set_tagged(
+            key,
+            serialize_track(byte_track),
+            [ride_tag(self.id), track_tag(track.id)],
+            timeout=60 * 60 * 24,
+        )
+        return byte_track
 
     @property
     def track_overview(self) -> None | TrackOverview:
@@ -390,16 +401,23 @@ class Ride(Base):
     # Property for nicer access to latest track
     @property
     def database_track(self) -> None | DatabaseTrack:
-        key = f"database_track_for_ride_{self.id}"
-        data = cache.get(key)
-        if data is None:
-            latest_track = self.get_latest_track()
-            if latest_track is not None:
-                cache.set(key, latest_track, timeout=60 * 60 * 24)
-            return latest_track
-        else:
-            logger.debug("Hit on %s. Returning cached DatabaseTrack", key)
-            return data
+        key = f"latest_track_id_for_ride_{self.id}"
+        id_track = get_tagged(key)
+        if isinstance(id_track, int):
+            logger.debug("Hit on %s. Loading track %s", key, id_track)
+            cached_track = db.session.get(DatabaseTrack, id_track)
+            if cached_track is not None:
+                return cached_track
+
+        latest_track = self.get_latest_track()
+        if latest_track is not None:
+            set_tagged(
+                key,
+                latest_track.id,
+                [ride_tag(self.id), track_tag(latest_track.id)],
+                timeout=60 * 60 * 24,
+            )
+        return latest_track
 
 
 class DatabaseGoal(Base):
@@ -493,6 +511,80 @@ class DatabaseZoneInterval(Base):
     color: Mapped[Optional[str]] = mapped_column(db.String, nullable=True)
 
 
+class TrackImport(Base):
+    """Content hashes of the files imported with the import command"""
+
+    __tablename__: str = "track_import"
+
+    content_hash: Mapped[str] = mapped_column(db.String(64), primary_key=True)
+    ride_id: Mapped[int] = mapped_column(
+        db.Integer, db.ForeignKey("ride.id"), nullable=False
+    )
+    file_name: Mapped[str] = mapped_column(db.String, nullable=False)
+    imported: Mapped[datetime] = mapped_column(db.DateTime(timezone=True))
+
+
+class SegmentEffort(Base):
+    """Traversal of a segment in the latest track of a ride"""
+
+    __tablename__: str = "segment_effort"
+
+    id: Mapped[int] = mapped_column(
+        db.Integer, primary_key=True, autoincrement=True, init=False
+    )
+    id_segment: Mapped[int] = mapped_column(
+        db.Integer,
+        db.ForeignKey("segment.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    id_ride: Mapped[int] = mapped_column(
+        db.Integer,
+        db.ForeignKey("ride.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    # Efforts of a deleted track are kept until update_ride_efforts replaces them,
+    # so the leaderboards of their segments are rebuilt
+    id_track: Mapped[Optional[int]] = mapped_column(
+        db.Integer,
+        db.ForeignKey("track.id", ondelete="SET NULL"),
+        nullable=True,
+        index=True,
+    )
+    # Indices of the first and last point of the traversal in the track
+    start_idx: Mapped[int] = mapped_column(db.Integer, nullable=False)
+    end_idx: Mapped[int] = mapped_column(db.Integer, nullable=False)
+    distance: Mapped[float] = mapped_column(db.Float, nullable=False)
+    # Not set for tracks without timestamps
+    elapsed_time_seconds: Mapped[Optional[float]] = mapped_column(
+        db.Float, default=None
+    )
+    avg_velocity_kmh: Mapped[Optional[float]] = mapped_column(db.Float, default=None)
+
+
+class SegmentLeaderboard(Base):
+    """
+    Precomputed rankings of the efforts of a segment. Filtered leaderboards exist per
+    bike and terrain type, 0 is used for all bikes or terrain types.
+    """
+
+    __tablename__: str = "segment_leaderboard"
+
+    id_segment: Mapped[int] = mapped_column(
+        db.Integer,
+        db.ForeignKey("segment.id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    id_bike: Mapped[int] = mapped_column(db.Integer, primary_key=True)
+    id_terrain_type: Mapped[int] = mapped_column(db.Integer, primary_key=True)
+    n_efforts: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+    # Lists of serialized LeaderboardEntry objects
+    best: Mapped[list] = mapped_column(db.JSON, nullable=False, default_factory=list)
+    recent: Mapped[list] = mapped_column(db.JSON, nullable=False, default_factory=list)
+    history: Mapped[list] = mapped_column(db.JSON, nullable=False, default_factory=list)
+
+
 # @dataclass
 # class TrackThumbnail(Base):
 #     __tablename__: str = "track_thumbnails"
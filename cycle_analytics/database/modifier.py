@@ -5,6 +5,7 @@ from typing import Literal
 from geo_track_analyzer.model import Zones
 from sqlalchemy import select
 
+from ..cache import entity_tag, invalidate_tags, track_tag
 from ..model.goal import AggregationType
 from .model import (
     DatabaseGoal,
@@ -112,6 +113,7 @@ def update_zones(zones: Zones, metric: str) -> bool:
     orm_db.session.add_all(new_zones)
 
     orm_db.session.commit()
+    invalidate_tags(entity_tag("zones"))
     return True
 
 
@@ -128,6 +130,7 @@ def update_track_content(id_track: int, new_content: bytes) -> bool:
         logger.error("Cannot convert %s to binary", new_content)
         return False
 
+    invalidate_tags(track_tag(id_track))
     return True
 
 
@@ -137,5 +140,6 @@ def update_track_overview(id_track: int, new_overviews: list[TrackOverview]) ->
         orm_db.session.delete(overview)
     orm_db.session.add_all(new_overviews)
     orm_db.session.commit()
+    invalidate_tags(track_tag(id_track))
 
     return True
@@ -8,9 +8,23 @@ from geo_track_analyzer.model import ZoneInterval
 from geo_track_analyzer.track import Zones
 from sqlalchemy import and_, desc, distinct, extract, func, not_, or_, select, text
 from sqlalchemy.exc import OperationalError
-
-from ..cache import cache
-from ..database.converter import convert_database_goals
+from sqlalchemy.sql.expression import Subquery
+
+from ..cache import (
+    cache,
+    entity_tag,
+    get_tagged,
+    memoize_tagged,
+    set_tagged,
+    track_tag,
+    year_tag,
+)
+from ..database.converter import (
+    convert_database_goals,
+    convert_ride_overview_rows_to_frame,
+    convert_ride_rows_to_df,
+    overview_columns,
+)
 from ..model.base import LastRide, RideOverviewContainer
 from ..model.goal import Goal
 from ..plotting import convert_fig_to_base64, get_track_thumbnails
@@ -22,6 +36,7 @@ from ..utils.base import (
 )
 from ..utils.debug import log_timing
 from ..utils.track import get_identifier
+from .categories import get_category_registry
 from .model import (
     Bike,
     CategoryModelType,
@@ -92,13 +107,13 @@ def get_event_years_in_database() -> list[int]:
     return [year[0] for year in distinct_years]
 
 
-def get_possible_values(category_model_type: Type[CategoryModelType]) -> list[str]:
+def get_possible_values(category_model_type: CategoryModelType) -> list[str]:
     """Get all possible value for a CategoryModel Mapping
 
     :param category_model_type: A child of CategoryModel model
     :return: List of all text values for the passed CategoryModel
     """
-    return [str(c.text) for c in db.session.scalars(select(category_model_type)).all()]
+    return get_category_registry().get_texts(category_model_type)
 
 
 def get_unique_model_objects_in_db(model_obj: Type[M]) -> Sequence[M]:
@@ -108,20 +123,12 @@ def get_unique_model_objects_in_db(model_obj: Type[M]) -> Sequence[M]:
 def convert_to_indices(
     values: list[str], category_model_type: CategoryModelType
 ) -> list[int]:
-    relevant_elements = db.session.execute(
-        select(category_model_type).where(category_model_type.text.in_(values))
-    ).scalars()
-
-    if not relevant_elements:
-        raise RuntimeError
-
-    return [e.id for e in relevant_elements]
+    return get_category_registry().get_ids(category_model_type, values)
 
 
-def get_ride_with_latest_track_id(
+def _resolve_date_ranges(
     timeframe: int | str | list[int] | tuple[date, date],
-    ride_type: str | list[str] = "Any",
-):
+) -> list[tuple[date, date]]:
     if timeframe == "All" or timeframe == "Any":
         timeframe = get_ride_years_in_database()
 
@@ -136,6 +143,10 @@ def get_ride_with_latest_track_id(
         year = int(timeframe)
         date_ranges.append((date(year, 1, 1), date(year, 12, 31)))
 
+    return date_ranges
+
+
+def _resolve_terrain_indices(ride_type: str | list[str]) -> list[int]:
     if ride_type == "Any" or ride_type == "All":
         ride_types = get_possible_values(TerrainType)
     else:
@@ -144,9 +155,14 @@ def get_ride_with_latest_track_id(
         else:
             ride_types = ride_type
 
-    select_terrain_indices = convert_to_indices(ride_types, TerrainType)
+    return convert_to_indices(ride_types, TerrainType)
+
 
-    subquery = (
+def _get_latest_track_subquery(
+    date_ranges: list[tuple[date, date]], select_terrain_indices: list[int]
+) -> Subquery:
+    """Subquery ranking the tracks of each ride with the latest track as rn == 1"""
+    return (
         db.session.query(
             ride_track.columns["ride_id"],
             ride_track.columns["track_id"],
@@ -171,6 +187,16 @@ def get_ride_with_latest_track_id(
         .filter(Ride.id_terrain_type.in_(select_terrain_indices))
         .subquery()
     )
+
+
+def get_ride_with_latest_track_id(
+    timeframe: int | str | list[int] | tuple[date, date],
+    ride_type: str | list[str] = "Any",
+):
+    date_ranges = _resolve_date_ranges(timeframe)
+    select_terrain_indices = _resolve_terrain_indices(ride_type)
+
+    subquery = _get_latest_track_subquery(date_ranges, select_terrain_indices)
     query = (
         db.session.query(
             Ride.id,
@@ -215,41 +241,31 @@ def get_ride_and_latest_track_overview(
     ride_type: str | list[str] = "Any",
 ) -> list[RideOverviewContainer]:
     data = get_ride_with_latest_track_id(timeframe, ride_type)
-    return [
-        RideOverviewContainer(
-            **dict(zip(RideOverviewContainer.model_json_schema()["properties"], row))
-        )
-        for row in data
-    ]
+    fields = list(RideOverviewContainer.model_fields)
+    return [RideOverviewContainer(**dict(zip(fields, row))) for row in data]
 
 
-def get_rides_in_timeframe(
+@log_timing
+def get_ride_and_latest_track_overview_frame(
     timeframe: int | str | list[int] | tuple[date, date],
     ride_type: str | list[str] = "Any",
-) -> list[Ride]:
-    if timeframe == "All" or timeframe == "Any":
-        timeframe = get_ride_years_in_database()
-
-    date_ranges: list[tuple[date, date]] = []
-    if isinstance(timeframe, list):
-        for year in timeframe:
-            date_ranges.append((date(year, 1, 1), date(year, 12, 31)))
-
-    elif isinstance(timeframe, tuple):
-        date_ranges.append(timeframe)
-    else:
-        year = int(timeframe)
-        date_ranges.append((date(year, 1, 1), date(year, 12, 31)))
+) -> pd.DataFrame:
+    """
+    Same data as get_ride_and_latest_track_overview but as dataframe with one
+    column per RideOverviewContainer field.
+    """
+    return convert_ride_overview_rows_to_frame(
+        get_ride_with_latest_track_id(timeframe, ride_type)
+    )
 
-    if ride_type == "Any" or ride_type == "All":
-        ride_types = get_possible_values(TerrainType)
-    else:
-        if isinstance(ride_type, str):
-            ride_types = [ride_type]
-        else:
-            ride_types = ride_type
 
-    select_terrain_indices = convert_to_indices(ride_types, TerrainType)
+@log_timing
+def get_rides_in_timeframe(
+    timeframe: int | str | list[int] | tuple[date, date],
+    ride_type: str | list[str] = "Any",
+) -> list[Ride]:
+    date_ranges = _resolve_date_ranges(timeframe)
+    select_terrain_indices = _resolve_terrain_indices(ride_type)
 
     return (
         db.session.query(Ride)
@@ -271,6 +287,126 @@ def get_rides_in_timeframe(
     )
 
 
+@log_timing
+def get_rides_df_in_timeframe(
+    timeframe: int | str | list[int] | tuple[date, date],
+    ride_type: str | list[str] = "Any",
+) -> pd.DataFrame:
+    """
+    Load the rides in the timeframe together with the overview of their latest
+    track with a single joined select. Returns the same dataframe as passing the
+    result of get_rides_in_timeframe to convert_rides_to_df but avoids loading
+    the tracks and overviews for each ride separately. Rides without track or bike
+    are included.
+
+    :param timeframe: Year, list of years, date range or All/Any
+    :param ride_type: Ride type, list of ride types or All/Any
+    :return: Dataframe with one row per ride
+    """
+    date_ranges = _resolve_date_ranges(timeframe)
+    select_terrain_indices = _resolve_terrain_indices(ride_type)
+
+    subquery = _get_latest_track_subquery(date_ranges, select_terrain_indices)
+    stmt = (
+        select(
+            Ride.id,
+            TerrainType.text,
+            Ride.ride_date,
+            Ride.distance,
+            Ride.total_duration,
+            Ride.ride_duration,
+            Bike.name,
+            TrackOverview.id,
+            *(getattr(TrackOverview, column) for column in overview_columns),
+        )
+        .join(TerrainType, Ride.id_terrain_type == TerrainType.id)
+        .join(Bike, Ride.id_bike == Bike.id, isouter=True)
+        .join(
+            subquery,
+            and_(subquery.c.ride_id == Ride.id, subquery.c.rn == 1),
+            isouter=True,
+        )
+        .join(
+            TrackOverview,
+            and_(
+                subquery.c.track_id == TrackOverview.id_track,
+                TrackOverview.id_segment.is_(None),
+            ),
+            isouter=True,
+        )
+        .filter(
+            or_(
+                *(
+                    Ride.ride_date.between(start_date, end_date)
+                    for start_date, end_date in date_ranges
+                )
+            )
+        )
+        .filter(Ride.id_terrain_type.in_(select_terrain_indices))
+    )
+
+    return convert_ride_rows_to_df(db.session.execute(stmt).all())
+
+
+def get_ride_export_rows(
+    timeframe: int | str | list[int] | tuple[date, date] = "All",
+    ride_type: str | list[str] = "Any",
+) -> list:
+    """
+    Load the ride metadata, the id of the latest track and the overview of the full
+    track for the rides in the timeframe. Rides without track or bike are included.
+
+    :return: Rows with the ride columns, track id and the overview_columns
+    """
+    date_ranges = _resolve_date_ranges(timeframe)
+    if not date_ranges:
+        return []
+    select_terrain_indices = _resolve_terrain_indices(ride_type)
+
+    subquery = _get_latest_track_subquery(date_ranges, select_terrain_indices)
+    stmt = (
+        select(
+            Ride.id,
+            Ride.ride_date,
+            Ride.start_time,
+            TerrainType.text,
+            Bike.name,
+            Ride.distance,
+            Ride.total_duration,
+            Ride.ride_duration,
+            subquery.c.track_id,
+            *(getattr(TrackOverview, column) for column in overview_columns),
+        )
+        .join(TerrainType, Ride.id_terrain_type == TerrainType.id)
+        .join(Bike, Ride.id_bike == Bike.id, isouter=True)
+        .join(
+            subquery,
+            and_(subquery.c.ride_id == Ride.id, subquery.c.rn == 1),
+            isouter=True,
+        )
+        .join(
+            TrackOverview,
+            and_(
+                subquery.c.track_id == TrackOverview.id_track,
+                TrackOverview.id_segment.is_(None),
+            ),
+            isouter=True,
+        )
+        .filter(
+            or_(
+                *(
+                    Ride.ride_date.between(start_date, end_date)
+                    for start_date, end_date in date_ranges
+                )
+            )
+        )
+        .filter(Ride.id_terrain_type.in_(select_terrain_indices))
+        .order_by(Ride.ride_date, Ride.start_time, Ride.id)
+    )
+
+    return list(db.session.execute(stmt).all())
+
+
 def get_curr_and_prev_month_rides(
     curr_year: int,
     curr_month: int,
@@ -306,13 +442,13 @@ def get_curr_and_prev_month_rides(
 
 def get_thumbnails_for_id(id_track: int) -> list[str]:
     key = f"get_thumbnails_for_id_{id_track}"
-    data: None | list[str] = cache.get(key)
-    if data is None:
+    data = get_tagged(key)
+    if not isinstance(data, list):
         track = ByteTrack(db.get_or_404(DatabaseTrack, id_track).content)
         data = convert_fig_to_base64(
             [get_track_thumbnails(track.get_track_data())], 400, 400
         )
-        cache.set(key, data)
+        set_tagged(key, data, [track_tag(id_track)])
     return data
 
 
@@ -342,6 +478,7 @@ def _load_last_ride(ride_type: None | str) -> None | Ride:
     return None
 
 
+@log_timing
 def get_last_ride(ride_type: None | str) -> None | LastRide:
     ride = _load_last_ride(ride_type)
 
@@ -379,6 +516,7 @@ def get_last_ride(ride_type: None | str) -> None | LastRide:
     )
 
 
+@log_timing
 def get_recent_events(limit: int, select_event_type: None | str) -> list[DatabaseEvent]:
     sel = select(DatabaseEvent).order_by(desc(DatabaseEvent.event_date)).limit(limit)
     if select_event_type:
@@ -388,7 +526,11 @@ def get_recent_events(limit: int, select_event_type: None | str) -> list[Databas
     return list(db.session.execute(sel).scalars())
 
 
-@cache.memoize(timeout=86400)
+def _event_tags(year: None | int, *args, **kwargs) -> list[str]:
+    return [entity_tag("event") if year is None else year_tag(year)]
+
+
+@memoize_tagged(_event_tags, timeout=86400)
 def get_events(
     year: None | int, month: None | int, event_types: None | list[str]
 ) -> list[DatabaseEvent]:
@@ -417,6 +559,7 @@ def get_events(
     return list(db.session.execute(sel).scalars())
 
 
+@log_timing
 def load_goals(year: int | str, load_active: bool, load_inactive: bool) -> list[Goal]:
     sel = select(DatabaseGoal)
     _filters = []
@@ -438,7 +581,7 @@ def load_goals(year: int | str, load_active: bool, load_inactive: bool) -> list[
     return convert_database_goals(list(db.session.execute(sel).scalars()))
 
 
-@cache.memoize(timeout=86400)
+@memoize_tagged(lambda *args, **kwargs: [entity_tag("ride")], timeout=86400)
 def get_rides_for_bike(id_bike: int) -> list[Ride]:
     return list(
         db.session.execute(select(Ride).filter_by(Ride.id_bike == id_bike)).scalars()  # type: ignore
@@ -467,6 +610,7 @@ def get_agg_data_for_bike(id_bike: int) -> None | dict[str, int | float]:
     return None
 
 
+@log_timing
 def get_segments_for_map_in_bounds(
     ignore_ids: list[int],
     ne_lat: float,
@@ -534,6 +678,7 @@ def get_locations_for_track(track_id: int) -> list[DatabaseLocation]:
     return [loc for loc in db.session.execute(stmt).scalars()]
 
 
+@log_timing
 def resolve_track_location_association(year: str) -> pd.DataFrame:
     year_filter = None
     try:
@@ -577,6 +722,7 @@ def get_rides_with_tracks() -> list[tuple[int, date, float, str]]:
     return db.session.execute(stmt).all()  # type: ignore
 
 
+@log_timing
 def get_zones_for_metric(metric: str) -> None | Zones:
     stmt = (
         select(
@@ -597,6 +743,23 @@ def get_zones_for_metric(metric: str) -> None | Zones:
     return Zones(intervals=intervals)
 
 
+def get_zones() -> dict[str, Zones]:
+    """Zones of all metrics with configured zones"""
+    stmt = select(
+        DatabaseZoneInterval.metric,
+        DatabaseZoneInterval.name,
+        DatabaseZoneInterval.interval_start.label("start"),
+        DatabaseZoneInterval.interval_end.label("end"),
+        DatabaseZoneInterval.color,
+    ).order_by(DatabaseZoneInterval.metric, DatabaseZoneInterval.id)
+    intervals: dict[str, list[ZoneInterval]] = {}
+    for row in db.session.execute(stmt).all():
+        data = row._asdict()
+        intervals.setdefault(data.pop("metric"), []).append(ZoneInterval(**data))
+    return {metric: Zones(intervals=i) for metric, i in intervals.items()}
+
+
+@log_timing
 def get_weekly_data(past_weeks: int) -> None | pd.DataFrame:
     assert past_weeks > 0
 
@@ -0,0 +1,194 @@
+import logging
+import struct
+import zlib
+from datetime import datetime, timedelta, timezone
+from math import isnan
+
+import numpy as np
+from geo_track_analyzer.exceptions import GPXPointExtensionError
+from geo_track_analyzer.model import Zones
+from geo_track_analyzer.track import Track
+from geo_track_analyzer.utils.internal import (
+    get_extended_track_point,
+    get_extension_value,
+)
+from gpxpy.gpx import GPXTrack, GPXTrackSegment
+
+logger = logging.getLogger(__name__)
+
+SERIALIZATION_VERSION = 1
+
+# magic, version, flags, utc offset in seconds, number of segments
+_header = struct.Struct("<4sBBiI")
+_magic = b"CATR"
+_flag_tz_aware = 1
+
+_extension_keys = ["heartrate", "cadence", "power"]
+_no_time = np.iinfo(np.int64).min
+_epoch = datetime(1970, 1, 1)
+
+
+class SerializationError(Exception):
+    pass
+
+
+class CompactTrack(Track):
+    """Track that is initialized from the compact representation of a track"""
+
+    def __init__(
+        self,
+        track: GPXTrack,
+        stopped_speed_threshold: float = 1,
+        max_speed_percentile: int = 95,
+        heartrate_zones: None | Zones = None,
+        power_zones: None | Zones = None,
+        cadence_zones: None | Zones = None,
+    ) -> None:
+        super().__init__(
+            stopped_speed_threshold=stopped_speed_threshold,
+            max_speed_percentile=max_speed_percentile,
+            heartrate_zones=heartrate_zones,
+            power_zones=power_zones,
+            cadence_zones=cadence_zones,
+        )
+        self._track = track
+
+    @property
+    def track(self) -> GPXTrack:
+        return self._track
+
+
+def _get_extension(point: object, key: str) -> float:
+    try:
+        return float(get_extension_value(point, key))  # type: ignore
+    except GPXPointExtensionError:
+        return np.nan
+
+
+def _to_microseconds(time: None | datetime) -> int:
+    if time is None:
+        return _no_time
+    if time.tzinfo is not None:
+        time = time.astimezone(timezone.utc).replace(tzinfo=None)
+    return (time - _epoch) // timedelta(microseconds=1)
+
+
+def serialize_track(track: Track) -> bytes:
+    """
+    Serialize the points of a track into a compact, version-stamped binary
+    representation. Columns are stored as contiguous arrays and compressed.
+    """
+    segments = track.track.segments
+    points = [p for segment in segments for p in segment.points]
+    n_points = len(points)
+
+    utc_offset = 0
+    flags = 0
+    first_time = next((p.time for p in points if p.time is not None), None)
+    if first_time is not None and first_time.tzinfo is not None:
+        flags |= _flag_tz_aware
+        utc_offset = int(first_time.utcoffset().total_seconds())  # type: ignore
+
+    latitudes = np.fromiter((p.latitude for p in points), np.float64, n_points)
+    longitudes = np.fromiter((p.longitude for p in points), np.float64, n_points)
+    elevations = np.fromiter(
+        (np.nan if p.elevation is None else p.elevation for p in points),
+        np.float64,
+        n_points,
+    )
+    times = np.fromiter((_to_microseconds(p.time) for p in points), np.int64, n_points)
+    extensions = [
+        np.fromiter((_get_extension(p, key) for p in points), np.float64, n_points)
+        for key in _extension_keys
+    ]
+    segment_lengths = np.array([len(s.points) for s in segments], dtype=np.uint32)
+
+    columns: list[np.ndarray] = [
+        segment_lengths,
+        latitudes,
+        longitudes,
+        elevations,
+        times,
+        *extensions,
+    ]
+    payload = b"".join(arr.tobytes() for arr in columns)
+    header = _header.pack(
+        _magic, SERIALIZATION_VERSION, flags, utc_offset, len(segments)
+    )
+    return header + zlib.compress(payload, 1)
+
+
+def deserialize_track(
+    data: bytes,
+    stopped_speed_threshold: float = 1,
+    max_speed_percentile: int = 95,
+    heartrate_zones: None | Zones = None,
+    power_zones: None | Zones = None,
+    cadence_zones: None | Zones = None,
+) -> CompactTrack:
+    """
+    Rebuild a track from the output of serialize_track. The remaining arguments are
+    passed to the track. Raises a SerializationError if the data was created with a
+    different version.
+    """
+    if len(data) < _header.size:
+        raise SerializationError("Data too short for a serialized track")
+    magic, version, flags, utc_offset, n_segments = _header.unpack_from(data)
+    if magic != _magic or version != SERIALIZATION_VERSION:
+        raise SerializationError(
+            "Unsupported serialization %s version %s" % (magic, version)
+        )
+    payload = zlib.decompress(data[_header.size :])
+
+    segment_lengths = np.frombuffer(payload, np.uint32, n_segments)
+    n_points = int(segment_lengths.sum())
+    offset = segment_lengths.nbytes
+
+    def read(dtype: type) -> np.ndarray:
+        nonlocal offset
+        arr: np.ndarray = np.frombuffer(payload, dtype, n_points, offset)
+        offset += arr.nbytes
+        return arr
+
+    latitudes = read(np.float64).tolist()
+    longitudes = read(np.float64).tolist()
+    elevations = read(np.float64).tolist()
+    times = read(np.int64).tolist()
+    extensions = {key: read(np.float64).tolist() for key in _extension_keys}
+
+    tzinfo = timezone(timedelta(seconds=utc_offset)) if flags & _flag_tz_aware else None
+
+    gpx_track = GPXTrack()
+    idx = 0
+    for n_segment_points in segment_lengths:
+        segment = GPXTrackSegment()
+        for i in range(idx, idx + int(n_segment_points)):
+            time = None
+            if times[i] != _no_time:
+                time = _epoch + timedelta(microseconds=times[i])
+                if tzinfo is not None:
+                    time = time.replace(tzinfo=timezone.utc).astimezone(tzinfo)
+            segment.points.append(
+                get_extended_track_point(
+                    latitudes[i],
+                    longitudes[i],
+                    None if isnan(elevations[i]) else elevations[i],
+                    time,
+                    {
+                        key: values[i]
+                        for key, values in extensions.items()
+                        if not isnan(values[i])
+                    },
+                )
+            )
+        gpx_track.segments.append(segment)
+        idx += int(n_segment_points)
+
+    return CompactTrack(
+        gpx_track,
+        stopped_speed_threshold=stopped_speed_threshold,
+        max_speed_percentile=max_speed_percentile,
+        heartrate_zones=heartrate_zones,
+        power_zones=power_zones,
+        cadence_zones=cadence_zones,
+    )
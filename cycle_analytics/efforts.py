@@ -0,0 +1,534 @@
+"""
+Detection of segment efforts, i.e. traversals of the saved segments in the ride
+tracks. Candidate segments are selected by their bounds. A traversal starts and ends
+close to the start and end of the segment, has a similar length and follows the
+segment path. Efforts are updated when tracks are added to a ride and can be
+recomputed for all rides with the backfill command. The segment leaderboards are
+updated with the efforts.
+"""
+
+import logging
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable
+
+import numpy as np
+from flask import current_app
+from geo_track_analyzer import ByteTrack, Track
+from sqlalchemy import delete, insert, select, update
+
+from .database.model import (
+    DatabaseSegment,
+    DatabaseTrack,
+    Ride,
+    SegmentEffort,
+    ride_track,
+)
+from .database.model import db as orm_db
+from .leaderboards import add_to_leaderboards, rebuild_leaderboards
+from .utils.spatial import project_equirectangular
+
+logger = logging.getLogger(__name__)
+
+# Mean earth radius in meters times pi / 180
+METERS_PER_DEGREE = 111_195.08
+
+# Maximum number of point-edge pairs evaluated at once in the conformity check
+_CHUNK_ELEMENTS = 1_000_000
+
+
+def extend_bounds(
+    bounds: tuple[float, float, float, float], margin: float
+) -> tuple[float, float, float, float]:
+    """Extend minimum and maximum latitude and longitude by margin (in meters)"""
+    min_lat, max_lat, min_lng, max_lng = bounds
+    margin_lat = margin / METERS_PER_DEGREE
+    margin_lng = margin_lat / max(
+        math.cos(math.radians(max(abs(min_lat), abs(max_lat)))), 1e-6
+    )
+    return (
+        min_lat - margin_lat,
+        max_lat + margin_lat,
+        min_lng - margin_lng,
+        max_lng + margin_lng,
+    )
+
+
+@dataclass
+class EffortSettings:
+    """
+    :param match_distance: Maximum distance (in meters) of the track to the start and
+        end of the segment
+    :param max_deviation: Maximum distance (in meters) between the track and segment
+        paths for a point to be considered on the path
+    :param min_conformity: Minimum fraction of the points (of the track and of the
+        segment) that are on the other path
+    :param distance_tolerance: Maximum relative difference of the track and segment
+        lengths
+    """
+
+    match_distance: float = 30
+    max_deviation: float = 30
+    min_conformity: float = 0.9
+    distance_tolerance: float = 0.2
+
+    @classmethod
+    def from_config(cls: type["EffortSettings"]) -> "EffortSettings":
+        config = current_app.config.segment_efforts
+        return cls(
+            match_distance=config.match_distance,
+            max_deviation=config.max_deviation,
+            min_conformity=config.min_conformity,
+            distance_tolerance=config.distance_tolerance,
+        )
+
+
+@dataclass
+class TrackPoints:
+    """Points of all segments of a track"""
+
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+    # Seconds since the epoch, nan for points without time
+    times: np.ndarray
+
+    @classmethod
+    def from_content(cls: type["TrackPoints"], content: bytes) -> "TrackPoints":
+        return cls.from_track(ByteTrack(content))
+
+    @classmethod
+    def from_track(cls: type["TrackPoints"], track: Track) -> "TrackPoints":
+        points = [point for segment in track.track.segments for point in segment.points]
+        return cls(
+            latitudes=np.array([p.latitude for p in points], dtype=np.float64),
+            longitudes=np.array([p.longitude for p in points], dtype=np.float64),
+            times=np.array(
+                [math.nan if p.time is None else p.time.timestamp() for p in points],
+                dtype=np.float64,
+            ),
+        )
+
+    @property
+    def bounds(self) -> tuple[float, float, float, float]:
+        """Minimum and maximum latitude and longitude"""
+        return (
+            float(self.latitudes.min()),
+            float(self.latitudes.max()),
+            float(self.longitudes.min()),
+            float(self.longitudes.max()),
+        )
+
+
+@dataclass
+class SegmentGeometry:
+    id: int
+    latitudes: np.ndarray
+    longitudes: np.ndarray
+
+    @classmethod
+    def from_gpx(
+        cls: type["SegmentGeometry"], id_segment: int, gpx: bytes
+    ) -> "SegmentGeometry":
+        points = TrackPoints.from_content(gpx)
+        return cls(
+            id=id_segment, latitudes=points.latitudes, longitudes=points.longitudes
+        )
+
+    @property
+    def bounds(self) -> tuple[float, float, float, float]:
+        return (
+            float(self.latitudes.min()),
+            float(self.latitudes.max()),
+            float(self.longitudes.min()),
+            float(self.longitudes.max()),
+        )
+
+
+@dataclass
+class DetectedEffort:
+    id_segment: int
+    start_idx: int
+    end_idx: int
+    distance: float
+    elapsed_time_seconds: None | float
+    avg_velocity_kmh: None | float
+
+
+class SegmentIndex:
+    """
+    Segment geometries with a bounding box prefilter. The bounds of all segments are
+    kept in one array so the candidates of a track are found with a single vectorized
+    comparison.
+
+    :param segments: Segments with at least two points
+    :param margin: Distance (in meters) the bounds are extended by
+    """
+
+    def __init__(self, segments: list[SegmentGeometry], margin: float = 0) -> None:
+        self.segments = [s for s in segments if len(s.latitudes) > 1]
+        self.margin = margin
+        self._bounds = np.array(
+            [s.bounds for s in self.segments], dtype=np.float64
+        ).reshape(-1, 4)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def candidates(
+        self, bounds: tuple[float, float, float, float]
+    ) -> list[SegmentGeometry]:
+        """Segments with bounds intersecting the passed bounds"""
+        min_lat, max_lat, min_lng, max_lng = extend_bounds(bounds, self.margin)
+        overlaps = (
+            (self._bounds[:, 0] <= max_lat)
+            & (self._bounds[:, 1] >= min_lat)
+            & (self._bounds[:, 2] <= max_lng)
+            & (self._bounds[:, 3] >= min_lng)
+        )
+        return [self.segments[i] for i in np.flatnonzero(overlaps)]
+
+
+def load_segment_index(
+    margin: float = 0,
+    segment_ids: None | list[int] = None,
+    bounds: None | tuple[float, float, float, float] = None,
+) -> SegmentIndex:
+    """
+    Load the saved segments into an index
+
+    :param margin: Distance (in meters) the bounds are extended by
+    :param segment_ids: Only load these segments
+    :param bounds: Only load segments intersecting these bounds
+    """
+    stmt = select(DatabaseSegment.id, DatabaseSegment.gpx)
+    if segment_ids:
+        stmt = stmt.filter(DatabaseSegment.id.in_(segment_ids))
+    if bounds is not None:
+        min_lat, max_lat, min_lng, max_lng = extend_bounds(bounds, margin)
+        stmt = stmt.filter(
+            DatabaseSegment.bounds_min_lat <= max_lat,
+            DatabaseSegment.bounds_max_lat >= min_lat,
+            DatabaseSegment.bounds_min_lng <= max_lng,
+            DatabaseSegment.bounds_max_lng >= min_lng,
+        )
+    return SegmentIndex(
+        [
+            SegmentGeometry.from_gpx(id_segment, gpx)
+            for id_segment, gpx in orm_db.session.execute(stmt)
+        ],
+        margin,
+    )
+
+
+def _distances_to_polyline(points: np.ndarray, polyline: np.ndarray) -> np.ndarray:
+    """Distance of each point to the closest edge of the polyline"""
+    start = polyline[:-1]
+    edges = polyline[1:] - start
+    lengths = np.einsum("ij,ij->i", edges, edges)
+    lengths[lengths == 0] = 1
+    distances = np.empty(len(points))
+    chunk_size = max(1, _CHUNK_ELEMENTS // len(edges))
+    for i in range(0, len(points), chunk_size):
+        chunk = points[i : i + chunk_size, None, :] - start
+        t = np.clip(np.einsum("nij,ij->ni", chunk, edges) / lengths, 0, 1)
+        offset = chunk - t[..., None] * edges
+        distances[i : i + chunk_size] = np.sqrt(
+            np.einsum("nij,nij->ni", offset, offset).min(axis=1)
+        )
+    return distances
+
+
+def _get_passes(xy: np.ndarray, target: np.ndarray, max_distance: float) -> np.ndarray:
+    """
+    Indices of the track points where the track passes the target. For every pass
+    (consecutive edges closer than max_distance to the target), the vertex of the
+    closest edge next to the target is returned.
+    """
+    start = xy[:-1]
+    edges = xy[1:] - start
+    lengths = np.einsum("ij,ij->i", edges, edges)
+    lengths[lengths == 0] = 1
+    t = np.clip(np.einsum("ij,ij->i", target - start, edges) / lengths, 0, 1)
+    offset = target - start - t[:, None] * edges
+    distances = np.einsum("ij,ij->i", offset, offset)
+
+    near = np.flatnonzero(distances <= max_distance**2)
+    if not near.size:
+        return near
+    runs = np.split(near, np.flatnonzero(np.diff(near) > 1) + 1)
+    closest = np.array([run[np.argmin(distances[run])] for run in runs])
+    return closest + (t[closest] > 0.5)
+
+
+def _follows_path(
+    track_xy: np.ndarray, segment_xy: np.ndarray, settings: EffortSettings
+) -> bool:
+    for points, path in ((track_xy, segment_xy), (segment_xy, track_xy)):
+        on_path = _distances_to_polyline(points, path) <= settings.max_deviation
+        if on_path.mean() < settings.min_conformity:
+            return False
+    return True
+
+
+def find_efforts(
+    points: TrackPoints,
+    segments: Iterable[SegmentGeometry],
+    settings: EffortSettings,
+) -> list[DetectedEffort]:
+    """
+    Find all traversals of the segments in the track. Traversals of a segment do not
+    overlap, the earliest matching end point is used for each start.
+    """
+    if len(points.latitudes) < 2:
+        return []
+    ref_latitude = float(points.latitudes.mean())
+    xy = (
+        project_equirectangular(points.latitudes, points.longitudes, ref_latitude)
+        * METERS_PER_DEGREE
+    )
+    cum_distance = np.concatenate(
+        ([0.0], np.cumsum(np.linalg.norm(np.diff(xy, axis=0), axis=1)))
+    )
+
+    efforts: list[DetectedEffort] = []
+    for segment in segments:
+        segment_xy = (
+            project_equirectangular(segment.latitudes, segment.longitudes, ref_latitude)
+            * METERS_PER_DEGREE
+        )
+        segment_distance = float(
+            np.linalg.norm(np.diff(segment_xy, axis=0), axis=1).sum()
+        )
+        min_distance = segment_distance * (1 - settings.distance_tolerance)
+        max_distance = segment_distance * (1 + settings.distance_tolerance)
+        starts = _get_passes(xy, segment_xy[0], settings.match_distance)
+        if not starts.size:
+            continue
+        ends = _get_passes(xy, segment_xy[-1], settings.match_distance)
+
+        last_end = -1
+        for start in starts:
+            if start < last_end:
+                continue
+            for end in ends[ends > start]:
+                distance = float(cum_distance[end] - cum_distance[start])
+                if distance < min_distance:
+                    continue
+                if distance > max_distance:
+                    break
+                if not _follows_path(xy[start : end + 1], segment_xy, settings):
+                    continue
+                elapsed_seconds = float(points.times[end] - points.times[start])
+                elapsed = None if math.isnan(elapsed_seconds) else elapsed_seconds
+                efforts.append(
+                    DetectedEffort(
+                        id_segment=segment.id,
+                        start_idx=int(start),
+                        end_idx=int(end),
+                        distance=distance,
+                        elapsed_time_seconds=elapsed,
+                        avg_velocity_kmh=(
+                            distance / elapsed * 3.6 if elapsed else None
+                        ),
+                    )
+                )
+                last_end = end
+                break
+
+    return efforts
+
+
+def mark_visited(segment_ids: set[int]) -> None:
+    """Set the visited flag of the segments. Not committed"""
+    if segment_ids:
+        orm_db.session.execute(
+            update(DatabaseSegment)
+            .where(DatabaseSegment.id.in_(segment_ids))
+            .values(visited=True)
+        )
+
+
+def update_ride_efforts(
+    ride: Ride, settings: None | EffortSettings = None
+) -> list[SegmentEffort]:
+    """
+    Replace the stored efforts of the ride with the efforts in its latest track.
+    Only segments with bounds intersecting the track are loaded. New efforts are
+    added to the leaderboards, the leaderboards are rebuilt if efforts were removed.
+    """
+    if settings is None:
+        settings = EffortSettings.from_config()
+    removed_segments: set[int] = set()
+    for stored in orm_db.session.scalars(
+        select(SegmentEffort).filter(SegmentEffort.id_ride == ride.id)
+    ):
+        removed_segments.add(stored.id_segment)
+        orm_db.session.delete(stored)
+
+    efforts = []
+    database_track = ride.get_latest_track()
+    if database_track is not None:
+        points = TrackPoints.from_content(database_track.content)
+        if len(points.latitudes) > 1:
+            index = load_segment_index(settings.match_distance, bounds=points.bounds)
+            efforts = [
+                SegmentEffort(id_ride=ride.id, id_track=database_track.id, **vars(e))
+                for e in find_efforts(points, index.candidates(points.bounds), settings)
+            ]
+    orm_db.session.add_all(efforts)
+    orm_db.session.flush()
+    segments = {effort.id_segment for effort in efforts}
+    if removed_segments:
+        rebuild_leaderboards(sorted(removed_segments | segments))
+    else:
+        add_to_leaderboards(efforts)
+    mark_visited(segments)
+    orm_db.session.commit()
+    logger.info("Found %s segment efforts in ride %s", len(efforts), ride.id)
+    return efforts
+
+
+@dataclass
+class BackfillResult:
+    processed: int = 0
+    efforts: int = 0
+    failed: list[int] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def rides_per_second(self) -> float:
+        return self.processed / self.duration if self.duration else 0.0
+
+
+def get_latest_tracks(ride_ids: None | list[int] = None) -> list[tuple[int, int]]:
+    """Ride id and id of the latest track for all rides with a track"""
+    stmt = select(
+        ride_track.columns["ride_id"], DatabaseTrack.id, DatabaseTrack.added
+    ).join(DatabaseTrack, DatabaseTrack.id == ride_track.columns["track_id"])
+    if ride_ids:
+        stmt = stmt.filter(ride_track.columns["ride_id"].in_(ride_ids))
+    latest: dict[int, tuple[int, Any]] = {}
+    for id_ride, id_track, added in orm_db.session.execute(stmt):
+        if id_ride not in latest or added > latest[id_ride][1]:
+            latest[id_ride] = (id_track, added)
+    return sorted((id_ride, id_track) for id_ride, (id_track, _) in latest.items())
+
+
+_worker_index: None | SegmentIndex = None
+_worker_settings: None | EffortSettings = None
+
+
+def _init_worker(index: SegmentIndex, settings: EffortSettings) -> None:
+    # The index is passed once per process instead of once per track
+    global _worker_index, _worker_settings
+    _worker_index = index
+    _worker_settings = settings
+
+
+def detect_efforts(
+    id_track: int, content: bytes
+) -> tuple[int, None | str, list[DetectedEffort]]:
+    """
+    Find the efforts in a track with the index of the worker process
+
+    :return: Track id, error message and the detected efforts
+    """
+    assert _worker_index is not None
+    assert _worker_settings is not None
+    try:
+        points = TrackPoints.from_content(content)
+        if len(points.latitudes) < 2:
+            return id_track, None, []
+        efforts = find_efforts(
+            points, _worker_index.candidates(points.bounds), _worker_settings
+        )
+    except Exception as e:
+        return id_track, str(e), []
+    return id_track, None, efforts
+
+
+def backfill_efforts(
+    ride_ids: None | list[int] = None,
+    segment_ids: None | list[int] = None,
+    workers: None | int = None,
+    batch_size: int = 50,
+    progress: None | Callable[[BackfillResult], None] = None,
+) -> BackfillResult:
+    """
+    Detect the efforts in the latest track of all rides and replace the stored
+    efforts.
+
+    :param ride_ids: Only process these rides
+    :param segment_ids: Only detect efforts of these segments. Stored efforts of
+        other segments are kept
+    :param workers: Number of processes. Defaults to the number of CPUs
+    :param batch_size: Number of tracks loaded and written per commit
+    :param progress: Called with the current result after each batch
+    """
+    settings = EffortSettings.from_config()
+    index = load_segment_index(settings.match_distance, segment_ids)
+    tracks = get_latest_tracks(ride_ids)
+    logger.info("Detecting efforts of %s segments in %s rides", len(index), len(tracks))
+
+    result = BackfillResult()
+    visited: set[int] = set()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(index, settings)
+    ) as executor:
+        for i in range(0, len(tracks), batch_size):
+            batch = {
+                id_track: id_ride for id_ride, id_track in tracks[i : i + batch_size]
+            }
+            contents = orm_db.session.execute(
+                select(DatabaseTrack.id, DatabaseTrack.content).filter(
+                    DatabaseTrack.id.in_(batch)
+                )
+            ).all()
+
+            efforts: list[dict[str, Any]] = []
+            for id_track, error, track_efforts in executor.map(
+                detect_efforts,
+                [id_track for id_track, _ in contents],
+                [content for _, content in contents],
+            ):
+                if error is not None:
+                    logger.error("Could not process track %s: %s", id_track, error)
+                    result.failed.append(batch[id_track])
+                    continue
+                efforts.extend(
+                    dict(id_ride=batch[id_track], id_track=id_track, **vars(e))
+                    for e in track_efforts
+                )
+
+            stmt = delete(SegmentEffort).filter(
+                SegmentEffort.id_ride.in_(
+                    [
+                        id_ride
+                        for id_ride in batch.values()
+                        if id_ride not in result.failed
+                    ]
+                )
+            )
+            if segment_ids:
+                stmt = stmt.filter(SegmentEffort.id_segment.in_(segment_ids))
+            orm_db.session.execute(stmt)
+            if efforts:
+                orm_db.session.execute(insert(SegmentEffort), efforts)
+            orm_db.session.commit()
+            orm_db.session.expunge_all()
+            visited.update(effort["id_segment"] for effort in efforts)
+
+            result.processed += len(batch)
+            result.efforts += len(efforts)
+            result.duration = time.perf_counter() - start
+            if progress is not None:
+                progress(result)
+
+    mark_visited(visited)
+    rebuild_leaderboards([segment.id for segment in index.segments])
+    orm_db.session.commit()
+    result.duration = time.perf_counter() - start
+    return result
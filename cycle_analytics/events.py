@@ -80,7 +80,7 @@ def overview() -> str:
                     event.short_description,
                     event.event_type,
                     event.event_date,
-                    "" if event.id_severity is None else event.severity.text,
+                    "" if event.severity is None else event.severity.text,
                 )
             )
             if event.latitude is not None and event.longitude is not None:
@@ -0,0 +1,160 @@
+"""
+Export of rides as zip archive with the stored GPX of the latest track of each ride
+and a CSV manifest with the ride metadata and track overviews. The archive is
+produced chunk by chunk so only one track is held in memory at a time.
+"""
+
+import csv
+import logging
+import zipfile
+from datetime import date, timedelta
+from io import RawIOBase, StringIO
+from typing import TYPE_CHECKING, Iterator
+
+from sqlalchemy import select
+
+from .database.converter import overview_columns
+from .database.model import DatabaseTrack
+from .database.model import db as orm_db
+from .database.retriever import get_ride_export_rows
+
+if TYPE_CHECKING:
+    from _typeshed import ReadableBuffer
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.csv"
+MANIFEST_COLUMNS = [
+    "ride_id",
+    "ride_date",
+    "start_time",
+    "ride_type",
+    "bike",
+    "distance",
+    "total_duration_seconds",
+    "ride_duration_seconds",
+    "track_id",
+    "file",
+    *overview_columns,
+]
+# Size of the chunks written into the archive for one track
+CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipStream(RawIOBase):
+    """Write only file object that collects the zip output until it is consumed"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: "ReadableBuffer") -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        return len(chunk)
+
+    def consume(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _track_file_name(ride_id: int, ride_date: date, track_id: int) -> str:
+    return f"tracks/{ride_date.isoformat()}_ride_{ride_id}_track_{track_id}.gpx"
+
+
+def _seconds(value: None | timedelta) -> None | int:
+    return None if value is None else int(value.total_seconds())
+
+
+def build_manifest(rows: list) -> tuple[str, dict[int, str]]:
+    """
+    Create the CSV manifest for the export rows.
+
+    :return: Manifest content and a mapping of track ids to file names in the archive
+    """
+    files = {}
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(MANIFEST_COLUMNS)
+    for row in rows:
+        (
+            ride_id,
+            ride_date,
+            start_time,
+            ride_type,
+            bike,
+            distance,
+            total_duration,
+            ride_duration,
+            track_id,
+            *overview,
+        ) = row
+        file_name = None
+        if track_id is not None:
+            file_name = _track_file_name(ride_id, ride_date, track_id)
+            files[track_id] = file_name
+        writer.writerow(
+            [
+                ride_id,
+                ride_date.isoformat(),
+                start_time.isoformat(),
+                ride_type,
+                bike,
+                distance,
+                _seconds(total_duration),
+                _seconds(ride_duration),
+                track_id,
+                file_name,
+                *overview,
+            ]
+        )
+    return output.getvalue(), files
+
+
+def iter_export_archive(
+    timeframe: int | str | list[int] = "All",
+    ride_type: str | list[str] = "Any",
+    batch_size: int = 20,
+) -> Iterator[bytes]:
+    """
+    Generate the zip archive of the rides in the timeframe. The stored track content
+    is passed through without parsing. Requires an app context while iterating.
+
+    :param timeframe: Year, list of years or All
+    :param ride_type: Ride type, list of ride types or Any
+    :param batch_size: Number of tracks loaded from the database per query
+    """
+    rows = get_ride_export_rows(timeframe, ride_type)
+    manifest, files = build_manifest(rows)
+    logger.info("Exporting %s rides with %s tracks", len(rows), len(files))
+
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(MANIFEST_NAME, manifest)
+        yield stream.consume()
+
+        track_ids = list(files)
+        for i in range(0, len(track_ids), batch_size):
+            batch = track_ids[i : i + batch_size]
+            # Only load the content columns to not fill the session with tracks
+            for track_id, content in orm_db.session.execute(
+                select(DatabaseTrack.id, DatabaseTrack.content).filter(
+                    DatabaseTrack.id.in_(batch)
+                )
+            ):
+                with archive.open(files[track_id], "w") as f:
+                    for start in range(0, len(content), CHUNK_SIZE):
+                        f.write(content[start : start + CHUNK_SIZE])
+                        yield stream.consume()
+                yield stream.consume()
+    yield stream.consume()
+
+
+def get_export_file_name(timeframe: int | str | list[int]) -> str:
+    if isinstance(timeframe, list):
+        timeframe = "_".join(str(year) for year in timeframe)
+    return f"cycle_analytics_export_{timeframe}.zip"
@@ -6,10 +6,10 @@ from flask_wtf import FlaskForm
 from wtforms import RadioField, SelectField
 from wtforms.validators import DataRequired
 
-from .database.converter import convert_ride_overview_container_to_df
+from .database.converter import convert_ride_overview_frame_to_df
 from .database.modifier import update_manual_goal_value
 from .database.retriever import (
-    get_ride_and_latest_track_overview,
+    get_ride_and_latest_track_overview_frame,
     resolve_track_location_association,
 )
 from .model.base import GoalDisplayData, GoalInfoData, ManualGoalSetting
@@ -152,8 +152,8 @@ def overview() -> str:
     year_goals = [g for g in goals if g.month is None]
     month_goals = [g for g in goals if g.month == load_month]
 
-    data = convert_ride_overview_container_to_df(
-        get_ride_and_latest_track_overview(load_year)
+    data = convert_ride_overview_frame_to_df(
+        get_ride_and_latest_track_overview_frame(load_year)
     )
     data_location = resolve_track_location_association(str(load_year))
     year_goal_displays = []
@@ -0,0 +1,294 @@
+"""
+Bulk import of GPX and FIT files from a directory or zip archive (e.g. a Strava
+export). Files are parsed and the overviews and location matches are computed in a
+process pool, together with the segment efforts. Rides are derived from the tracks
+and inserted in batches. Files that were imported before (same content hash) are
+skipped.
+"""
+
+import gzip
+import hashlib
+import logging
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Iterator
+
+from sqlalchemy import select
+
+from .cache import entity_tag, invalidate_tags, year_tag
+from .database.converter import initialize_overviews
+from .database.model import (
+    Bike,
+    DatabaseLocation,
+    DatabaseTrack,
+    Ride,
+    SegmentEffort,
+    TerrainType,
+    TrackImport,
+    TrackLocationAssociation,
+    TrackOverview,
+)
+from .database.model import db as orm_db
+from .efforts import (
+    DetectedEffort,
+    EffortSettings,
+    SegmentIndex,
+    TrackPoints,
+    find_efforts,
+    load_segment_index,
+    mark_visited,
+)
+from .leaderboards import add_to_leaderboards
+from .utils.forms import get_track_from_bytes
+from .utils.track import check_location_in_track
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ParsedTrack:
+    file_name: str
+    content_hash: str
+    error: None | str = None
+    content: bytes = b""
+    start: None | datetime = None
+    total_seconds: float = 0
+    moving_seconds: float = 0
+    distance_km: float = 0
+    overviews: list[TrackOverview] = field(default_factory=list)
+    # Tuples of location id and distance
+    location_matches: list[tuple[int, float]] = field(default_factory=list)
+    efforts: list[DetectedEffort] = field(default_factory=list)
+
+
+@dataclass
+class ImportResult:
+    imported: list[str] = field(default_factory=list)
+    duplicates: list[str] = field(default_factory=list)
+    failed: list[tuple[str, str]] = field(default_factory=list)
+
+
+def iter_source_files(
+    source: str, extensions: list[str]
+) -> Iterator[tuple[str, bytes]]:
+    """
+    Yield the name and content of all track files in a directory (recursively) or
+    zip archive. Gzipped files (e.g. activity.gpx.gz) are decompressed.
+    """
+
+    def _is_track(name: str) -> bool:
+        name = name.lower().removesuffix(".gz")
+        return "." in name and name.rsplit(".", 1)[1] in extensions
+
+    def _read(name: str, content: bytes) -> tuple[str, bytes]:
+        if name.lower().endswith(".gz"):
+            return name[:-3], gzip.decompress(content)
+        return name, content
+
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and _is_track(info.filename):
+                    yield _read(info.filename, archive.read(info))
+        return
+
+    for root, _, files in sorted(os.walk(source)):
+        for file_name in sorted(files):
+            if _is_track(file_name):
+                path = os.path.join(root, file_name)
+                with open(path, "rb") as f:
+                    yield _read(os.path.relpath(path, source), f.read())
+
+
+def parse_track(
+    file_name: str,
+    content: bytes,
+    content_hash: str,
+    locations: list[tuple[int, float, float]],
+    max_distance: float,
+    segments: None | SegmentIndex = None,
+    effort_settings: None | EffortSettings = None,
+) -> ParsedTrack:
+    """Parse a track file and compute everything needed to insert the ride"""
+    try:
+        track = get_track_from_bytes(file_name, content)
+        start = track.track.get_time_bounds().start_time
+        if start is None:
+            raise ValueError("Track has no timestamps")
+        overview = track.get_track_overview()
+        location_matches = []
+        if locations:
+            matches = check_location_in_track(
+                track,
+                [
+                    DatabaseLocation(latitude=lat, longitude=lng, name="")
+                    for _, lat, lng in locations
+                ],
+                max_distance=max_distance,
+            )
+            location_matches = [
+                (id_location, distance)
+                for (id_location, _, _), (match, distance) in zip(locations, matches)
+                if match
+            ]
+        efforts = []
+        if segments and effort_settings is not None:
+            points = TrackPoints.from_track(track)
+            efforts = find_efforts(
+                points, segments.candidates(points.bounds), effort_settings
+            )
+        return ParsedTrack(
+            file_name=file_name,
+            content_hash=content_hash,
+            content=track.get_xml().encode(),
+            start=start,
+            total_seconds=overview.total_time_seconds,
+            moving_seconds=overview.moving_time_seconds,
+            distance_km=overview.total_distance_km,
+            overviews=initialize_overviews(track),
+            location_matches=location_matches,
+            efforts=efforts,
+        )
+    except Exception as e:
+        return ParsedTrack(file_name=file_name, content_hash=content_hash, error=str(e))
+
+
+def _add_ride(parsed: ParsedTrack, bike: Bike, terrain_type: TerrainType) -> Ride:
+    start = parsed.start
+    assert start is not None
+    if start.tzinfo is not None:
+        start = start.astimezone().replace(tzinfo=None)
+    database_track = DatabaseTrack(
+        content=parsed.content,
+        added=datetime.now(),
+        is_enhanced=False,
+        overviews=parsed.overviews,
+    )
+    with orm_db.session.no_autoflush:
+        ride = Ride(
+            ride_date=start.date(),
+            start_time=start.time().replace(microsecond=0),
+            total_duration=timedelta(seconds=int(parsed.total_seconds)),
+            ride_duration=timedelta(seconds=int(parsed.moving_seconds)),
+            distance=round(parsed.distance_km, 2),
+            bike=bike,
+            terrain_type=terrain_type,
+            tracks=[database_track],
+        )
+        orm_db.session.add(ride)
+    return ride
+
+
+def import_tracks(
+    source: str,
+    bike: Bike,
+    terrain_type: TerrainType,
+    extensions: list[str],
+    workers: None | int = None,
+    batch_size: int = 50,
+    max_distance: None | float = None,
+) -> ImportResult:
+    """
+    Import all track files in the source as new rides.
+
+    :param source: Directory or zip archive
+    :param bike: Bike used for all rides
+    :param terrain_type: Terrain type of all rides
+    :param extensions: Valid file endings
+    :param workers: Number of processes. Defaults to the number of CPUs
+    :param batch_size: Number of rides inserted per commit
+    :param max_distance: Match locations within this distance (in meters). Location
+        matching is skipped if None.
+    """
+    result = ImportResult()
+    known_hashes = set(orm_db.session.scalars(select(TrackImport.content_hash)))
+    locations = []
+    if max_distance is not None:
+        locations = [
+            (loc.id, loc.latitude, loc.longitude)
+            for loc in orm_db.session.scalars(select(DatabaseLocation))
+        ]
+    effort_settings = EffortSettings.from_config()
+    segments = load_segment_index(effort_settings.match_distance)
+    years: set[int] = set()
+    visited: set[int] = set()
+
+    def _new_files() -> Iterator[tuple[str, bytes, str]]:
+        for file_name, content in iter_source_files(source, extensions):
+            content_hash = hashlib.sha256(content).hexdigest()
+            if content_hash in known_hashes:
+                logger.info("Skipping %s. Already imported", file_name)
+                result.duplicates.append(file_name)
+                continue
+            known_hashes.add(content_hash)
+            yield file_name, content, content_hash
+
+    files = _new_files()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Submit the files in chunks so the archive is not loaded into memory at once
+        while chunk := list(islice(files, batch_size)):
+            file_names, contents, hashes = zip(*chunk)
+            n = len(chunk)
+            added: list[tuple[ParsedTrack, Ride]] = []
+            for parsed in executor.map(
+                parse_track,
+                file_names,
+                contents,
+                hashes,
+                [locations] * n,
+                [max_distance or 0] * n,
+                [segments] * n,
+                [effort_settings] * n,
+            ):
+                if parsed.error is not None:
+                    logger.error(
+                        "Could not import %s: %s", parsed.file_name, parsed.error
+                    )
+                    result.failed.append((parsed.file_name, parsed.error))
+                    continue
+                added.append((parsed, _add_ride(parsed, bike, terrain_type)))
+            # Insert the rides and tracks of the chunk together to get their ids
+            orm_db.session.flush()
+            efforts: list[SegmentEffort] = []
+            for parsed, ride in added:
+                orm_db.session.add(
+                    TrackImport(
+                        content_hash=parsed.content_hash,
+                        ride_id=ride.id,
+                        file_name=parsed.file_name,
+                        imported=datetime.now(),
+                    )
+                )
+                orm_db.session.add_all(
+                    TrackLocationAssociation(
+                        location_id=id_location,
+                        track_id=ride.tracks[0].id,
+                        distance=distance,
+                    )
+                    for id_location, distance in parsed.location_matches
+                )
+                efforts.extend(
+                    SegmentEffort(
+                        id_ride=ride.id, id_track=ride.tracks[0].id, **vars(effort)
+                    )
+                    for effort in parsed.efforts
+                )
+                visited.update(effort.id_segment for effort in parsed.efforts)
+                years.add(ride.ride_date.year)
+                result.imported.append(parsed.file_name)
+            orm_db.session.add_all(efforts)
+            orm_db.session.flush()
+            add_to_leaderboards(efforts)
+            orm_db.session.commit()
+            logger.info("Imported %s files", len(result.imported))
+
+    mark_visited(visited)
+    orm_db.session.commit()
+
+    if result.imported:
+        invalidate_tags(entity_tag("ride"), *[year_tag(year) for year in years])
+    return result
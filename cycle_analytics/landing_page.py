@@ -4,7 +4,7 @@ from datetime import date, timedelta
 from flask import current_app, render_template, request
 
 from .database.converter import (
-    convert_ride_overview_container_to_df,
+    convert_ride_overview_frame_to_df,
     summarize_rides_in_month,
     summarize_rides_in_year,
 )
@@ -12,7 +12,7 @@ from .database.retriever import (
     get_goal_years_in_database,
     get_last_ride,
     get_recent_events,
-    get_ride_and_latest_track_overview,
+    get_ride_and_latest_track_overview_frame,
     get_ride_years_in_database,
     get_weekly_data,
     load_goals,
@@ -101,8 +101,8 @@ def render_landing_page() -> str:
         )
     ]
     # -----------------------------------------------------------------------------
-    data = convert_ride_overview_container_to_df(
-        get_ride_and_latest_track_overview(goal_year_selected)
+    data = convert_ride_overview_frame_to_df(
+        get_ride_and_latest_track_overview_frame(goal_year_selected)
     )
     data_locations = resolve_track_location_association(goal_year_selected)
     for goal in display_goals:
@@ -139,8 +139,8 @@ def render_landing_page() -> str:
         summary_ride_type_selected = select_ride_types_
 
     summary_data = summarize_rides_in_year(
-        convert_ride_overview_container_to_df(
-            get_ride_and_latest_track_overview(
+        convert_ride_overview_frame_to_df(
+            get_ride_and_latest_track_overview_frame(
                 summary_year_selected, summary_ride_type_selected
             )
         )
@@ -149,8 +149,8 @@ def render_landing_page() -> str:
 
     summary_month = summarize_rides_in_month(
         *[
-            convert_ride_overview_container_to_df(
-                get_ride_and_latest_track_overview(date_range)
+            convert_ride_overview_frame_to_df(
+                get_ride_and_latest_track_overview_frame(date_range)
             )
             for date_range in get_curr_and_prev_month_date_ranges(
                 date_today.year, date_today.month
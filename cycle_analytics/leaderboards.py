@@ -0,0 +1,255 @@
+"""
+Precomputed segment leaderboards. For every segment, the fastest efforts, the most
+recent attempts and the personal best history are stored for all rides and filtered
+by bike and terrain type. New efforts are added to the stored lists, so pages only
+load one row. The leaderboards of a segment are rebuilt if efforts are removed.
+"""
+
+import bisect
+import logging
+from dataclasses import asdict, dataclass, field
+
+from flask import current_app
+from sqlalchemy import Select, select
+
+from .database.model import Ride, SegmentEffort, SegmentLeaderboard
+from .database.model import db as orm_db
+from .utils.base import unwrap
+
+logger = logging.getLogger(__name__)
+
+# Used for id_bike and id_terrain_type of the leaderboards of all bikes and types
+ANY = 0
+
+
+@dataclass
+class LeaderboardEntry:
+    id_effort: int
+    id_ride: int
+    ride_date: str
+    start_time: str
+    start_idx: int
+    elapsed_time_seconds: None | float
+    avg_velocity_kmh: None | float
+
+    @property
+    def order_key(self) -> tuple[str, str, int]:
+        """Chronological order of the efforts"""
+        return self.ride_date, self.start_time, self.start_idx
+
+    @property
+    def rank_key(self) -> tuple[float, tuple[str, str, int]]:
+        """Faster first, earlier effort first for equal times"""
+        return unwrap(self.elapsed_time_seconds), self.order_key
+
+
+@dataclass
+class LeaderboardSizes:
+    best: int = 10
+    recent: int = 10
+    history: int = 50
+
+    @classmethod
+    def from_config(cls: type["LeaderboardSizes"]) -> "LeaderboardSizes":
+        config = current_app.config.segment_efforts
+        return cls(
+            best=config.leaderboard_size,
+            recent=config.recent_size,
+            history=config.history_size,
+        )
+
+
+@dataclass
+class Leaderboard:
+    n_efforts: int = 0
+    # Fastest efforts, fastest first
+    best: list[LeaderboardEntry] = field(default_factory=list)
+    # Most recent efforts, oldest first
+    recent: list[LeaderboardEntry] = field(default_factory=list)
+    # Efforts that set a new personal best, oldest first
+    history: list[LeaderboardEntry] = field(default_factory=list)
+
+    @classmethod
+    def from_row(cls: type["Leaderboard"], row: SegmentLeaderboard) -> "Leaderboard":
+        return cls(
+            n_efforts=row.n_efforts,
+            best=[LeaderboardEntry(**e) for e in row.best],
+            recent=[LeaderboardEntry(**e) for e in row.recent],
+            history=[LeaderboardEntry(**e) for e in row.history],
+        )
+
+    def update_row(self, row: SegmentLeaderboard) -> None:
+        # New lists are assigned so the JSON columns are marked as modified
+        row.n_efforts = self.n_efforts
+        row.best = [asdict(e) for e in self.best]
+        row.recent = [asdict(e) for e in self.recent]
+        row.history = [asdict(e) for e in self.history]
+
+    def add(self, entry: LeaderboardEntry, sizes: LeaderboardSizes) -> None:
+        """Add an effort. The effort can be older than the stored efforts"""
+        self.n_efforts += 1
+
+        order_keys = [e.order_key for e in self.recent]
+        self.recent.insert(bisect.bisect(order_keys, entry.order_key), entry)
+        self.recent = self.recent[-sizes.recent :]
+
+        if entry.elapsed_time_seconds is None:
+            return
+
+        position = bisect.bisect([e.rank_key for e in self.best], entry.rank_key)
+        if position < sizes.best:
+            self.best.insert(position, entry)
+            self.best = self.best[: sizes.best]
+
+        # The history contains the running best time. The effort is a new personal
+        # best if it is faster than the last history entry before it and replaces
+        # the following entries that are not faster.
+        position = bisect.bisect([e.order_key for e in self.history], entry.order_key)
+        if position > 0 and entry.elapsed_time_seconds >= unwrap(
+            self.history[position - 1].elapsed_time_seconds
+        ):
+            return
+        end = position
+        while (
+            end < len(self.history)
+            and unwrap(self.history[end].elapsed_time_seconds)
+            >= entry.elapsed_time_seconds
+        ):
+            end += 1
+        self.history[position:end] = [entry]
+        self.history = self.history[-sizes.history :]
+
+
+def get_leaderboard_keys(
+    id_bike: None | int, id_terrain_type: int
+) -> list[tuple[int, int]]:
+    """Keys (bike and terrain type) of all leaderboards an effort is part of"""
+    bikes = [ANY] if id_bike is None else [ANY, id_bike]
+    return [
+        (bike, terrain_type)
+        for bike in bikes
+        for terrain_type in (ANY, id_terrain_type)
+    ]
+
+
+def _get_entries(stmt: Select) -> list[tuple[int, int, int, LeaderboardEntry]]:
+    """Segment id, bike id, terrain type id and entry of the selected efforts"""
+    stmt = stmt.add_columns(
+        Ride.id_bike, Ride.id_terrain_type, Ride.ride_date, Ride.start_time
+    ).join(Ride, Ride.id == SegmentEffort.id_ride)
+    return [
+        (
+            effort.id_segment,
+            id_bike,
+            id_terrain_type,
+            LeaderboardEntry(
+                id_effort=effort.id,
+                id_ride=effort.id_ride,
+                ride_date=ride_date.isoformat(),
+                start_time=start_time.isoformat(),
+                start_idx=effort.start_idx,
+                elapsed_time_seconds=effort.elapsed_time_seconds,
+                avg_velocity_kmh=effort.avg_velocity_kmh,
+            ),
+        )
+        for effort, id_bike, id_terrain_type, ride_date, start_time in (
+            orm_db.session.execute(stmt)
+        )
+    ]
+
+
+def add_to_leaderboards(
+    efforts: list[SegmentEffort], sizes: None | LeaderboardSizes = None
+) -> None:
+    """
+    Add new efforts to the stored leaderboards. The efforts must be flushed. Not
+    committed.
+    """
+    if not efforts:
+        return
+    if sizes is None:
+        sizes = LeaderboardSizes.from_config()
+    entries = _get_entries(
+        select(SegmentEffort).filter(SegmentEffort.id.in_([e.id for e in efforts]))
+    )
+    rows: dict[tuple[int, int, int], SegmentLeaderboard] = {}
+    for id_segment, id_bike, id_terrain_type, entry in entries:
+        for bike, terrain_type in get_leaderboard_keys(id_bike, id_terrain_type):
+            key = (id_segment, bike, terrain_type)
+            if key not in rows:
+                row = orm_db.session.get(SegmentLeaderboard, key)
+                if row is None:
+                    row = SegmentLeaderboard(
+                        id_segment=id_segment,
+                        id_bike=bike,
+                        id_terrain_type=terrain_type,
+                    )
+                    orm_db.session.add(row)
+                rows[key] = row
+            leaderboard = Leaderboard.from_row(rows[key])
+            leaderboard.add(entry, sizes)
+            leaderboard.update_row(rows[key])
+
+
+def rebuild_leaderboards(
+    segment_ids: list[int], sizes: None | LeaderboardSizes = None
+) -> None:
+    """
+    Rebuild the leaderboards of the segments from all stored efforts. Not
+    committed.
+    """
+    if not segment_ids:
+        return
+    if sizes is None:
+        sizes = LeaderboardSizes.from_config()
+    entries = _get_entries(
+        select(SegmentEffort).filter(SegmentEffort.id_segment.in_(segment_ids))
+    )
+    # Efforts are added in chronological order, so every insert is an append
+    entries.sort(key=lambda e: (e[0], e[3].order_key))
+    leaderboards: dict[tuple[int, int, int], Leaderboard] = {}
+    for id_segment, id_bike, id_terrain_type, entry in entries:
+        for bike, terrain_type in get_leaderboard_keys(id_bike, id_terrain_type):
+            leaderboards.setdefault(
+                (id_segment, bike, terrain_type), Leaderboard()
+            ).add(entry, sizes)
+
+    for row in orm_db.session.scalars(
+        select(SegmentLeaderboard).filter(
+            SegmentLeaderboard.id_segment.in_(segment_ids)
+        )
+    ):
+        leaderboard = leaderboards.pop(
+            (row.id_segment, row.id_bike, row.id_terrain_type), None
+        )
+        if leaderboard is None:
+            orm_db.session.delete(row)
+        else:
+            leaderboard.update_row(row)
+    for (id_segment, bike, terrain_type), leaderboard in leaderboards.items():
+        row = SegmentLeaderboard(
+            id_segment=id_segment, id_bike=bike, id_terrain_type=terrain_type
+        )
+        leaderboard.update_row(row)
+        orm_db.session.add(row)
+    logger.info("Rebuilt leaderboards of %s segments", len(segment_ids))
+
+
+def get_leaderboard(
+    id_segment: int, id_bike: int = ANY, id_terrain_type: int = ANY
+) -> Leaderboard:
+    row = orm_db.session.get(SegmentLeaderboard, (id_segment, id_bike, id_terrain_type))
+    return Leaderboard() if row is None else Leaderboard.from_row(row)
+
+
+def get_leaderboard_filters(id_segment: int) -> tuple[list[int], list[int]]:
+    """Ids of the bikes and terrain types with efforts on the segment"""
+    keys = orm_db.session.execute(
+        select(SegmentLeaderboard.id_bike, SegmentLeaderboard.id_terrain_type).filter(
+            SegmentLeaderboard.id_segment == id_segment
+        )
+    ).all()
+    return (
+        sorted({bike for bike, _ in keys} - {ANY}),
+        sorted({terrain_type for _, terrain_type in keys} - {ANY}),
+    )
@@ -0,0 +1,281 @@
+import logging
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from time import perf_counter
+from typing import Any
+
+from flask import Flask, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine, ExecutionContext
+from sqlalchemy.engine.interfaces import DBAPICursor
+from werkzeug import Response
+
+logger = logging.getLogger(__name__)
+
+latency_buckets = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_cache_key_suffix = re.compile(r"_(\d+|[0-9a-f]{32})$")
+
+
+class Histogram:
+    """Cumulative histogram in the layout used by prometheus"""
+
+    def __init__(self, buckets: tuple[float, ...] = latency_buckets) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> list[tuple[str, int]]:
+        result = []
+        total = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((f"{bucket}", total))
+        result.append(("+Inf", self.count))
+        return result
+
+    def quantile(self, q: float) -> None | float:
+        """Estimate the quantile with the upper bound of the matching bucket"""
+        if self.count == 0:
+            return None
+        threshold = q * self.count
+        for bucket, count in self.cumulative_counts():
+            if count >= threshold:
+                return float(bucket) if bucket != "+Inf" else self.buckets[-1]
+        return None
+
+
+class Metrics:
+    """
+    Process wide store for request latencies, function timings, SQL queries and
+    cache accesses. Function timings and cache accesses are only recorded after
+    init_metrics enabled the collection.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.requests: dict[tuple[str, str, int], Histogram] = defaultdict(
+                Histogram
+            )
+            self.request_queries: dict[tuple[str, str, int], int] = defaultdict(int)
+            self.functions: dict[str, Histogram] = defaultdict(Histogram)
+            self.queries: dict[str, Histogram] = defaultdict(Histogram)
+            self.cache: dict[tuple[str, str], int] = defaultdict(int)
+
+    def observe_request(
+        self, endpoint: str, method: str, status: int, seconds: float, queries: int = 0
+    ) -> None:
+        with self._lock:
+            self.requests[(endpoint, method, status)].observe(seconds)
+            self.request_queries[(endpoint, method, status)] += queries
+
+    def observe_function(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.functions[name].observe(seconds)
+
+    def observe_query(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            self.queries[endpoint].observe(seconds)
+
+    def count_cache_access(self, key: str, result: str) -> None:
+        """Count a cache access. Result is one of hit, miss, or stale"""
+        family = _cache_key_suffix.sub("", key)
+        with self._lock:
+            self.cache[(family, result)] += 1
+
+    def render_prometheus(self) -> str:
+        lines: list[str] = []
+        with self._lock:
+            _add_histograms(
+                lines,
+                "cycle_analytics_request_duration_seconds",
+                "Request latency per endpoint",
+                {
+                    (("endpoint", e), ("method", m), ("status", str(s))): h
+                    for (e, m, s), h in self.requests.items()
+                },
+            )
+            _add_histograms(
+                lines,
+                "cycle_analytics_function_duration_seconds",
+                "Runtime of functions decorated with log_timing",
+                {(("function", f),): h for f, h in self.functions.items()},
+            )
+            _add_histograms(
+                lines,
+                "cycle_analytics_sql_query_duration_seconds",
+                "SQL query durations per endpoint",
+                {(("endpoint", e),): h for e, h in self.queries.items()},
+            )
+            name = "cycle_analytics_cache_access_total"
+            lines.append(f"# HELP {name} Cache accesses per key family")
+            lines.append(f"# TYPE {name} counter")
+            for (family, result), count in sorted(self.cache.items()):
+                lines.append(
+                    f'{name}{{family="{_escape(family)}",result="{result}"}} {count}'
+                )
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict[str, list[dict[str, Any]]]:
+        """Summary of the recorded metrics used in the dashboard"""
+        with self._lock:
+            requests = []
+            for (e, m, s), h in self.requests.items():
+                row = _summarize_histogram(h, endpoint=e, method=m, status=s)
+                # Queries are counted per request, so requests of the same endpoint
+                # with another method or status do not inflate the value
+                row["queries_per_request"] = self.request_queries.get(
+                    (e, m, s), 0
+                ) / max(h.count, 1)
+                requests.append(row)
+            functions = [
+                _summarize_histogram(h, function=f) for f, h in self.functions.items()
+            ]
+            families: dict[str, dict[str, int]] = defaultdict(
+                lambda: {"hit": 0, "miss": 0, "stale": 0}
+            )
+            for (family, result), count in self.cache.items():
+                families[family][result] += count
+        cache = []
+        for family, counts in sorted(families.items()):
+            total = sum(counts.values())
+            cache.append(
+                dict(
+                    family=family,
+                    **counts,
+                    hit_ratio=counts["hit"] / total if total else None,
+                )
+            )
+        return dict(
+            requests=sorted(requests, key=lambda r: r["sum"], reverse=True),
+            functions=sorted(functions, key=lambda r: r["sum"], reverse=True),
+            cache=cache,
+        )
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _add_histograms(
+    lines: list[str],
+    name: str,
+    description: str,
+    histograms: dict[tuple[tuple[str, str], ...], Histogram],
+) -> None:
+    lines.append(f"# HELP {name} {description}")
+    lines.append(f"# TYPE {name} histogram")
+    for labels, histogram in sorted(histograms.items()):
+        label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+        for bucket, count in histogram.cumulative_counts():
+            lines.append(f'{name}_bucket{{{label_str},le="{bucket}"}} {count}')
+        lines.append(f"{name}_sum{{{label_str}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{label_str}}} {histogram.count}")
+
+
+def _summarize_histogram(histogram: Histogram, **labels: str | int) -> dict[str, Any]:
+    return dict(
+        **labels,
+        count=histogram.count,
+        sum=histogram.sum,
+        mean=histogram.sum / histogram.count if histogram.count else None,
+        p50=histogram.quantile(0.5),
+        p95=histogram.quantile(0.95),
+        p99=histogram.quantile(0.99),
+    )
+
+
+metrics = Metrics()
+
+
+def _current_endpoint() -> str:
+    try:
+        return request.endpoint or "unmatched"
+    except RuntimeError:
+        # Outside of a request context (e.g. cli commands)
+        return "no_request"
+
+
+def _before_cursor_execute(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: object,
+    context: None | ExecutionContext,
+    executemany: bool,
+) -> None:
+    conn.info.setdefault("query_start_time", []).append(perf_counter())
+
+
+def _after_cursor_execute(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: object,
+    context: None | ExecutionContext,
+    executemany: bool,
+) -> None:
+    start_times = conn.info.get("query_start_time")
+    if not start_times:
+        return
+    metrics.observe_query(_current_endpoint(), perf_counter() - start_times.pop())
+    if has_request_context():
+        g.metrics_queries = g.get("metrics_queries", 0) + 1
+
+
+def init_metrics(app: Flask) -> None:
+    """Register the request hooks and SQLAlchemy events used to collect metrics"""
+    metrics.enabled = True
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.before_request
+    def start_request_timer() -> None:
+        g.metrics_start_time = perf_counter()
+
+    @app.after_request
+    def store_response_status(response: Response) -> Response:
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request_time(error: None | BaseException) -> None:
+        # Also called if the request failed with an unhandled exception, in which
+        # case after_request is skipped
+        start_time = g.pop("metrics_start_time", None)
+        status = g.pop("metrics_status", 500)
+        queries = g.pop("metrics_queries", 0)
+        if start_time is not None:
+            metrics.observe_request(
+                request.endpoint or "unmatched",
+                request.method,
+                500 if error is not None else status,
+                perf_counter() - start_time,
+                queries,
+            )
@@ -23,8 +23,8 @@ class LastRide:
 
 @dataclass
 class MapPathData:
-    latitudes: str
-    longitudes: str
+    # Encoded polyline of the coordinates, see utils.spatial.encode_polyline
+    path: str
     color: str = "#20c997"
 
 
@@ -1,6 +1,7 @@
 import concurrent.futures
 import json
 import logging
+from contextvars import copy_context
 from copy import copy
 from dataclasses import dataclass, field
 from datetime import date, datetime, timedelta
@@ -17,21 +18,23 @@ from wtforms import SelectField
 from wtforms.validators import DataRequired
 
 from .database.converter import (
-    convert_ride_overview_container_to_df,
+    convert_ride_overview_frame_to_df,
 )
 from .database.model import Ride, TerrainType
 from .database.retriever import (
     get_possible_values,
-    get_ride_and_latest_track_overview,
+    get_ride_and_latest_track_overview_frame,
     get_ride_years_in_database,
     get_rides_in_timeframe,
 )
 from .forms import YearAndRideTypeForm
 from .plotting import per_month_overview_plots
+from .tracing import get_tracer
 from .utils import get_month_mapping, get_nice_timedelta_isoformat
 from .utils.base import format_timedelta, unwrap
 
 logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
 
 bp = Blueprint("overview", __name__, url_prefix="/overview")
 
@@ -159,35 +162,35 @@ def main() -> str:
     else:
         select_ride_types = select_ride_types_
 
-    overview_data = get_ride_and_latest_track_overview(
+    overview_data = get_ride_and_latest_track_overview_frame(
         selected_year, ride_type=select_ride_types
     )
 
-    for ride_data in overview_data:
+    for ride_data in overview_data.itertuples(index=False):
         this_ride_data = [
             (
                 ride_data.ride_date.date().isoformat(),
                 url_for("ride.display", id_ride=ride_data.id_ride),
             ),
             ""
-            if ride_data.ride_duration is None
+            if pd.isna(ride_data.ride_duration)
             else format_timedelta(ride_data.ride_duration),
             format_timedelta(ride_data.total_duration),
             ride_data.distance_raw,
         ]
-        if ride_data.overview_distance is None:
+        if pd.isna(ride_data.overview_distance):
             this_ride_data.extend(["", "", ""])
         else:
             this_ride_data.extend(
                 [
                     ""
-                    if ride_data.overview_avg_vel is None
+                    if pd.isna(ride_data.overview_avg_vel)
                     else round(ride_data.overview_avg_vel, 2),
                     ""
-                    if ride_data.overview_uphill is None
+                    if pd.isna(ride_data.overview_uphill)
                     else round(ride_data.overview_uphill, 2),
                     ""
-                    if ride_data.overview_downhill is None
+                    if pd.isna(ride_data.overview_downhill)
                     else round(ride_data.overview_downhill, 2),
                 ]
             )
@@ -195,9 +198,9 @@ def main() -> str:
         table_data.append(tuple(this_ride_data))
 
     plots_ = []
-    if overview_data:
+    if not overview_data.empty:
         plots_ = per_month_overview_plots(
-            overview_data,
+            convert_ride_overview_frame_to_df(overview_data),
             [
                 ("id_ride", "count", "Number of rides per Month", "Count", False),
                 ("distance", "sum", "Distance per Month", "Distance [km]", False),
@@ -251,15 +254,20 @@ def heatmap() -> str:
     ) as executor:
 
         def get_data(ride: Ride, app: Flask) -> None | pd.DataFrame:
-            with app.app_context():
+            with (
+                app.app_context(),
+                tracer.start_as_current_span("load track data", {"ride.id": ride.id}),
+            ):
                 this_track = ride.track
                 if this_track:
                     return this_track.get_track_data()
                 else:
                     return None
 
+        # Copy the context so the spans in the worker threads belong to the request
         future_datas = (
             executor.submit(
+                copy_context().run,
                 get_data,
                 ride,
                 current_app._get_current_object(),  # type: ignore
@@ -447,8 +455,8 @@ def journal() -> str:
     ride_type_btn_class_map = {}
     last_btn_class_add = None
     for week in weeks:
-        week_data = convert_ride_overview_container_to_df(
-            get_ride_and_latest_track_overview(
+        week_data = convert_ride_overview_frame_to_df(
+            get_ride_and_latest_track_overview_frame(
                 week.get_date_range(), ride_type=select_ride_types
             )
         )
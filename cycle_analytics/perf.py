@@ -0,0 +1,104 @@
+import logging
+
+from flask import Blueprint, abort, current_app, render_template, send_from_directory
+from werkzeug import Response
+
+from .metrics import metrics
+from .profiling import (
+    LISTING_ENDPOINT,
+    TOKEN_PARAMETER,
+    get_profile_dir,
+    get_request_token,
+    is_valid_token,
+    list_profiles,
+)
+from .tracing import get_recent_traces, get_trace
+
+logger = logging.getLogger(__name__)
+
+bp = Blueprint("perf", __name__)
+
+
+def _require_metrics() -> None:
+    if not current_app.config.metrics.enabled:
+        abort(404)
+
+
+def _require_tracing() -> None:
+    if not (current_app.debug and current_app.config.tracing.enabled):
+        abort(404)
+
+
+def _require_profile_access() -> str:
+    token = get_request_token()
+    if not (
+        current_app.config.profiling.enabled
+        and is_valid_token(current_app, token, LISTING_ENDPOINT)  # type: ignore
+    ):
+        abort(404)
+    return token  # type: ignore
+
+
+@bp.route("/metrics", methods=["GET"])
+def prometheus_metrics() -> Response:
+    _require_metrics()
+    return Response(
+        metrics.render_prometheus(),
+        mimetype="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@bp.route("/debug/perf", methods=["GET"])
+def dashboard() -> str:
+    _require_metrics()
+    return render_template(
+        "debug/perf.html",
+        active_page="settings",
+        summary=metrics.summary(),
+    )
+
+
+@bp.route("/debug/traces", methods=["GET"])
+def traces() -> str:
+    _require_tracing()
+    return render_template(
+        "debug/traces.html",
+        active_page="settings",
+        traces=get_recent_traces(),
+    )
+
+
+@bp.route("/debug/traces/<trace_id>", methods=["GET"])
+def waterfall(trace_id: str) -> str:
+    _require_tracing()
+    trace = get_trace(trace_id)
+    if trace is None:
+        abort(404)
+    return render_template(
+        "debug/waterfall.html",
+        active_page="settings",
+        trace=trace,
+        rows=trace.to_waterfall(),
+    )
+
+
+@bp.route("/debug/profiles", methods=["GET"])
+def profiles() -> str:
+    token = _require_profile_access()
+    return render_template(
+        "debug/profiles.html",
+        active_page="settings",
+        profiles=list_profiles(current_app),  # type: ignore
+        token_parameter=TOKEN_PARAMETER,
+        token=token,
+    )
+
+
+@bp.route("/debug/profiles/<name>", methods=["GET"])
+def download_profile(name: str) -> Response:
+    _require_profile_access()
+    return send_from_directory(
+        get_profile_dir(current_app),  # type: ignore
+        name,
+        as_attachment=True,
+    )
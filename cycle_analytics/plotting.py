@@ -1,9 +1,11 @@
 import base64
+import json
 import logging
 from datetime import timedelta
 from typing import Literal, Optional
 
 import pandas as pd
+import plotly
 import plotly.express as px
 import plotly.graph_objects as go
 from flask import current_app
@@ -11,8 +13,6 @@ from geo_track_analyzer.track import Track, VisualizationSetupError
 
 from cycle_analytics.utils.base import format_timedelta
 
-from .database.converter import convert_ride_overview_container_to_df
-from .model.base import RideOverviewContainer
 from .utils.debug import log_timing
 
 logger = logging.getLogger(__name__)
@@ -49,6 +49,11 @@ def convert_fig_to_base64(figs: list[go.Figure], width: int, height: int) -> lis
     ]
 
 
+@log_timing
+def encode_figure(fig: go.Figure | list[go.Figure]) -> str:
+    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+
+
 @log_timing
 def simple_coordinate_plot(
     data: pd.DataFrame, x: str, y: str, color: str = "white"
@@ -76,8 +81,9 @@ def update_elevation_axis(fig: go.Figure, min_elevation: float = 200) -> None:
         fig.update_layout(yaxis=dict(range=[range_min, range_min + 200]))
 
 
+@log_timing
 def per_month_overview_plots(
-    rides: list[RideOverviewContainer],
+    data: pd.DataFrame,
     plot_values: list[tuple[str, str, str, str, bool]],
     width: int = 1000,
     height: int = 600,
@@ -97,8 +103,6 @@ def per_month_overview_plots(
     :return: List of base64 encoded pngs for each passed plot_value element
     """
 
-    data = convert_ride_overview_container_to_df(rides)
-
     plots = []
     years = list(data.year.unique())
     if not years:
@@ -147,6 +151,7 @@ def per_month_overview_plots(
     return [(base64_plots[i], plot_values[i][2]) for i in range(len(plot_values))]
 
 
+@log_timing
 def get_track_elevation_plot(
     track: Track,
     include_velocity: bool,
@@ -187,6 +192,7 @@ def get_track_elevation_plot(
     return elevation_plot
 
 
+@log_timing
 def get_track_elevation_extension_plot(
     track: Track,
     plot_extension: Literal["heartrate", "cadence", "power"],
@@ -239,6 +245,7 @@ def get_track_elevation_extension_plot(
     return elevation_plot
 
 
+@log_timing
 def get_track_elevation_slope_plot(
     track: Track,
     color_neutral: str,
@@ -276,6 +283,7 @@ def get_track_elevation_slope_plot(
     return fig
 
 
+@log_timing
 def get_weekly_data_line_plot(
     data: pd.DataFrame,
     y_col: str = "distance",
@@ -357,6 +365,7 @@ def get_weekly_data_line_plot(
     return fig
 
 
+@log_timing
 def get_track_summary_plots(
     track: Track,
     metric: Literal["heartrate", "cadence", "power"],
@@ -384,3 +393,46 @@ def get_track_summary_plots(
     # fig.show()
 
     return fig
+
+
+def get_segment_efforts_plot(
+    efforts: list[tuple[str, float]],
+    personal_bests: list[tuple[str, float]],
+    color_efforts: str,
+    color_personal_bests: str,
+) -> go.Figure:
+    """
+    Elapsed times of the efforts on a segment over time
+
+    :param efforts: Date and elapsed time in seconds of the efforts
+    :param personal_bests: Date and elapsed time in seconds of the efforts that set a
+        new personal best
+    """
+    fig = go.Figure()
+    for data, name, mode, color in [
+        (efforts, "Efforts", "markers", color_efforts),
+        (personal_bests, "Personal best", "lines+markers", color_personal_bests),
+    ]:
+        fig.add_trace(
+            go.Scatter(
+                x=[date for date, _ in data],
+                y=[
+                    pd.Timestamp("1970-01-01") + timedelta(seconds=seconds)
+                    for _, seconds in data
+                ],
+                mode=mode,
+                line=dict(width=2, color=color, shape="hv"),
+                name=name,
+            )
+        )
+    fig.update_layout(
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        yaxis_title="Elapsed time",
+        font_color="white",
+        margin=dict(l=5, r=5, t=10, b=10, pad=0),
+        legend=dict(orientation="h", yanchor="bottom", y=1.0, xanchor="right", x=1),
+    )
+    fig.update_xaxes(showgrid=True, gridwidth=1, gridcolor="Gray")
+    fig.update_yaxes(showgrid=True, gridwidth=1, gridcolor="Gray", tickformat="%M:%S")
+    return fig
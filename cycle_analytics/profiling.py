@@ -0,0 +1,149 @@
+"""
+Opt-in profiling of single requests. A request is profiled if profiling is enabled,
+its endpoint is in the profiling.endpoints allow-list, and it carries a token
+signed with the secret key for this endpoint (query parameter or header). Create
+tokens with `flask profiling token <endpoint>`. Results are stored as pstats files
+in the profiles folder of the instance directory.
+"""
+
+import cProfile
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+
+import click
+from flask import Flask, current_app, g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug import Response
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PARAMETER = "profile"
+TOKEN_HEADER = "X-Profile-Token"
+# Tokens for this endpoint grant access to the listing and download of the profiles
+LISTING_ENDPOINT = "perf.profiles"
+EXTENSION_KEY = "profiling_serializer"
+
+# Only one request is profiled at a time
+_profile_lock = threading.Lock()
+
+
+def _get_serializer(app: Flask) -> URLSafeTimedSerializer:
+    return app.extensions[EXTENSION_KEY]
+
+
+def get_profile_dir(app: Flask) -> str:
+    return os.path.join(app.instance_path, "profiles")
+
+
+def create_token(app: Flask, endpoint: str) -> str:
+    return _get_serializer(app).dumps(endpoint)
+
+
+def is_valid_token(app: Flask, token: None | str, endpoint: str) -> bool:
+    if token is None:
+        return False
+    try:
+        signed_endpoint = _get_serializer(app).loads(
+            token, max_age=app.config.profiling.token_max_age
+        )
+    except BadSignature:
+        return False
+    return signed_endpoint == endpoint
+
+
+def get_request_token() -> None | str:
+    return request.args.get(TOKEN_PARAMETER) or request.headers.get(TOKEN_HEADER)
+
+
+def list_profiles(app: Flask) -> list[dict]:
+    profile_dir = get_profile_dir(app)
+    if not os.path.isdir(profile_dir):
+        return []
+    profiles = []
+    for name in os.listdir(profile_dir):
+        if not name.endswith(".pstats"):
+            continue
+        stat = os.stat(os.path.join(profile_dir, name))
+        profiles.append(
+            dict(
+                name=name,
+                size_kb=round(stat.st_size / 1024, 1),
+                created=datetime.fromtimestamp(stat.st_mtime),
+            )
+        )
+    return sorted(profiles, key=lambda p: p["created"], reverse=True)
+
+
+def init_profiling(app: Flask) -> None:
+    secret: None | str = app.config.get("SECRET_KEY")
+    if not secret:
+        raise RuntimeError("Request profiling requires a SECRET_KEY to sign tokens")
+    app.extensions[EXTENSION_KEY] = URLSafeTimedSerializer(
+        secret, salt="request-profiling"
+    )
+
+    @app.before_request
+    def start_profiler() -> None:
+        config = current_app.config.profiling
+        endpoint = request.endpoint
+        if endpoint is None or endpoint not in config.endpoints:
+            return
+        if not is_valid_token(current_app, get_request_token(), endpoint):
+            return
+        if not _profile_lock.acquire(blocking=False):
+            logger.warning("Skipping profile of %s. Profiler busy", request.path)
+            return
+        logger.info("Profiling request %s", request.full_path)
+        profiler = cProfile.Profile()
+        g.profiler = profiler
+        profiler.enable()
+
+    @app.after_request
+    def stop_profiler(response: Response) -> Response:
+        _store_profile()
+        return response
+
+    @app.teardown_request
+    def release_profiler(exception: None | BaseException) -> None:
+        # Covers requests that failed before after_request was called
+        _store_profile()
+
+    @app.cli.group("profiling")
+    def profiling_cli() -> None:
+        """Request profiling"""
+
+    @profiling_cli.command("token")
+    @click.argument("endpoint")
+    def token_command(endpoint: str) -> None:
+        """Create a token to profile requests to ENDPOINT (e.g. overview.heatmap)"""
+        if (
+            endpoint not in app.config.profiling.endpoints
+            and endpoint != LISTING_ENDPOINT
+        ):
+            raise click.ClickException(
+                f"{endpoint} is not in the profiling.endpoints allow-list"
+            )
+        token = create_token(app, endpoint)
+        click.echo(f"?{TOKEN_PARAMETER}={token}")
+        click.echo(f"{TOKEN_HEADER}: {token}")
+
+
+def _store_profile() -> None:
+    profiler: None | cProfile.Profile = g.pop("profiler", None)
+    if profiler is None:
+        return
+    try:
+        profiler.disable()
+        profile_dir = get_profile_dir(current_app)  # type: ignore
+        os.makedirs(profile_dir, exist_ok=True)
+        name = "{}_{}.pstats".format(
+            datetime.now().strftime("%Y%m%d-%H%M%S-%f"),
+            re.sub(r"[^A-Za-z0-9_.-]", "_", request.endpoint or "unknown"),
+        )
+        profiler.dump_stats(os.path.join(profile_dir, name))
+        logger.info("Stored profile %s", name)
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,155 @@
+"""
+Count the SQL statements issued within a block or request to detect N+1 patterns.
+A budget limits the total number of statements and how often the same statement
+shape (statement with normalized parameters) may repeat.
+"""
+
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+
+from flask import Flask, current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine, ExecutionContext
+from sqlalchemy.engine.interfaces import DBAPICursor
+from werkzeug import Response
+
+logger = logging.getLogger(__name__)
+
+_active_counters: ContextVar[tuple["QueryCounter", ...]] = ContextVar(
+    "active_query_counters", default=()
+)
+
+_whitespace = re.compile(r"\s+")
+_named_parameter = re.compile(r"%\(\w+\)s|:\w+")
+_parameter_list = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+class QueryBudgetExceededError(Exception):
+    pass
+
+
+def normalize_statement(statement: str) -> str:
+    """Statement shape independent of parameter style and IN list lengths"""
+    shape = _whitespace.sub(" ", statement).strip()
+    shape = _named_parameter.sub("?", shape)
+    return _parameter_list.sub("?", shape)
+
+
+class QueryCounter:
+    def __init__(self) -> None:
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def shapes(self) -> Counter[str]:
+        return Counter(normalize_statement(s) for s in self.statements)
+
+    def most_repeated(self) -> tuple[None | str, int]:
+        shapes = self.shapes.most_common(1)
+        if not shapes:
+            return None, 0
+        return shapes[0]
+
+    def violations(
+        self, max_queries: None | int = None, max_repeats: None | int = None
+    ) -> list[str]:
+        """Descriptions of all exceeded limits. Empty if the budget is met"""
+        violations = []
+        if max_queries is not None and self.count > max_queries:
+            violations.append(f"{self.count} queries exceed budget of {max_queries}")
+        if max_repeats is not None:
+            for shape, n in self.shapes.most_common():
+                if n <= max_repeats:
+                    break
+                violations.append(
+                    f"Statement repeated {n} times (max {max_repeats}): {shape}"
+                )
+        return violations
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """Count all statements executed in the current context"""
+    _ensure_listener()
+    counter = QueryCounter()
+    token = _active_counters.set((*_active_counters.get(), counter))
+    try:
+        yield counter
+    finally:
+        _active_counters.reset(token)
+
+
+@contextmanager
+def assert_query_budget(
+    max_queries: None | int = None, max_repeats: None | int = None
+) -> Iterator[QueryCounter]:
+    """
+    Test helper: Fail with an AssertionError if the statements executed in the
+    block exceed the budget.
+    """
+    with count_queries() as counter:
+        yield counter
+    violations = counter.violations(max_queries, max_repeats)
+    assert not violations, "\n".join(violations)
+
+
+def _count_statement(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: object,
+    context: None | ExecutionContext,
+    executemany: bool,
+) -> None:
+    for counter in _active_counters.get():
+        counter.statements.append(statement)
+
+
+def _ensure_listener() -> None:
+    if not event.contains(Engine, "before_cursor_execute", _count_statement):
+        event.listen(Engine, "before_cursor_execute", _count_statement)
+
+
+def init_query_budget(app: Flask) -> None:
+    """
+    Check each request against the query_budget section of the config and log a
+    warning or raise a QueryBudgetExceededError if it is exceeded.
+    """
+    _ensure_listener()
+
+    @app.before_request
+    def start_query_counter() -> None:
+        counter = QueryCounter()
+        g.query_counter = counter
+        g.query_counter_token = _active_counters.set((*_active_counters.get(), counter))
+
+    @app.after_request
+    def check_query_budget(response: Response) -> Response:
+        counter: None | QueryCounter = g.get("query_counter")
+        if counter is None:
+            return response
+        config = current_app.config.query_budget
+        max_queries = config.endpoints.get(request.endpoint, config.max_queries)
+        violations = counter.violations(max_queries, config.max_repeats)
+        if violations:
+            message = f"Query budget exceeded in {request.endpoint}: " + "; ".join(
+                violations
+            )
+            if config.action == "raise":
+                raise QueryBudgetExceededError(message)
+            logger.warning(message)
+        return response
+
+    @app.teardown_request
+    def stop_query_counter(exception: None | BaseException) -> None:
+        g.pop("query_counter", None)
+        token = g.pop("query_counter_token", None)
+        if token is not None:
+            _active_counters.reset(token)
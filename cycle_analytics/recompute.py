@@ -0,0 +1,283 @@
+"""
+Recomputation of the stored track overviews, e.g. after geo-track-analyzer changed
+how the overview values are calculated. Tracks are parsed in a process pool and only
+overviews with changed values are written. Progress is stored in a checkpoint file
+so an interrupted run can be resumed and failed tracks are retried.
+"""
+
+import json
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable
+
+from geo_track_analyzer import ByteTrack
+from sqlalchemy import delete, extract, insert, select, update
+
+from .cache import entity_tag, invalidate_tags, track_tag
+from .database.converter import initialize_overviews, overview_columns
+from .database.model import DatabaseTrack, Ride, TrackOverview, ride_track
+from .database.model import db as orm_db
+
+logger = logging.getLogger(__name__)
+
+# Relative tolerance for float values to be considered unchanged
+REL_TOLERANCE = 1e-9
+
+
+class CheckpointMismatchError(Exception):
+    pass
+
+
+@dataclass
+class RecomputeCheckpoint:
+    last_track_id: int = 0
+    processed: int = 0
+    changed_tracks: int = 0
+    failed: list[int] = field(default_factory=list)
+    # Selection (e.g. years and track ids) of the run that wrote the checkpoint
+    selection: dict[str, list[int]] = field(default_factory=dict)
+
+    @classmethod
+    def load(cls: type["RecomputeCheckpoint"], path: str) -> "RecomputeCheckpoint":
+        if not os.path.isfile(path):
+            return cls()
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def save(self, path: str) -> None:
+        # Write to a temporary file first so an interrupt can not corrupt the file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp_path, path)
+
+
+@dataclass
+class RecomputeResult:
+    processed: int = 0
+    changed_tracks: int = 0
+    updated: int = 0
+    inserted: int = 0
+    deleted: int = 0
+    failed: list[int] = field(default_factory=list)
+    duration: float = 0.0
+
+    @property
+    def tracks_per_second(self) -> float:
+        return self.processed / self.duration if self.duration else 0.0
+
+
+def compute_overview_values(
+    track_id: int, content: bytes
+) -> tuple[int, None | str, dict[None | int, dict[str, Any]]]:
+    """
+    Compute the overview values of the track and all its segments
+
+    :return: Track id, error message and the values by segment id (None for the full
+        track)
+    """
+    try:
+        overviews = initialize_overviews(ByteTrack(content), track_id)
+    except Exception as e:
+        return track_id, str(e), {}
+    return (
+        track_id,
+        None,
+        {
+            overview.id_segment: {c: getattr(overview, c) for c in overview_columns}
+            for overview in overviews
+        },
+    )
+
+
+def _is_equal(stored: None | float, value: None | float) -> bool:
+    if stored is None or value is None:
+        return stored is value
+    if isinstance(stored, float) or isinstance(value, float):
+        return math.isclose(stored, value, rel_tol=REL_TOLERANCE)
+    return stored == value
+
+
+def diff_overviews(
+    track_id: int,
+    stored: list[TrackOverview],
+    values: dict[None | int, dict[str, Any]],
+) -> tuple[list[dict], list[dict], list[int]]:
+    """
+    Compare the stored overviews of a track with the recomputed values
+
+    :return: Updates (id and changed columns), new overviews, and ids of overviews
+        of segments that do not exist anymore
+    """
+    updates = []
+    stored_by_segment = {overview.id_segment: overview for overview in stored}
+    for id_segment, segment_values in values.items():
+        overview = stored_by_segment.get(id_segment)
+        if overview is None:
+            continue
+        changed = {
+            column: value
+            for column, value in segment_values.items()
+            if not _is_equal(getattr(overview, column), value)
+        }
+        if changed:
+            updates.append(dict(id=overview.id, **changed))
+    inserts = [
+        dict(id_track=track_id, id_segment=id_segment, **segment_values)
+        for id_segment, segment_values in values.items()
+        if id_segment not in stored_by_segment
+    ]
+    deletes = [
+        overview.id
+        for id_segment, overview in stored_by_segment.items()
+        if id_segment not in values
+    ]
+    return updates, inserts, deletes
+
+
+def get_track_ids(
+    years: None | list[int] = None, track_ids: None | list[int] = None
+) -> list[int]:
+    """Ids of the tracks to recompute in ascending order"""
+    stmt = select(DatabaseTrack.id)
+    if years:
+        stmt = stmt.join(
+            ride_track, ride_track.columns["track_id"] == DatabaseTrack.id
+        ).join(Ride, ride_track.columns["ride_id"] == Ride.id)
+        stmt = stmt.filter(extract("year", Ride.ride_date).in_(years))
+    if track_ids:
+        stmt = stmt.filter(DatabaseTrack.id.in_(track_ids))
+    return sorted(set(orm_db.session.scalars(stmt)))
+
+
+def recompute_overviews(
+    track_ids: list[int],
+    checkpoint_path: None | str = None,
+    workers: None | int = None,
+    batch_size: int = 50,
+    dry_run: bool = False,
+    progress: None | Callable[[RecomputeResult], None] = None,
+    selection: None | dict[str, list[int]] = None,
+) -> RecomputeResult:
+    """
+    Recompute the overviews of the tracks and write the changed values in bulk.
+
+    :param track_ids: Tracks to recompute. Processed in ascending order
+    :param checkpoint_path: If passed, tracks up to the last track id in the
+        checkpoint are skipped and the checkpoint is updated after each batch.
+        Failed tracks in the checkpoint are retried. The checkpoint is removed once
+        all tracks were recomputed without errors
+    :param workers: Number of processes. Defaults to the number of CPUs
+    :param batch_size: Number of tracks loaded and written per commit
+    :param dry_run: Only count the changes
+    :param progress: Called with the current result after each batch
+    :param selection: Stored in the checkpoint. A checkpoint written with a
+        different selection raises a CheckpointMismatchError
+    """
+    checkpoint = RecomputeCheckpoint(selection=selection or {})
+    if checkpoint_path is not None and os.path.isfile(checkpoint_path):
+        stored_checkpoint = RecomputeCheckpoint.load(checkpoint_path)
+        if stored_checkpoint.selection != checkpoint.selection:
+            raise CheckpointMismatchError(
+                f"Checkpoint {checkpoint_path} was written for the selection "
+                f"{stored_checkpoint.selection}"
+            )
+        checkpoint = stored_checkpoint
+        logger.info(
+            "Resuming after track %s and retrying %s failed tracks",
+            checkpoint.last_track_id,
+            len(checkpoint.failed),
+        )
+    track_ids = sorted(
+        (set(checkpoint.failed) & set(track_ids))
+        | {i for i in track_ids if i > checkpoint.last_track_id}
+    )
+
+    result = RecomputeResult()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for i in range(0, len(track_ids), batch_size):
+            batch = track_ids[i : i + batch_size]
+            contents = orm_db.session.execute(
+                select(DatabaseTrack.id, DatabaseTrack.content).filter(
+                    DatabaseTrack.id.in_(batch)
+                )
+            ).all()
+            stored: dict[int, list[TrackOverview]] = {
+                id_track: [] for id_track in batch
+            }
+            for overview in orm_db.session.scalars(
+                select(TrackOverview).filter(TrackOverview.id_track.in_(batch))
+            ):
+                stored[overview.id_track].append(overview)
+
+            updates, inserts, deletes, changed_tracks = [], [], [], []
+            for track_id, error, values in executor.map(
+                compute_overview_values,
+                [id_track for id_track, _ in contents],
+                [content for _, content in contents],
+            ):
+                if error is not None:
+                    logger.error("Could not recompute track %s: %s", track_id, error)
+                    result.failed.append(track_id)
+                    continue
+                track_updates, track_inserts, track_deletes = diff_overviews(
+                    track_id, stored[track_id], values
+                )
+                if track_updates or track_inserts or track_deletes:
+                    changed_tracks.append(track_id)
+                updates.extend(track_updates)
+                inserts.extend(track_inserts)
+                deletes.extend(track_deletes)
+
+            if not dry_run:
+                if updates:
+                    orm_db.session.execute(update(TrackOverview), updates)
+                if inserts:
+                    orm_db.session.execute(insert(TrackOverview), inserts)
+                if deletes:
+                    orm_db.session.execute(
+                        delete(TrackOverview).filter(TrackOverview.id.in_(deletes))
+                    )
+                orm_db.session.commit()
+                if changed_tracks:
+                    invalidate_tags(
+                        entity_tag("ride"), *[track_tag(t) for t in changed_tracks]
+                    )
+            # Release the loaded overviews of the batch
+            orm_db.session.expunge_all()
+
+            result.processed += len(batch)
+            result.changed_tracks += len(changed_tracks)
+            result.updated += len(updates)
+            result.inserted += len(inserts)
+            result.deleted += len(deletes)
+            result.duration = time.perf_counter() - start
+
+            if checkpoint_path is not None and not dry_run:
+                checkpoint.last_track_id = max(checkpoint.last_track_id, batch[-1])
+                checkpoint.processed += len(batch)
+                checkpoint.changed_tracks += len(changed_tracks)
+                checkpoint.failed = sorted(
+                    (set(checkpoint.failed) - set(batch)) | set(result.failed)
+                )
+                checkpoint.save(checkpoint_path)
+            if progress is not None:
+                progress(result)
+
+    result.duration = time.perf_counter() - start
+    if checkpoint_path is not None and not dry_run and os.path.isfile(checkpoint_path):
+        if checkpoint.failed:
+            logger.warning(
+                "Keeping checkpoint %s to retry %s failed tracks",
+                checkpoint_path,
+                len(checkpoint.failed),
+            )
+        else:
+            # The run is complete, a new run starts from the beginning again
+            os.remove(checkpoint_path)
+    return result
@@ -1,12 +1,15 @@
 import contextlib
+import hashlib
 import json
 import logging
 from collections import deque
 from datetime import datetime, timedelta
 
-import plotly
+import pandas as pd
+import plotly.graph_objects as go
 from flask import (
     Blueprint,
+    abort,
     current_app,
     flash,
     redirect,
@@ -16,7 +19,7 @@ from flask import (
 )
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField
-from geo_track_analyzer import ByteTrack
+from geo_track_analyzer import ByteTrack, Track
 from geo_track_analyzer.exceptions import VisualizationSetupError
 from sqlalchemy import select
 from werkzeug import Response
@@ -26,22 +29,32 @@ from wtforms import (
 )
 from wtforms.validators import DataRequired
 
+from .cache import (
+    get_tagged,
+    invalidate_tags,
+    ride_tag,
+    set_tagged,
+    track_tag,
+)
 from .database.model import (
     DatabaseLocation,
+    DatabaseTrack,
     Ride,
     RideNote,
     TrackLocationAssociation,
 )
 from .database.model import db as orm_db
 from .database.modifier import switch_overview_of_interest_flag
-from .database.retriever import get_zones_for_metric
+from .efforts import update_ride_efforts
 from .model.base import MapData, MapMarker, MapPathData
 from .plotting import (
+    encode_figure,
     get_track_elevation_extension_plot,
     get_track_elevation_plot,
     get_track_elevation_slope_plot,
     get_track_summary_plots,
 )
+from .tracing import get_tracer
 from .track import _match_locations
 from .utils.base import (
     convert_locations_to_markers,
@@ -50,11 +63,24 @@ from .utils.base import (
     unwrap,
 )
 from .utils.forms import get_track_from_wtf_form
+from .utils.spatial import encode_polyline
 from .utils.track import init_db_track_and_enhance
+from .zones import get_zones, get_zones_version
 
 bp = Blueprint("ride", __name__, url_prefix="/ride")
 
 logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
+
+EXTENSIONS = ("heartrate", "cadence", "power")
+# Plots of the ride page. Each plot is loaded from the plot endpoint when the panel
+# is shown.
+PLOT_KINDS = (
+    "elevation",
+    "slope",
+    *EXTENSIONS,
+    *(f"{extension}_zones" for extension in EXTENSIONS),
+)
 
 
 class AddTrackForm(FlaskForm):
@@ -68,6 +94,140 @@ class AddTrackForm(FlaskForm):
     replace = StringField("Replace", default="0", validators=[DataRequired()])
 
 
+def _load_track(database_track: DatabaseTrack) -> Track:
+    return ByteTrack(
+        database_track.content,
+        heartrate_zones=get_zones("heartrate"),
+        cadence_zones=get_zones("cadence"),
+        power_zones=get_zones("power"),
+    )
+
+
+def get_available_plots(track_data: pd.DataFrame) -> list[str]:
+    """
+    Plot kinds that can be shown for the track data. This only checks the data, so
+    the figures are not created when rendering the page.
+    """
+
+    def has_data(column: str) -> bool:
+        return column in track_data and not track_data[column].isna().all()
+
+    kinds = []
+    if not track_data[track_data.moving].elevation.isna().all():
+        kinds.extend(["elevation", "slope"])
+        kinds.extend(e for e in EXTENSIONS if has_data(e))
+    kinds.extend(
+        f"{e}_zones" for e in EXTENSIONS if has_data(e) and f"{e}_zones" in track_data
+    )
+    return kinds
+
+
+def get_plot_figure(
+    track: Track, kind: str, segments: None | list[int] = None
+) -> None | go.Figure:
+    """
+    Create the figure of a plot of the ride page. Returns None if the track has no
+    data for the plot.
+
+    :param segments: Only show the passed segments, ignored for zone summaries
+    """
+    colors = current_app.config.style.color_sequence
+    show_segment_borders = segments is not None
+    try:
+        if kind == "elevation":
+            return get_track_elevation_plot(
+                track,
+                not track.get_track_data().speed.isna().all(),
+                segment=segments,
+                color_elevation=colors[0],
+                color_velocity=colors[1],
+                slider=True,
+                show_segment_borders=show_segment_borders,
+            )
+        if kind == "slope":
+            slope_colors = current_app.config.style.slope_colors
+            return get_track_elevation_slope_plot(
+                track=track,
+                color_neutral=slope_colors.neutral,
+                color_min=slope_colors.min,
+                color_max=slope_colors.max,
+                slider=True,
+                segment=segments,
+                show_segment_borders=show_segment_borders,
+            )
+        if kind in EXTENSIONS:
+            return get_track_elevation_extension_plot(
+                track,
+                kind,  # type: ignore
+                segment=segments,
+                color_elevation=colors[0],
+                color_extention=colors[1],
+                slider=True,
+                show_segment_borders=show_segment_borders,
+                include_zones=True,
+            )
+    except VisualizationSetupError as e:
+        logger.debug("%s plot: %s", kind, e)
+        return None
+    return get_track_summary_plots(track, kind.removesuffix("_zones"))  # type: ignore
+
+
+def get_style_hash() -> str:
+    """Hash of the style settings used for the plots"""
+    style = current_app.config.style.to_dict()
+    return hashlib.sha256(
+        json.dumps(style, sort_keys=True, default=str).encode()
+    ).hexdigest()[:16]
+
+
+def get_plot_json(
+    database_track: DatabaseTrack, kind: str, segments: None | list[int] = None
+) -> str:
+    """
+    Serialized figure of a plot of the ride page. Empty if the track has no data for
+    the plot. The figures are cached until the track content, the zones or the style
+    settings change.
+    """
+    selection = "all" if segments is None else ",".join(map(str, segments))
+    zones_version = None if kind in ("elevation", "slope") else get_zones_version()
+    key = (
+        f"ride_plot_{database_track.id}_{kind}_{selection}_{zones_version}_"
+        f"{get_style_hash()}"
+    )
+    data = get_tagged(key)
+    if isinstance(data, str):
+        logger.debug("Hit on %s", key)
+        return data
+
+    figure = get_plot_figure(_load_track(database_track), kind, segments)
+    data = "" if figure is None else encode_figure(figure)
+    set_tagged(key, data, [track_tag(database_track.id)], timeout=60 * 60 * 24)
+    return data
+
+
+@bp.route("/<int:id_ride>/plot/<kind>", methods=["GET"])
+def plot(id_ride: int, kind: str) -> Response:
+    if kind not in PLOT_KINDS:
+        abort(404)
+    segments = None
+    if request.args.get("segments"):
+        try:
+            segments = [int(s) for s in request.args["segments"].split(",")]
+        except ValueError:
+            abort(400)
+
+    ride = orm_db.get_or_404(Ride, id_ride)
+    database_track = ride.database_track
+    if database_track is None:
+        abort(404)
+
+    with tracer.start_as_current_span("plot", {"plot.kind": kind}):
+        data = get_plot_json(database_track, kind, segments)
+    if not data:
+        abort(404)
+    return Response(data, mimetype="application/json")
+
+
 @bp.route("/<int:id_ride>/", methods=("GET", "POST"))
 def display(id_ride: int) -> str | Response:
     config = current_app.config
@@ -137,6 +297,8 @@ def display(id_ride: int) -> str | Response:
                     # orm_db.session.commit()
             ride.tracks = tracks_to_insert
             orm_db.session.commit()
+            update_ride_efforts(ride)
+            invalidate_tags(ride_tag(ride.id))
 
     show_track_enhance_from = False
 
@@ -167,12 +329,10 @@ def display(id_ride: int) -> str | Response:
     database_track = ride.database_track
     track = None
     if database_track:
-        track = ByteTrack(
-            database_track.content,
-            heartrate_zones=get_zones_for_metric("heartrate"),
-            cadence_zones=get_zones_for_metric("cadence"),
-            power_zones=get_zones_for_metric("power"),
-        )
+        with tracer.start_as_current_span(
+            "load track", {"track.id": database_track.id}
+        ):
+            track = _load_track(database_track)
 
     track_data = None
     track_overview = None
@@ -241,7 +401,8 @@ def display(id_ride: int) -> str | Response:
             logger.debug("Found raw track data but no enhanced track data")
             show_track_enhance_from = True
         id_track = database_track.id
-        track_segment_data = track.get_track_data()
+        with tracer.start_as_current_span("track data"):
+            track_segment_data = track.get_track_data()
         if visualize_segments and plot_segments is not None:
             n_pre = len(track_segment_data)
             track_segment_data = track_segment_data[
@@ -255,155 +416,52 @@ def display(id_ride: int) -> str | Response:
             paths = []
             color_deque = deque(colors)
             for plot_idx_segment in plot_segments:
-                lats = track_segment_data[
+                segment_data = track_segment_data[
                     (track_segment_data.moving)
                     & (track_segment_data.segment == plot_idx_segment)
-                ].latitude.to_list()
-                lats = ",".join([str(l) for l in lats])  # noqa: E741
-                longs = track_segment_data[
-                    (track_segment_data.moving)
-                    & (track_segment_data.segment == plot_idx_segment)
-                ].longitude.to_list()
-                longs = ",".join([str(l) for l in longs])  # noqa: E741
-                paths.append(
-                    MapPathData(latitudes=lats, longitudes=longs, color=color_deque[0])
+                ]
+                path = encode_polyline(
+                    segment_data.latitude.to_numpy(), segment_data.longitude.to_numpy()
                 )
+                paths.append(MapPathData(path=path, color=color_deque[0]))
                 color_deque.rotate(-1)
         else:
-            lats = track_segment_data[track_segment_data.moving].latitude.to_list()
-            lats = ",".join([str(l) for l in lats])  # noqa: E741
-            longs = track_segment_data[track_segment_data.moving].longitude.to_list()
-            longs = ",".join([str(l) for l in longs])  # noqa: E741
-            paths = [MapPathData(latitudes=lats, longitudes=longs)]
-
-        map_data = None if is_virtual else MapData(paths=paths)
-
-        try:
-            plot2d = get_track_elevation_plot(
-                track,
-                not track_segment_data.speed.isna().all(),
-                segment=None if not visualize_segments else plot_segments,
-                color_elevation=colors[0],
-                color_velocity=colors[1],
-                slider=True,
-                show_segment_borders=visualize_segments and plot_segments is not None,
-            )
-        except VisualizationSetupError:
-            plot_elevation_and_velocity = None
-        else:
-            plot_elevation_and_velocity = json.dumps(
-                plot2d, cls=plotly.utils.PlotlyJSONEncoder
-            )
-
-        slope_colors = current_app.config.style.slope_colors
-        try:
-            slope_figure = get_track_elevation_slope_plot(
-                track=track,
-                color_neutral=slope_colors.neutral,
-                color_min=slope_colors.min,
-                color_max=slope_colors.max,
-                slider=True,
-                segment=None if not visualize_segments else plot_segments,
-                show_segment_borders=visualize_segments and plot_segments is not None,
-            )
-        except VisualizationSetupError:
-            slope_plot = None
-        else:
-            slope_plot = json.dumps(slope_figure, cls=plotly.utils.PlotlyJSONEncoder)
-
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        try:
-            hr_figure = get_track_elevation_extension_plot(
-                track,
-                "heartrate",
-                segment=None if not visualize_segments else plot_segments,
-                color_elevation=colors[0],
-                color_extention=colors[1],
-                slider=True,
-                show_segment_borders=visualize_segments and plot_segments is not None,
-                include_zones=True,
-            )
-        except VisualizationSetupError:
-            hr_plot = None
-        else:
-            hr_plot = json.dumps(hr_figure, cls=plotly.utils.PlotlyJSONEncoder)
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        try:
-            cad_figure = get_track_elevation_extension_plot(
-                track,
-                "cadence",
-                segment=None if not visualize_segments else plot_segments,
-                color_elevation=colors[0],
-                color_extention=colors[1],
-                slider=True,
-                show_segment_borders=visualize_segments and plot_segments is not None,
-                include_zones=True,
+            moving_data = track_segment_data[track_segment_data.moving]
+            path = encode_polyline(
+                moving_data.latitude.to_numpy(), moving_data.longitude.to_numpy()
             )
-        except VisualizationSetupError:
-            cad_plot = None
-        else:
-            cad_plot = json.dumps(cad_figure, cls=plotly.utils.PlotlyJSONEncoder)
+            paths = [MapPathData(path=path)]
 
-        # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-        try:
-            pw_figure = get_track_elevation_extension_plot(
-                track,
-                "power",
-                segment=None if not visualize_segments else plot_segments,
-                color_elevation=colors[0],
-                color_extention=colors[1],
-                slider=True,
-                show_segment_borders=visualize_segments and plot_segments is not None,
-                include_zones=True,
-            )
-        except VisualizationSetupError:
-            pw_plot = None
-        else:
-            pw_plot = json.dumps(pw_figure, cls=plotly.utils.PlotlyJSONEncoder)
+        map_data = None if is_virtual else MapData(paths=paths)
 
-        assoications = orm_db.session.execute(
-            select(TrackLocationAssociation).filter(
-                TrackLocationAssociation.track_id == database_track.id
+        plot_urls = {
+            kind: url_for(
+                "ride.plot",
+                id_ride=id_ride,
+                kind=kind,
+                segments=",".join(map(str, plot_segments))
+                if visualize_segments and plot_segments is not None
+                else None,
             )
-        ).scalars()
-
-        zone_summary_hr_fig = get_track_summary_plots(track, "heartrate")
-        zone_summary_hr_plot = (
-            json.dumps(zone_summary_hr_fig, cls=plotly.utils.PlotlyJSONEncoder)
-            if zone_summary_hr_fig is not None
-            else None
-        )
-        zone_summary_power_fig = get_track_summary_plots(track, "power")
-        zone_summary_power_plot = (
-            json.dumps(zone_summary_power_fig, cls=plotly.utils.PlotlyJSONEncoder)
-            if zone_summary_power_fig is not None
-            else None
-        )
-        zone_summary_cadence_fig = get_track_summary_plots(track, "cadence")
-        zone_summary_cadence_plot = (
-            json.dumps(zone_summary_cadence_fig, cls=plotly.utils.PlotlyJSONEncoder)
-            if zone_summary_cadence_fig is not None
-            else None
+            for kind in get_available_plots(track.get_track_data())
+        }
+
+        database_locations = list(
+            orm_db.session.execute(
+                select(DatabaseLocation)
+                .join(
+                    TrackLocationAssociation,
+                    TrackLocationAssociation.location_id == DatabaseLocation.id,
+                )
+                .filter(TrackLocationAssociation.track_id == database_track.id)
+            ).scalars()
         )
-
-        database_locations = []
-        for assoication in assoications:
-            database_locations.append(
-                orm_db.get_or_404(DatabaseLocation, assoication.location_id)
-            )
         location_markers = convert_locations_to_markers(database_locations)
 
     else:
         id_track = None  # type: ignore
-        plot_elevation_and_velocity = None
         map_data = None
-        slope_plot = None
-        hr_plot = None
-        cad_plot = None
-        pw_plot = None
-        zone_summary_hr_plot = None
-        zone_summary_power_plot = None
-        zone_summary_cadence_plot = None
+        plot_urls = {}
 
     located_events = []
     if ride.events:
@@ -445,14 +503,7 @@ def display(id_ride: int) -> str | Response:
         show_all_segments_clicked=show_all_segments_clicked,
         modify_segments_clicked=modify_segments_clicked,
         visualize_segments_clicked=visualize_segments,
-        plot_elevation_and_velocity=plot_elevation_and_velocity,
-        slope_plot=slope_plot,
-        heartrate_plot=hr_plot,
-        cadence_plot=cad_plot,
-        power_plot=pw_plot,
-        heartrate_zone_summary_plot=zone_summary_hr_plot,
-        power_zone_summary_plot=zone_summary_power_plot,
-        cadence_zone_summary_plot=zone_summary_cadence_plot,
+        plot_urls=plot_urls,
         map_data=map_data,
         map_markers=located_events + location_markers,
         form=form,
@@ -0,0 +1,226 @@
+"""
+Process wide cache of the pyroutelib3 routers. Routers keep the downloaded OSM tiles
+and the routing graph, so they are reused across requests with the same transport
+profile. Optionally, the loaded graphs are stored on disk and restored after a
+restart.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from flask import Flask, current_app
+from pyroutelib3 import Router
+
+from .routing_graph import CompiledRouter, RoutingGraph
+from .tracing import get_tracer
+
+logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
+
+EXTENSION_KEY = "router_cache"
+
+
+def get_profile_key(transport: str | dict) -> str:
+    """Key of a transport profile. Profiles with the same weights and access share
+    the router"""
+    if isinstance(transport, str):
+        return transport
+    profile = {k: v for k, v in transport.items() if k != "name"}
+    return hashlib.sha256(
+        json.dumps(profile, sort_keys=True, default=list).encode()
+    ).hexdigest()
+
+
+class _CachedRouter:
+    def __init__(self, router: Router) -> None:
+        self.router = router
+        # pyroutelib3 routers are not thread-safe because the graph is extended
+        # while routing if new tiles are required
+        self.lock = threading.Lock()
+
+
+class RouterCache:
+    """
+    Thread-safe LRU cache of routers keyed by the transport profile.
+
+    :param max_size: Maximum number of routers kept in memory
+    :param directory: If set, the routers are pickled into this directory after new
+        tiles were loaded and restored from it on a cache miss
+    :param max_age: Maximum age of pickled routers in seconds
+    :param factory: Creates a new router for a transport profile, e.g. the router
+        method of a compiled RoutingGraph
+    """
+
+    def __init__(
+        self,
+        max_size: int = 4,
+        directory: None | str = None,
+        max_age: float = 30 * 86400,
+        factory: Callable[[Any], Router] = Router,
+    ) -> None:
+        self.max_size = max_size
+        self.directory = directory
+        self.max_age = max_age
+        self.factory = factory
+        self._routers: OrderedDict[str, _CachedRouter] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._routers)
+
+    def __contains__(self, transport: str | dict) -> bool:
+        return get_profile_key(transport) in self._routers
+
+    def _get_path(self, key: str) -> None | str:
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def _load(self, key: str) -> None | Router:
+        path = self._get_path(key)
+        if path is None or not os.path.isfile(path):
+            return None
+        if time.time() - os.path.getmtime(path) > self.max_age:
+            logger.info("Stored router %s expired", key)
+            return None
+        try:
+            with open(path, "rb") as f:
+                router = pickle.load(f)
+        except Exception:
+            logger.exception("Could not load stored router %s", key)
+            return None
+        logger.debug("Loaded router %s with %s tiles", key, len(router.tiles))
+        return router
+
+    def _store(self, key: str, router: Router) -> None:
+        path = self._get_path(key)
+        if path is None:
+            return
+        assert self.directory is not None
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(router, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logger.debug("Stored router %s with %s tiles", key, len(router.tiles))
+
+    def _get(self, key: str, transport: str | dict) -> _CachedRouter:
+        with self._lock:
+            cached = self._routers.get(key)
+            if cached is not None:
+                self.hits += 1
+                self._routers.move_to_end(key)
+                return cached
+            self.misses += 1
+
+        # Loading or building a router is slow, other profiles are not blocked
+        router = self._load(key)
+        if router is None:
+            logger.debug("Initializing router for profile %s", key)
+            router = self.factory(transport)
+
+        with self._lock:
+            cached = self._routers.get(key)
+            if cached is not None:
+                # Another request added the router in the meantime
+                self._routers.move_to_end(key)
+                return cached
+            cached = _CachedRouter(router)
+            self._routers[key] = cached
+            while len(self._routers) > self.max_size:
+                evicted, _ = self._routers.popitem(last=False)
+                logger.debug("Evicted router for profile %s", evicted)
+            return cached
+
+    def _evict(self, key: str, cached: _CachedRouter) -> None:
+        with self._lock:
+            if self._routers.get(key) is cached:
+                del self._routers[key]
+                logger.debug("Evicted failed router for profile %s", key)
+
+    @contextmanager
+    def router(self, transport: str | dict) -> Iterator[Router]:
+        """
+        Get the router for the transport profile. The router is locked while the
+        context is active, requests with other profiles are not blocked. If routing
+        fails, the router is dropped because the graph may be partially extended.
+        """
+        key = get_profile_key(transport)
+        cached = self._get(key, transport)
+        with cached.lock:
+            n_tiles = len(cached.router.tiles)
+            try:
+                yield cached.router
+            except BaseException:
+                self._evict(key, cached)
+                raise
+            if len(cached.router.tiles) != n_tiles:
+                try:
+                    self._store(key, cached.router)
+                except OSError:
+                    logger.exception("Could not store router %s", key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._routers.clear()
+
+
+def init_router_cache(app: Flask) -> None:
+    config = app.config.routing_cache
+    if config.graph_file:
+        logger.info("Using compiled routing graph %s", config.graph_file)
+        graph = RoutingGraph.load(config.graph_file)
+        app.extensions[EXTENSION_KEY] = RouterCache(
+            max_size=config.max_size, factory=graph.router
+        )
+        return
+
+    directory = None
+    if config.persist:
+        directory = config.directory or os.path.join(app.instance_path, "routing_cache")
+    app.extensions[EXTENSION_KEY] = RouterCache(
+        max_size=config.max_size,
+        directory=directory,
+        max_age=config.max_age_days * 86400,
+    )
+
+
+def get_router_cache() -> RouterCache:
+    return current_app.extensions[EXTENSION_KEY]
+
+
+def route_legs(
+    router: Router | CompiledRouter,
+    legs: list[tuple[tuple[float, float], tuple[float, float]]],
+    max_workers: int = 1,
+) -> list[tuple[str, list[tuple[float, float]]]]:
+    """
+    Route the legs (pairs of start and end positions) of a route. Legs are
+    calculated concurrently on compiled graphs. pyroutelib3 routers extend their
+    graph while routing, so the legs are calculated one after another.
+
+    :return: Status and positions of the route for each leg
+    """
+    if isinstance(router, CompiledRouter):
+        with tracer.start_as_current_span("route legs", {"route.legs": len(legs)}):
+            return router.route_legs(legs, max_workers)
+
+    results = []
+    for i, ((start_lat, start_lng), (end_lat, end_lng)) in enumerate(legs):
+        with tracer.start_as_current_span("route leg", {"route.leg": i}):
+            status, route = router.doRoute(
+                router.findNode(start_lat, start_lng),
+                router.findNode(end_lat, end_lng),
+            )
+        results.append((status, list(map(router.nodeLatLon, route))))
+    return results
@@ -0,0 +1,385 @@
+"""
+Routing on a graph compiled from a local OSM extract. The graph is stored as flat
+arrays (node coordinates, adjacency in CSR layout, edge distances and highway tags)
+in a single file that is memory-mapped when loaded, so it is shared between
+processes through the page cache and no OSM tiles are downloaded. The legs of a
+route are calculated concurrently in a pool of processes that map the same file.
+"""
+
+import heapq
+import json
+import logging
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Literal
+
+import numpy as np
+from osmiter import iter_from_osm
+from pyroutelib3 import Datastore
+from pyroutelib3.osmparsing import getWayAllowed, getWayOneway
+from pyroutelib3.util import SEARCH_LIMIT, distHaversine
+
+from .utils.spatial import KDTree, project_equirectangular
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CAGRAPH1"
+# Arrays start at multiples of this to keep them aligned in the mapped file
+ALIGNMENT = 64
+
+OSMFileType = Literal["xml", "gz", "bz2", "pbf"]
+
+_ARRAYS = {
+    "node_lat": np.float64,
+    "node_lon": np.float64,
+    "indptr": np.int64,
+    "edge_target": np.int32,
+    "edge_distance": np.float32,
+    "edge_tag": np.uint8,
+}
+
+
+@dataclass
+class GraphInfo:
+    n_nodes: int
+    n_edges: int
+    tags: list[str]
+    access: list[str]
+    source: str
+    created: str
+
+
+def compile_graph(
+    osm_file: str,
+    output: str,
+    access: list[str],
+    file_type: None | OSMFileType = None,
+) -> GraphInfo:
+    """
+    Compile an OSM extract into a routing graph file. All ways with a highway tag
+    that are not restricted by the access tags are included. Turn restrictions are
+    not supported.
+
+    :param osm_file: Path to the .osm, .osm.gz, .osm.bz2, or .osm.pbf file
+    :param output: Path of the graph file
+    :param access: Access tags used to exclude ways (e.g. ["access", "bicycle"])
+    :param file_type: xml, gz, bz2, or pbf. Derived from the file name if None
+    """
+    if file_type is None:
+        file_type = _get_file_type(osm_file)
+
+    positions: dict[int, tuple[float, float]] = {}
+    node_index: dict[int, int] = {}
+    lats: list[float] = []
+    lons: list[float] = []
+    tags: dict[str, int] = {}
+    sources: list[int] = []
+    targets: list[int] = []
+    distances: list[float] = []
+    edge_tags: list[int] = []
+
+    def _index(node: int) -> int:
+        if node not in node_index:
+            node_index[node] = len(lats)
+            lat, lon = positions[node]
+            lats.append(lat)
+            lons.append(lon)
+        return node_index[node]
+
+    for feature in iter_from_osm(osm_file, file_type, set()):
+        if feature["type"] == "node":
+            positions[feature["id"]] = (feature["lat"], feature["lon"])
+            continue
+        if feature["type"] != "way" or "highway" not in feature["tag"]:
+            continue
+        highway = Datastore.equivalent(feature["tag"]["highway"])
+        if not getWayAllowed(feature, access):
+            continue
+        if any(node not in positions for node in feature["nd"]):
+            logger.warning("Skipping way %s with unknown nodes", feature["id"])
+            continue
+        if highway not in tags:
+            if len(tags) == np.iinfo(np.uint8).max:
+                raise ValueError("Too many different highway tags")
+            tags[highway] = len(tags)
+        oneway = getWayOneway(feature, "bicycle")
+        for node_1, node_2 in zip(feature["nd"][:-1], feature["nd"][1:]):
+            idx_1, idx_2 = _index(node_1), _index(node_2)
+            distance = distHaversine(positions[node_1], positions[node_2])
+            for source, target, allowed in (
+                (idx_1, idx_2, oneway >= 0),
+                (idx_2, idx_1, oneway <= 0),
+            ):
+                if allowed:
+                    sources.append(source)
+                    targets.append(target)
+                    distances.append(distance)
+                    edge_tags.append(tags[highway])
+
+    order = np.argsort(np.asarray(sources, dtype=np.int64), kind="stable")
+    indptr = np.zeros(len(lats) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=len(lats)), out=indptr[1:])
+    arrays = {
+        "node_lat": np.asarray(lats),
+        "node_lon": np.asarray(lons),
+        "indptr": indptr,
+        "edge_target": np.asarray(targets, dtype=np.int32)[order],
+        "edge_distance": np.asarray(distances, dtype=np.float32)[order],
+        "edge_tag": np.asarray(edge_tags, dtype=np.uint8)[order],
+    }
+    info = GraphInfo(
+        n_nodes=len(lats),
+        n_edges=len(targets),
+        tags=list(tags),
+        access=list(access),
+        source=osm_file,
+        created=datetime.now().isoformat(),
+    )
+    _write_graph(output, info, arrays)
+    logger.info(
+        "Compiled graph with %s nodes and %s edges to %s",
+        info.n_nodes,
+        info.n_edges,
+        output,
+    )
+    return info
+
+
+def _get_file_type(osm_file: str) -> OSMFileType:
+    suffixes: tuple[tuple[str, OSMFileType], ...] = (
+        (".pbf", "pbf"),
+        (".gz", "gz"),
+        (".bz2", "bz2"),
+    )
+    for suffix, file_type in suffixes:
+        if osm_file.endswith(suffix):
+            return file_type
+    return "xml"
+
+
+def _align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _write_graph(path: str, info: GraphInfo, arrays: dict[str, np.ndarray]) -> None:
+    layout: dict[str, Any] = {}
+    offset = 0
+    for name, dtype in _ARRAYS.items():
+        array = arrays[name].astype(dtype, copy=False)
+        arrays[name] = array
+        layout[name] = dict(offset=offset, length=len(array))
+        offset = _align(offset + array.nbytes)
+    header = json.dumps(dict(info=info.__dict__, arrays=layout)).encode()
+    data_start = _align(len(MAGIC) + 8 + len(header))
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name in _ARRAYS:
+            f.seek(data_start + layout[name]["offset"])
+            f.write(arrays[name].tobytes())
+
+
+class RoutingGraph:
+    """Compiled graph with memory-mapped arrays. Use load to open a graph file"""
+
+    def __init__(
+        self, info: GraphInfo, arrays: dict[str, np.ndarray], path: None | str = None
+    ) -> None:
+        self.info = info
+        self.path = path
+        self.node_lat = arrays["node_lat"]
+        self.node_lon = arrays["node_lon"]
+        self.indptr = arrays["indptr"]
+        self.edge_target = arrays["edge_target"]
+        self.edge_distance = arrays["edge_distance"]
+        self.edge_tag = arrays["edge_tag"]
+        self._kdtree: None | KDTree = None
+        self._kdtree_lock = threading.Lock()
+        self._ref_latitude = float(np.mean(self.node_lat)) if info.n_nodes else 0.0
+
+    @property
+    def kdtree(self) -> KDTree:
+        """KD-tree of the node positions. Built on first use"""
+        if self._kdtree is None:
+            with self._kdtree_lock:
+                if self._kdtree is None:
+                    logger.debug("Building KD-tree for %s nodes", self.info.n_nodes)
+                    self._kdtree = KDTree(
+                        project_equirectangular(
+                            self.node_lat, self.node_lon, self._ref_latitude
+                        )
+                    )
+        return self._kdtree
+
+    def find_node(self, lat: float, lon: float) -> int:
+        """Index of the node closest to the position"""
+        if self.info.n_nodes == 0:
+            raise KeyError("findNode in an empty graph")
+        point = project_equirectangular(
+            np.array([lat]), np.array([lon]), self._ref_latitude
+        )[0]
+        return self.kdtree.query(point)[1]
+
+    @classmethod
+    def load(cls: type["RoutingGraph"], path: str) -> "RoutingGraph":
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a compiled routing graph")
+            header_length = int.from_bytes(f.read(8), "little")
+            header = json.loads(f.read(header_length))
+        data_start = _align(len(MAGIC) + 8 + header_length)
+        arrays = {}
+        for name, dtype in _ARRAYS.items():
+            layout = header["arrays"][name]
+            if layout["length"] == 0:
+                arrays[name] = np.zeros(0, dtype=dtype)
+                continue
+            arrays[name] = np.memmap(
+                path,
+                dtype=dtype,
+                mode="r",
+                offset=data_start + layout["offset"],
+                shape=(layout["length"],),
+            )
+        return cls(GraphInfo(**header["info"]), arrays, path)
+
+    def router(self, transport: dict) -> "CompiledRouter":
+        return CompiledRouter(self, transport)
+
+
+class CompiledRouter:
+    """
+    Router on a compiled graph with the interface of the pyroutelib3 Router used by
+    the app (findNode, doRoute, nodeLatLon). Nodes are indices into the graph
+    arrays. The access tags of the transport profile are ignored, the ones used for
+    compiling the graph apply.
+    """
+
+    def __init__(self, graph: RoutingGraph, transport: dict) -> None:
+        self.graph = graph
+        weights = dict(transport["weights"])
+        self.weights = weights
+        # Multiplier of the edge distance per tag. Tags with weight 0 are impassable
+        self.factors = [
+            1 / weights[tag] if weights.get(tag, 0) > 0 else math.inf
+            for tag in graph.info.tags
+        ]
+        max_weight = max((w for w in weights.values() if w > 0), default=1)
+        self._heuristic_factor = 1 / max_weight
+        # Compatibility with pyroutelib3 routers in the RouterCache
+        self.tiles: set[tuple[int, int]] = set()
+
+    def findNode(self, lat: float, lon: float) -> int:  # noqa: N802
+        return self.graph.find_node(lat, lon)
+
+    def nodeLatLon(self, node: int) -> tuple[float, float]:  # noqa: N802
+        return float(self.graph.node_lat[node]), float(self.graph.node_lon[node])
+
+    def doRoute(self, start: int, end: int) -> tuple[str, list[int]]:  # noqa: N802
+        """A* search from start to end. Returns the status and the nodes"""
+        if start == end:
+            return "success", [start]
+        graph = self.graph
+        end_position = self.nodeLatLon(end)
+
+        def _heuristic(node: int) -> float:
+            return (
+                distHaversine(self.nodeLatLon(node), end_position)
+                * self._heuristic_factor
+            )
+
+        costs = {start: 0.0}
+        previous: dict[int, int] = {}
+        queue = [(_heuristic(start), 0.0, start)]
+        searched = 0
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == end:
+                route = [end]
+                while route[-1] != start:
+                    route.append(previous[route[-1]])
+                return "success", route[::-1]
+            if cost > costs[node]:
+                continue
+            searched += 1
+            if searched > SEARCH_LIMIT:
+                return "gave_up", []
+            first, last = int(graph.indptr[node]), int(graph.indptr[node + 1])
+            for target, distance, tag in zip(
+                graph.edge_target[first:last].tolist(),
+                graph.edge_distance[first:last].tolist(),
+                graph.edge_tag[first:last].tolist(),
+            ):
+                new_cost = cost + distance * self.factors[tag]
+                if new_cost < costs.get(target, math.inf):
+                    costs[target] = new_cost
+                    previous[target] = node
+                    heapq.heappush(
+                        queue, (new_cost + _heuristic(target), new_cost, target)
+                    )
+        return "no_route", []
+
+    def route_legs(
+        self,
+        legs: list[tuple[tuple[float, float], tuple[float, float]]],
+        max_workers: int = 1,
+    ) -> list[tuple[str, list[tuple[float, float]]]]:
+        """
+        Route all legs (pairs of start and end positions). With more than one worker,
+        the legs are calculated concurrently in a process pool.
+
+        :return: Status and positions of the route for each leg
+        """
+        nodes = [(self.findNode(*start), self.findNode(*end)) for start, end in legs]
+        if max_workers <= 1 or len(legs) <= 1 or self.graph.path is None:
+            results = []
+            for start, end in nodes:
+                status, route = self.doRoute(start, end)
+                results.append((status, [self.nodeLatLon(node) for node in route]))
+            return results
+
+        n = len(nodes)
+        return list(
+            _get_leg_executor(max_workers).map(
+                _route_leg,
+                [self.graph.path] * n,
+                [self.weights] * n,
+                [start for start, _ in nodes],
+                [end for _, end in nodes],
+            )
+        )
+
+
+_executor: None | ProcessPoolExecutor = None
+_executor_lock = threading.Lock()
+# Graphs loaded in the worker processes by path
+_worker_graphs: dict[str, RoutingGraph] = {}
+
+
+def _get_leg_executor(max_workers: int) -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Spawn is used because the app process runs threads
+            _executor = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _route_leg(
+    path: str, weights: dict[str, float], start: int, end: int
+) -> tuple[str, list[tuple[float, float]]]:
+    graph = _worker_graphs.get(path)
+    if graph is None:
+        graph = RoutingGraph.load(path)
+        _worker_graphs[path] = graph
+    router = CompiledRouter(graph, {"weights": weights})
+    status, route = router.doRoute(start, end)
+    return status, [router.nodeLatLon(node) for node in route]
@@ -8,7 +8,6 @@ from flask import (
     Blueprint,
     current_app,
     flash,
-    g,
     redirect,
     render_template,
     request,
@@ -24,13 +23,19 @@ from geo_track_analyzer.exceptions import (
 from geo_track_analyzer.track import PyTrack
 from plotly.utils import PlotlyJSONEncoder
 from pydantic import ValidationError
-from pyroutelib3 import Router
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from werkzeug import Response
 from wtforms import HiddenField, SelectField, StringField, TextAreaField
 from wtforms.validators import DataRequired, Optional
 
-from .database.model import DatabaseSegment, Difficulty, SegmentType
+from .database.model import (
+    Bike,
+    DatabaseSegment,
+    Difficulty,
+    SegmentType,
+    TerrainType,
+)
 from .database.model import db as orm_db
 from .database.modifier import modify_segment_visited_flag
 from .database.retriever import (
@@ -38,9 +43,12 @@ from .database.retriever import (
     get_segments_for_map_in_bounds,
     get_unique_model_objects_in_db,
 )
+from .leaderboards import ANY, get_leaderboard, get_leaderboard_filters
 from .model.base import MapData, MapPathData
 from .plotting import (
     convert_fig_to_base64,
+    encode_figure,
+    get_segment_efforts_plot,
     get_track_elevation_plot,
     get_track_elevation_slope_plot,
 )
@@ -48,11 +56,15 @@ from .rest_models import (
     SegmentsInBoundsRequest,
     SegmentsInBoundsResponse,
 )
-from .utils import find_closest_elem_to_poi
+from .routing import get_router_cache, route_legs
+from .tracing import get_tracer
+from .utils import find_closest_elems_to_pois
 from .utils.base import convert_locations_to_markers, unwrap
 from .utils.forms import flash_form_error
+from .utils.spatial import encode_polyline
 
 logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
 
 bp = Blueprint("segments", __name__, url_prefix="/segments")
 
@@ -133,12 +145,12 @@ def show_segment(id_segment: int) -> str | Response:
 
     track_segment_data = segment_track.get_segment_data(0)
 
-    lats = track_segment_data[track_segment_data.moving].latitude.to_list()
-    lats = ",".join([str(l) for l in lats])  # noqa: E741
-    longs = track_segment_data[track_segment_data.moving].longitude.to_list()
-    longs = ",".join([str(l) for l in longs])  # noqa: E741
+    moving_data = track_segment_data[track_segment_data.moving]
+    path = encode_polyline(
+        moving_data.latitude.to_numpy(), moving_data.longitude.to_numpy()
+    )
 
-    map_data = MapData(paths=[MapPathData(latitudes=lats, longitudes=longs)])
+    map_data = MapData(paths=[MapPathData(path=path)])
 
     if segment_track.track.has_elevations():
         slope_colors = current_app.config.style.slope_colors
@@ -155,12 +167,52 @@ def show_segment(id_segment: int) -> str | Response:
     else:
         plot_elevation = None
 
+    try:
+        id_bike = int(request.args.get("bike", ANY))
+        id_terrain_type = int(request.args.get("ride_type", ANY))
+    except ValueError:
+        id_bike, id_terrain_type = ANY, ANY
+    leaderboard = get_leaderboard(id_segment, id_bike, id_terrain_type)
+    bike_ids, terrain_type_ids = get_leaderboard_filters(id_segment)
+    leaderboard_bikes = orm_db.session.execute(
+        select(Bike.id, Bike.name).where(Bike.id.in_(bike_ids)).order_by(Bike.id)
+    ).all()
+    leaderboard_ride_types = orm_db.session.execute(
+        select(TerrainType.id, TerrainType.text)
+        .where(TerrainType.id.in_(terrain_type_ids))
+        .order_by(TerrainType.id)
+    ).all()
+
+    plot_efforts = None
+    if leaderboard.history:
+        plot_efforts = encode_figure(
+            get_segment_efforts_plot(
+                [
+                    (e.ride_date, e.elapsed_time_seconds)
+                    for e in leaderboard.recent
+                    if e.elapsed_time_seconds is not None
+                ],
+                [
+                    (e.ride_date, unwrap(e.elapsed_time_seconds))
+                    for e in leaderboard.history
+                ],
+                color_efforts=current_app.config.style.color_sequence[0],
+                color_personal_bests=current_app.config.style.color_marker,
+            )
+        )
+
     return render_template(
         "segments/show.html",
         active_page="segments",
         data=segment,
         map_data=map_data,
         plot_elevation=plot_elevation,
+        leaderboard=leaderboard,
+        leaderboard_bikes=leaderboard_bikes,
+        leaderboard_ride_types=leaderboard_ride_types,
+        selected_bike=id_bike,
+        selected_ride_type=id_terrain_type,
+        plot_efforts=plot_efforts,
     )
 
 
@@ -325,13 +377,6 @@ def get_transport_settings() -> (
     return settings
 
 
-def get_router(transport: str | dict) -> Router:
-    if "osm_router" not in g:
-        logger.debug("Initializing router")
-        g.osm_router = Router(transport)
-    return g.osm_router
-
-
 @bp.route("/calc-route", methods=["POST"])
 def calcualte_route() -> dict | tuple[dict, int]:
     config = current_app.config
@@ -343,23 +388,26 @@ def calcualte_route() -> dict | tuple[dict, int]:
     transport_settings["access"] = current_app.config.routing.access
     transport_settings["weights"] = request_transport_settings
 
-    router = get_router(transport_settings)
     waypoints = request.json["waypoints"]  # type: ignore
     calc_route_for = [(waypoints[0], waypoints[1])]
     for waypoint in waypoints[2::]:
         i = len(calc_route_for) - 1
         calc_route_for.append((calc_route_for[i][1], waypoint))
 
-    route_segments = []
-    for i, ((start_lat, start_lng), (end_lat, end_lng)) in enumerate(calc_route_for):
-        status, route = router.doRoute(
-            router.findNode(start_lat, start_lng), router.findNode(end_lat, end_lng)
+    with get_router_cache().router(transport_settings) as router:
+        leg_routes = route_legs(
+            router, calc_route_for, config.routing_cache.leg_workers
         )
+
+    route_segments = []
+    for i, (
+        (status, route_lat_lons),
+        ((start_lat, start_lng), (end_lat, end_lng)),
+    ) in enumerate(zip(leg_routes, calc_route_for)):
         if status == "success":
             logger.debug("Found route for waypoints:")
             logger.debug("  Start: %s / %s", start_lat, start_lng)
             logger.debug("    End: %s / %s", end_lat, end_lng)
-            route_lat_lons = list(map(router.nodeLatLon, route))
             route_segments.append(route_lat_lons)
         else:
             return {
@@ -389,7 +437,8 @@ def calcualte_route() -> dict | tuple[dict, int]:
     generate_elevation_plot = False
     if enhancer is not None:
         try:
-            enhancer.enhance_track(track.track, True)
+            with tracer.start_as_current_span("enhance route"):
+                enhancer.enhance_track(track.track, True)
         except APIResponseError:
             logger.error("Could not enhance track with elevation")
         else:
@@ -407,17 +456,17 @@ def calcualte_route() -> dict | tuple[dict, int]:
             (track_segment_data.iloc[0].latitude, track_segment_data.iloc[0].longitude)
         )
 
-        for waypoint in waypoints[1:-1]:
-            wp_lat, wp_lng = waypoint
-            closest_idx = find_closest_elem_to_poi(
-                track_segment_data.iloc[1:-1], wp_lat, wp_lng, True
-            )
-            pois.append(
-                (
-                    track_segment_data.iloc[closest_idx + 1].latitude,
-                    track_segment_data.iloc[closest_idx + 1].longitude,
-                )
+        closest_idxs = find_closest_elems_to_pois(
+            track_segment_data.iloc[1:-1],
+            [(wp_lat, wp_lng) for wp_lat, wp_lng in waypoints[1:-1]],
+        )
+        pois.extend(
+            (
+                track_segment_data.iloc[closest_idx + 1].latitude,
+                track_segment_data.iloc[closest_idx + 1].longitude,
             )
+            for closest_idx in closest_idxs
+        )
 
         pois.append(
             (
@@ -2,9 +2,11 @@ import logging
 from io import BytesIO
 from typing import BinaryIO, Tuple
 
+from flask import Response, stream_with_context
 from geo_track_analyzer import ByteTrack
 
 from .database.model import DatabaseSegment, DatabaseTrack, db
+from .exporter import get_export_file_name, iter_export_archive
 
 logger = logging.getLogger(__name__)
 
@@ -18,7 +20,8 @@ def get_track_download(track_id: int) -> Tuple[BinaryIO, str]:
     logger.info("Serving gpx track for id %s", track_id)
     track = db.get_or_404(DatabaseTrack, track_id)
 
-    binary_data = BytesIO(ByteTrack(track.content).get_xml().encode())
+    # The content is stored as GPX so it can be served without parsing it
+    binary_data = BytesIO(track.content)
     file_name = f"track_{track_id}.gpx"
 
     return binary_data, file_name
@@ -38,3 +41,25 @@ def get_segment_download(segment_id: int) -> tuple[BytesIO, str]:
     file_name = f"segment_{segment_id}_{segment.name.replace(' ', '_')}.gpx"
 
     return binary_data, file_name
+
+
+def get_archive_download(years: list[int], ride_types: list[str]) -> Response:
+    """Create a streaming response with the zip archive of the rides
+
+    :param years: Years to export. All years if empty
+    :param ride_types: Ride types to export. All ride types if empty
+    :return: Response streaming the zip archive
+    """
+    timeframe: list[int] | str = years if years else "All"
+    logger.info("Serving export archive for %s", timeframe)
+    return Response(
+        stream_with_context(
+            iter_export_archive(timeframe, ride_types if ride_types else "Any")
+        ),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": (
+                f"attachment; filename={get_export_file_name(timeframe)}"
+            )
+        },
+    )
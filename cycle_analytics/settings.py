@@ -8,7 +8,7 @@ from pydantic import ValidationError
 
 from .cache import cache
 from .database.modifier import update_zones
-from .database.retriever import get_zones_for_metric
+from .zones import get_zones
 
 logger = logging.getLogger(__name__)
 
@@ -108,7 +108,7 @@ def modify_zones(metric: str) -> str:
         else:
             update_zones(post_zones, zone_metric.value)
 
-    zones = get_zones_for_metric(zone_metric.value)
+    zones = get_zones(zone_metric.value)
     if not zones:
         zones = Zones(
             intervals=[
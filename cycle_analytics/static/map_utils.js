@@ -15,6 +15,37 @@ export function show_polyline(map, points, color = "#20c997") {
   return polyline;
 }
 
+/**
+* Decode a polyline encoded with the Google encoded polyline algorithm
+* (see encode_polyline in utils/spatial.py)
+* @param {string} encoded - Encoded polyline
+* @param {number} precision - Number of decimals of the coordinates
+* @returns {Array<Array<number>>} Latitudes and longitudes of the points
+*/
+export function decode_polyline(encoded, precision = 5) {
+  const factor = Math.pow(10, precision);
+  let lats = [];
+  let longs = [];
+  let coordinates = [0, 0];
+  let index = 0;
+  while (index < encoded.length) {
+    for (let i = 0; i < 2; i++) {
+      let result = 0;
+      let shift = 0;
+      let chunk;
+      do {
+        chunk = encoded.charCodeAt(index++) - 63;
+        result += (chunk & 0x1f) * Math.pow(2, shift);
+        shift += 5;
+      } while (chunk >= 0x20);
+      coordinates[i] += result % 2 ? -(result + 1) / 2 : result / 2;
+    }
+    lats.push(coordinates[0] / factor);
+    longs.push(coordinates[1] / factor);
+  }
+  return [lats, longs];
+}
+
 export class PolyLineData {
   constructor(lats, longs, color) {
     this.lats = lats;
@@ -26,6 +57,11 @@ export class PolyLineData {
     }
   }
 
+  static from_encoded(encoded, color) {
+    const [lats, longs] = decode_polyline(encoded);
+    return new PolyLineData(lats, longs, color);
+  }
+
   set_path_on_map(map) {
     let points = [];
 
@@ -37,17 +73,8 @@ export class PolyLineData {
   }
 }
 
-export function set_path_on_map(map, lats, longs, color = "#20c997") {
-  const lat_points = lats.split(",");
-  const long_points = longs.split(",");
-
-  let points = [];
-
-  for (let i = 0; i < lat_points.length; i++) {
-    points.push([lat_points[i], long_points[i]]);
-  }
-
-  return Rhow_polyline(map, points, (color = color));
+export function set_path_on_map(map, encoded, color = "#20c997") {
+  return PolyLineData.from_encoded(encoded, color).set_path_on_map(map);
 }
 
 export function get_map_layer(type) {
@@ -133,9 +160,9 @@ export function show_map_for_form(
   return map;
 }
 
-export function show_map_for_form_path(div_id, btn_id, height, lats, longs) {
+export function show_map_for_form_path(div_id, btn_id, height, encoded) {
   let map = show_map_for_form(div_id, btn_id, height, 1, 1, 1, []);
-  set_path_on_map(map, lats, longs);
+  set_path_on_map(map, encoded);
   return map;
 }
 
@@ -0,0 +1,56 @@
+// Plots of the ride page are loaded from the plot endpoint when they are shown
+const loaded_plots = new Set();
+
+/**
+* Load the plot from the url in the data-plot-url attribute of the div. Plots are
+* only loaded once.
+* @param {string} div_id - Id of the plot div
+*/
+function load_plot(div_id) {
+  const div = document.getElementById(div_id);
+  if (div === null || loaded_plots.has(div_id)) {
+    return;
+  }
+  loaded_plots.add(div_id);
+
+  fetch(div.dataset.plotUrl, { headers: { Accept: "application/json" } })
+    .then((response) => {
+      if (!response.ok) {
+        throw new Error(`Loading plot failed with status ${response.status}`);
+      }
+      return response.json();
+    })
+    .then((chart) => {
+      const config = {
+        displayModeBar: false,
+        responsive: true,
+        width: Number(div.dataset.plotWidth ?? 10),
+      };
+      Plotly.newPlot(div_id, chart["data"], chart["layout"], config);
+    })
+    .catch((error) => {
+      console.warn(error);
+      div.textContent = "Plot not available";
+    });
+}
+
+/**
+* Load the plots as soon as they are scrolled into view
+* @param {Array<string>} div_ids - Ids of the plot divs
+*/
+function load_plots_when_visible(div_ids) {
+  const observer = new IntersectionObserver((entries) => {
+    for (const entry of entries) {
+      if (entry.isIntersecting) {
+        observer.unobserve(entry.target);
+        load_plot(entry.target.id);
+      }
+    }
+  });
+  for (const div_id of div_ids) {
+    const div = document.getElementById(div_id);
+    if (div !== null) {
+      observer.observe(div);
+    }
+  }
+}
@@ -0,0 +1,375 @@
+"""
+Minimal span tracing for the app. The API follows the tracer API of opentelemetry
+(get_tracer, start_as_current_span, set_attribute, record_exception) so spans can
+be exported without an external collector. Finished traces are written to stdout
+or a json lines file and the most recent ones are kept in memory for the waterfall
+view under /debug/traces.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import traceback
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from secrets import randbits
+from time import time_ns
+from typing import IO, Any, Iterator
+
+from flask import Flask, g, request, template_rendered
+from flask.signals import before_render_template
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import (
+    Connection,
+    Engine,
+    ExceptionContext,
+    ExecutionContext,
+)
+from sqlalchemy.engine.interfaces import DBAPICursor
+from werkzeug import Response
+
+logger = logging.getLogger(__name__)
+
+AttributeValue = str | bool | int | float
+
+_current_span: ContextVar["None | Span"] = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """Collection of the finished spans sharing one trace id"""
+
+    def __init__(self, trace_id: int) -> None:
+        self.trace_id = trace_id
+        self.spans: list[Span] = []
+
+    @property
+    def root(self) -> "Span":
+        return next(s for s in self.spans if s.parent is None)
+
+    def to_waterfall(self) -> list[dict[str, Any]]:
+        """Spans sorted by start time with offsets relative to the root span"""
+        root = self.root
+        total = max(root.duration_ns, 1)
+        depths: dict[int, int] = {}
+        rows = []
+        for span in sorted(self.spans, key=lambda s: (s.start_time, s.end_time)):
+            depth = 0 if span.parent is None else depths.get(span.parent, 0) + 1
+            depths[span.span_id] = depth
+            rows.append(
+                dict(
+                    name=span.name,
+                    depth=depth,
+                    start_ms=(span.start_time - root.start_time) / 1e6,
+                    duration_ms=span.duration_ns / 1e6,
+                    offset_pct=100 * (span.start_time - root.start_time) / total,
+                    width_pct=max(100 * span.duration_ns / total, 0.2),
+                    attributes=span.attributes,
+                    status=span.status,
+                )
+            )
+        return rows
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        trace: Trace,
+        parent: None | int,
+        attributes: None | dict[str, AttributeValue] = None,
+    ) -> None:
+        self.name = name
+        self.trace = trace
+        self.span_id = randbits(64)
+        self.parent = parent
+        self.attributes: dict[str, AttributeValue] = dict(attributes or {})
+        self.events: list[dict[str, Any]] = []
+        self.status = "UNSET"
+        self.start_time = time_ns()
+        self.end_time: None | int = None
+
+    @property
+    def duration_ns(self) -> int:
+        return (self.end_time or time_ns()) - self.start_time
+
+    def is_recording(self) -> bool:
+        return self.end_time is None
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: dict[str, AttributeValue]) -> None:
+        self.attributes.update(attributes)
+
+    def add_event(
+        self, name: str, attributes: None | dict[str, AttributeValue] = None
+    ) -> None:
+        self.events.append(
+            dict(name=name, timestamp=time_ns(), attributes=attributes or {})
+        )
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.status = "ERROR"
+        self.add_event(
+            "exception",
+            {
+                "exception.type": type(exception).__name__,
+                "exception.message": str(exception),
+                "exception.stacktrace": "".join(traceback.format_exception(exception)),
+            },
+        )
+
+    def end(self) -> None:
+        if self.end_time is not None:
+            return
+        self.end_time = time_ns()
+        if self.status == "UNSET":
+            self.status = "OK"
+        self.trace.spans.append(self)
+        if self.parent is None:
+            _export(self.trace)
+
+    def to_json(self) -> dict[str, Any]:
+        """Span in the layout of the opentelemetry console exporter"""
+        return {
+            "name": self.name,
+            "context": {
+                "trace_id": f"0x{self.trace.trace_id:032x}",
+                "span_id": f"0x{self.span_id:016x}",
+            },
+            "parent_id": None if self.parent is None else f"0x{self.parent:016x}",
+            "start_time": _format_ns(self.start_time),
+            "end_time": None if self.end_time is None else _format_ns(self.end_time),
+            "status": {"status_code": self.status},
+            "attributes": self.attributes,
+            "events": [
+                dict(e, timestamp=_format_ns(e["timestamp"])) for e in self.events
+            ],
+        }
+
+
+class NonRecordingSpan:
+    """Span returned while tracing is disabled"""
+
+    def is_recording(self) -> bool:
+        return False
+
+    def set_attribute(self, key: str, value: AttributeValue) -> None:
+        pass
+
+    def set_attributes(self, attributes: dict[str, AttributeValue]) -> None:
+        pass
+
+    def add_event(
+        self, name: str, attributes: None | dict[str, AttributeValue] = None
+    ) -> None:
+        pass
+
+    def record_exception(self, exception: BaseException) -> None:
+        pass
+
+    def end(self) -> None:
+        pass
+
+
+_non_recording_span = NonRecordingSpan()
+
+
+class Tracer:
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def start_span(
+        self, name: str, attributes: None | dict[str, AttributeValue] = None
+    ) -> Span | NonRecordingSpan:
+        if not _state.enabled:
+            return _non_recording_span
+        parent = _current_span.get()
+        if parent is None:
+            return Span(name, Trace(randbits(128)), None, attributes)
+        return Span(name, parent.trace, parent.span_id, attributes)
+
+    @contextmanager
+    def start_as_current_span(
+        self, name: str, attributes: None | dict[str, AttributeValue] = None
+    ) -> Iterator[Span | NonRecordingSpan]:
+        """
+        Start a span and make it the parent of all spans started within the
+        context. Can also be used as decorator.
+        """
+        span = self.start_span(name, attributes)
+        if isinstance(span, NonRecordingSpan):
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+
+def get_tracer(name: str) -> Tracer:
+    return Tracer(name)
+
+
+def get_current_span() -> Span | NonRecordingSpan:
+    span = _current_span.get()
+    return _non_recording_span if span is None else span
+
+
+class _TracingState:
+    def __init__(self) -> None:
+        self.enabled = False
+        self.output: None | IO[str] = None
+        self.recent: deque[Trace] = deque(maxlen=50)
+        self.lock = threading.Lock()
+
+
+_state = _TracingState()
+
+
+def get_recent_traces() -> list[Trace]:
+    with _state.lock:
+        return list(reversed(_state.recent))
+
+
+def get_trace(trace_id: str) -> None | Trace:
+    for trace in get_recent_traces():
+        if f"{trace.trace_id:032x}" == trace_id:
+            return trace
+    return None
+
+
+def _format_ns(timestamp: int) -> str:
+    return datetime.fromtimestamp(timestamp / 1e9, tz=timezone.utc).isoformat()
+
+
+def _export(trace: Trace) -> None:
+    with _state.lock:
+        _state.recent.append(trace)
+        if _state.output is not None:
+            for span in trace.spans:
+                _state.output.write(json.dumps(span.to_json(), default=str) + "\n")
+            _state.output.flush()
+
+
+def init_tracing(app: Flask) -> None:
+    """
+    Enable tracing based on the tracing section of the config. Every request gets a
+    root span, queries and template rendering are recorded as child spans.
+    """
+    config = app.config.tracing
+    _state.enabled = True
+    _state.recent = deque(maxlen=int(config.n_recent))
+    if config.exporter == "stdout":
+        _state.output = sys.stdout
+    elif config.exporter == "file":
+        os.makedirs(app.instance_path, exist_ok=True)
+        _state.output = open(  # noqa: SIM115
+            os.path.join(app.instance_path, config.file), "a", encoding="utf-8"
+        )
+    elif config.exporter != "none":
+        raise ValueError(f"Unsupported trace exporter {config.exporter}")
+
+    tracer = get_tracer(__name__)
+
+    if not event.contains(Engine, "before_cursor_execute", _start_query_span):
+        event.listen(Engine, "before_cursor_execute", _start_query_span)
+        event.listen(Engine, "after_cursor_execute", _end_query_span)
+        event.listen(Engine, "handle_error", _fail_query_span)
+
+    @app.before_request
+    def start_request_span() -> None:
+        span = tracer.start_span(
+            f"{request.method} {request.endpoint}",
+            {"http.method": request.method, "http.target": request.full_path},
+        )
+        if isinstance(span, Span):
+            g.tracing_span = span
+            g.tracing_token = _current_span.set(span)
+
+    @app.after_request
+    def set_response_attributes(response: Response) -> Response:
+        span = g.get("tracing_span")
+        if span is not None:
+            span.set_attribute("http.status_code", response.status_code)
+        return response
+
+    @app.teardown_request
+    def end_request_span(exception: None | BaseException) -> None:
+        span = g.pop("tracing_span", None)
+        token = g.pop("tracing_token", None)
+        if span is None:
+            return
+        if exception is not None:
+            span.record_exception(exception)
+        if token is not None:
+            _current_span.reset(token)
+        span.end()
+
+    def start_template_span(
+        sender: Flask, template: Template, context: dict, **kwargs: object
+    ) -> None:
+        span = tracer.start_span(f"render {template.name}")
+        if isinstance(span, Span):
+            g.setdefault("tracing_template_spans", []).append(
+                (span, _current_span.set(span))
+            )
+
+    def end_template_span(
+        sender: Flask, template: Template, context: dict, **kwargs: object
+    ) -> None:
+        spans = g.get("tracing_template_spans")
+        if spans:
+            span, token = spans.pop()
+            _current_span.reset(token)
+            span.end()
+
+    before_render_template.connect(start_template_span, app, weak=False)
+    template_rendered.connect(end_template_span, app, weak=False)
+
+
+def _start_query_span(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: object,
+    context: None | ExecutionContext,
+    executemany: bool,
+) -> None:
+    if _current_span.get() is None:
+        return
+    span = get_tracer(__name__).start_span("sql", {"db.statement": statement})
+    conn.info.setdefault("tracing_query_spans", []).append(span)
+
+
+def _end_query_span(
+    conn: Connection,
+    cursor: DBAPICursor,
+    statement: str,
+    parameters: object,
+    context: None | ExecutionContext,
+    executemany: bool,
+) -> None:
+    spans = conn.info.get("tracing_query_spans")
+    if spans:
+        spans.pop().end()
+
+
+def _fail_query_span(context: ExceptionContext) -> None:
+    if context.connection is None:
+        return
+    spans = context.connection.info.get("tracing_query_spans")
+    if spans:
+        span = spans.pop()
+        span.record_exception(context.original_exception)
+        span.end()
@@ -25,7 +25,7 @@ from werkzeug import Response
 from wtforms import HiddenField
 from wtforms.validators import DataRequired
 
-from .cache import cache
+from .cache import cache, invalidate_tags, ride_tag
 from .database.converter import initialize_overviews
 from .database.model import DatabaseTrack, Ride, TrackLocationAssociation
 from .database.model import db as orm_db
@@ -38,11 +38,14 @@ from .database.retriever import (
     get_ride_for_track,
     get_rides_with_tracks,
 )
+from .efforts import update_ride_efforts
 from .forms import TrackUploadForm
 from .model.base import MapData, MapPathData
 from .plotting import get_track_elevation_slope_plot
 from .utils.base import format_timedelta, unwrap
+from .utils.debug import log_timing
 from .utils.forms import get_track_from_file_storage, get_track_from_wtf_form
+from .utils.spatial import encode_polyline
 from .utils.track import check_location_in_track, get_enhanced_db_track
 from .utils.view_data import segment_summary
 
@@ -85,11 +88,14 @@ def enhance_track(id_ride: int) -> Response:
 
     ride.tracks.append(new_db_track)
     orm_db.session.commit()
+    invalidate_tags(ride_tag(id_ride))
     flash("Track enhanced", "alert-success")
     _match_locations(new_db_track)
+    update_ride_efforts(ride)
     return redirect(url_for("ride.display", id_ride=id_ride))
 
 
+@log_timing
 def _match_locations(database_track: DatabaseTrack) -> None:
     max_distance = current_app.config.matching.distance
     track = ByteTrack(database_track.content)
@@ -212,19 +218,18 @@ def compare() -> str | Response:
     )
 
 
+@log_timing
 def _get_map_data(track: Track, segment: None | int = None) -> tuple[MapData, int]:
     track_segment_data = track.get_track_data()
     if segment is not None:
         track_segment_data = track_segment_data[track_segment_data.segment == segment]
         if track_segment_data.empty:
             raise RuntimeError
-    lats = track_segment_data.latitude.to_list()
-    n_points = len(lats)
-    lats = ",".join([str(l) for l in lats])  # noqa: E741
-    longs = track_segment_data.longitude.to_list()
-    longs = ",".join([str(l) for l in longs])  # noqa: E741
-    paths = [MapPathData(latitudes=lats, longitudes=longs)]
-    return MapData(paths=paths), n_points
+    n_points = len(track_segment_data)
+    path = encode_polyline(
+        track_segment_data.latitude.to_numpy(), track_segment_data.longitude.to_numpy()
+    )
+    return MapData(paths=[MapPathData(path=path)]), n_points
 
 
 @bp.route("trim/", methods=("GET", "POST"))
@@ -247,7 +252,7 @@ def trim() -> str | Response:
         map_data, n_points = _get_map_data(track)
         trim_database_form.track_id.data = track_id
         trim_database_form.start_idx.data = 0
-        trim_database_form.end_idx.data = len(map_data.paths[0].latitudes) - 1
+        trim_database_form.end_idx.data = n_points - 1
     if form.validate_on_submit():
         try:
             track = get_track_from_wtf_form(form, "track")
@@ -270,7 +275,7 @@ def trim() -> str | Response:
                 timeout=track_cache_timeout_seconds,
             )
             trim_form.start_idx.data = 0
-            trim_form.end_idx.data = len(map_data.paths[0].latitudes) - 1
+            trim_form.end_idx.data = n_points - 1
             trim_form.cache_key.data = cache_key
             trim_form.orig_file_name.data = ".".join(file_name.split(".")[0:-1])
 
@@ -330,7 +335,8 @@ def trim() -> str | Response:
 
             ride_id = get_ride_for_track(form_track_id)
             assert ride_id is not None
-            cache.clear()
+            update_ride_efforts(orm_db.get_or_404(Ride, ride_id))
+            invalidate_tags(ride_tag(ride_id))
             return redirect(url_for("ride.display", id_ride=ride_id))
 
         else:
@@ -431,7 +437,8 @@ def add_segments(id_track: int) -> str | Response:
                     initialize_overviews(track, id_track),
                 )
                 ride_id = get_ride_for_track(id_track)
-                cache.clear()
+                if ride_id is not None:
+                    invalidate_tags(ride_tag(ride_id))
                 return redirect(url_for("ride.display", id_ride=ride_id))
             else:
                 flash("Updating track content failed" "alert-warning")
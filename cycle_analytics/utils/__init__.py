@@ -1,6 +1,7 @@
 from .base import (
     compare_values,
     find_closest_elem_to_poi,
+    find_closest_elems_to_pois,
     get_date_range_from_year_month,
     get_month_mapping,
     get_nice_timedelta_isoformat,
@@ -12,4 +13,5 @@ __all__ = [
     "get_month_mapping",
     "get_date_range_from_year_month",
     "find_closest_elem_to_poi",
+    "find_closest_elems_to_pois",
 ]
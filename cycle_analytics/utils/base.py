@@ -4,12 +4,14 @@ from copy import copy
 from datetime import date, timedelta
 from typing import Literal, TypeVar
 
+import numpy as np
 import pandas as pd
 import tldextract
 from flask import url_for
 
 from ..database.model import DatabaseLocation
 from ..model.base import MapMarker
+from .spatial import KDTree, project_equirectangular
 
 T = TypeVar("T")
 
@@ -102,6 +104,37 @@ def get_date_range_from_year_month(year: int, month: None | int) -> tuple[date,
             return date(year, month, 1), date(year, month + 1, 1) - timedelta(days=1)
 
 
+def find_closest_elems_to_pois(
+    data: pd.DataFrame, pois: list[tuple[float, float]]
+) -> list[int]:
+    """
+    Find the closest element in the passed data for each of the passed lat and lng
+    values. The points are indexed once with a KD-tree on equirectangular projected
+    coordinates so many pois can be matched on long tracks.
+
+    :param data: Dataframe containing *latitude* and *longitude* columns
+    :param pois: List of reference latitude and longitude pairs
+    :raises RuntimeError: If the data is empty and pois are passed
+    :return: Positional indices in the dataframe closest to the pois
+    """
+    if not pois:
+        return []
+    if data.empty:
+        raise RuntimeError("Can not find closest element in empty data")
+
+    latitudes = data["latitude"].to_numpy()
+    ref_latitude = float(latitudes.mean())
+    tree = KDTree(
+        project_equirectangular(latitudes, data["longitude"].to_numpy(), ref_latitude)
+    )
+    projected_pois = project_equirectangular(
+        np.array([lat for lat, _ in pois]),
+        np.array([lng for _, lng in pois]),
+        ref_latitude,
+    )
+    return [tree.query(poi)[1] for poi in projected_pois]
+
+
 def find_closest_elem_to_poi(
     data: pd.DataFrame, lat: float, lng: float, greedy: bool = True
 ) -> int:
@@ -112,28 +145,13 @@ def find_closest_elem_to_poi(
     :param data: Dataframe containing *latitude* and *longitude* columns
     :param lat: Reference latitude
     :param lng: Reference longitude
-    :param greedy: If True the search will stop as soon as the residuals start
-                   to grow again, defaults to True
-    :raises RuntimeError: If nothing can be found. This is not expected
+    :param greedy: Unused. The search used to stop as soon as the residuals
+                   started to grow again. It is exact now and the argument is only
+                   kept for compatibility.
+    :raises RuntimeError: If the data is empty
     :return: Index in the dataframe closest to the passed lat/lng values
     """
-
-    min_res_sum = 1e10
-    idx_min = None
-    for i, rcrd in enumerate(data.to_dict("records")):
-        res_lat = abs(rcrd["latitude"] - lat)
-        res_lng = abs(rcrd["longitude"] - lng)
-        res_sum = res_lat + res_lng
-        if res_sum < min_res_sum:
-            min_res_sum = res_sum
-            idx_min = i
-        if greedy and res_sum > min_res_sum:
-            break
-
-    if idx_min is None:
-        raise RuntimeError("Something want wrong here...")
-
-    return idx_min
+    return find_closest_elems_to_pois(data, [(lat, lng)])[0]
 
 
 def unwrap(data: None | T) -> T:
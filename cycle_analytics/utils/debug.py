@@ -3,7 +3,11 @@ import logging
 from os import getenv
 from time import perf_counter
 
+from ..metrics import metrics
+from ..tracing import get_tracer
+
 logger = logging.getLogger(__name__)
+tracer = get_tracer(__name__)
 
 
 def initialize_flask_server_debugger_if_needed() -> None:
@@ -25,15 +29,18 @@ def initialize_flask_server_debugger_if_needed() -> None:
 
 
 def log_timing(func):
-    """Print the runtime of the decorated function"""
+    """Print the runtime of the decorated function and record it as span"""
 
     @functools.wraps(func)
     def wrapper_timer(*args, **kwargs):
         start_time = perf_counter()  # 1
-        value = func(*args, **kwargs)
+        with tracer.start_as_current_span(func.__qualname__):
+            value = func(*args, **kwargs)
         end_time = perf_counter()  # 2
         run_time = end_time - start_time  # 3
         logger.debug("Finished %s in %s secs", func.__name__, round(run_time, 4))
+        if metrics.enabled:
+            metrics.observe_function(f"{func.__module__}.{func.__qualname__}", run_time)
         return value
 
     return wrapper_timer
@@ -38,10 +38,15 @@ def get_track_from_file_storage(data: FileStorage) -> Track:
             % ",".join(current_app.config["ALLOWED_TRACK_EXTENSIONS"]),
         )
 
-    if filename.endswith(".fit"):
-        return FITTrack(source=data.stream.read())
+    return get_track_from_bytes(filename, data.stream.read())
+
+
+def get_track_from_bytes(filename: str, content: bytes) -> Track:
+    """Load a FIT or GPX track depending on the file ending"""
+    if filename.lower().endswith(".fit"):
+        return FITTrack(source=content)
     else:
-        return ByteTrack(data.stream.read())
+        return ByteTrack(content)
 
 
 def flash_form_error(form: FlaskForm) -> None:
@@ -0,0 +1,165 @@
+import math
+
+import numpy as np
+
+
+def project_equirectangular(
+    latitudes: np.ndarray, longitudes: np.ndarray, ref_latitude: float
+) -> np.ndarray:
+    """
+    Project coordinates on a plane with the equirectangular approximation around the
+    reference latitude. Euclidean distances of the projected points are proportional
+    to the distances on the sphere for regional data.
+    """
+    return np.column_stack(
+        (
+            np.asarray(latitudes, dtype=np.float64),
+            np.asarray(longitudes, dtype=np.float64)
+            * math.cos(math.radians(ref_latitude)),
+        )
+    )
+
+
+class KDTree:
+    """
+    Static KD-tree for nearest neighbour queries on 2D points. The points are split
+    at the median of the dimension with the largest extent until at most leaf_size
+    points remain.
+
+    :param points: Array with shape (n, 2)
+    :param leaf_size: Maximum number of points in a leaf
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = 16) -> None:
+        points = np.asarray(points, dtype=np.float64)
+        self.leaf_size = leaf_size
+        self.n_points = len(points)
+        self._index = np.arange(self.n_points)
+        self._start: list[int] = []
+        self._end: list[int] = []
+        # Split dimension or -1 for leaves
+        self._dim: list[int] = []
+        self._split: list[float] = []
+        self._children: list[tuple[int, int]] = []
+        if self.n_points:
+            self._build(points, 0, self.n_points)
+        # Points ordered by the leaves so leaves can be sliced
+        self._points = points[self._index]
+
+    def _build(self, points: np.ndarray, start: int, end: int) -> int:
+        node = len(self._start)
+        self._start.append(start)
+        self._end.append(end)
+        self._dim.append(-1)
+        self._split.append(0.0)
+        self._children.append((-1, -1))
+        if end - start <= self.leaf_size:
+            return node
+
+        index = self._index[start:end]
+        node_points = points[index]
+        dim = int(np.argmax(node_points.max(axis=0) - node_points.min(axis=0)))
+        mid = (end - start) // 2
+        order = np.argpartition(node_points[:, dim], mid)
+        self._index[start:end] = index[order]
+        self._dim[node] = dim
+        self._split[node] = float(points[self._index[start + mid], dim])
+        left = self._build(points, start, start + mid)
+        right = self._build(points, start + mid, end)
+        self._children[node] = (left, right)
+        return node
+
+    def query(self, point: tuple[float, float] | np.ndarray) -> tuple[float, int]:
+        """
+        Find the nearest point
+
+        :return: Euclidean distance and index of the nearest point
+        """
+        if not self.n_points:
+            raise ValueError("Query on an empty tree")
+        target = np.asarray(point, dtype=np.float64)
+        best_distance = math.inf
+        best_index = -1
+        # Nodes to visit with a lower bound of their squared distance to the target
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound >= best_distance:
+                continue
+            dim = self._dim[node]
+            if dim < 0:
+                start, end = self._start[node], self._end[node]
+                diff = self._points[start:end] - target
+                distances = np.einsum("ij,ij->i", diff, diff)
+                i = int(np.argmin(distances))
+                if distances[i] < best_distance:
+                    best_distance = float(distances[i])
+                    best_index = int(self._index[start + i])
+                continue
+            offset = float(target[dim]) - self._split[node]
+            left, right = self._children[node]
+            near, far = (left, right) if offset < 0 else (right, left)
+            # The far side is visited after the near side if the split plane is
+            # closer than the best point found until then
+            stack.append((far, max(bound, offset * offset)))
+            stack.append((near, bound))
+        return math.sqrt(best_distance), best_index
+
+
+# Coordinates of encoded polylines are rounded to 1e-5 degree (~1 m)
+POLYLINE_PRECISION = 5
+# Zigzag encoded deltas of coordinates need at most 27 bits or 6 chunks of 5 bits
+_POLYLINE_CHUNKS = 6
+
+
+def encode_polyline(
+    latitudes: np.ndarray,
+    longitudes: np.ndarray,
+    precision: int = POLYLINE_PRECISION,
+) -> str:
+    """
+    Encode the coordinates with the Google encoded polyline algorithm. The rounded
+    coordinates are delta encoded and every value is split into chunks of 5 bits.
+    The encoded string is decoded by decode_polyline in map_utils.js.
+    """
+    factor = 10**precision
+    coordinates = np.column_stack(
+        (
+            np.asarray(latitudes, dtype=np.float64),
+            np.asarray(longitudes, dtype=np.float64),
+        )
+    )
+    values = np.round(coordinates * factor).astype(np.int64)
+    deltas = np.diff(values, axis=0, prepend=0).ravel()
+    values = (deltas << 1) ^ (deltas >> 63)
+
+    shifted = values[:, None] >> (5 * np.arange(_POLYLINE_CHUNKS + 1))
+    if shifted[:, -1].any():
+        raise ValueError("Coordinates are out of range")
+    # The first chunk is always written, all other chunks if they are not zero
+    required = shifted[:, :-1] > 0
+    required[:, 0] = True
+    # All chunks of a value except the last one have the continuation bit set
+    continued = np.zeros_like(required)
+    continued[:, :-1] = required[:, 1:]
+    chunks = (shifted[:, :-1] & 0x1F) + 0x20 * continued + 63
+    return chunks[required].astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode_polyline(
+    encoded: str, precision: int = POLYLINE_PRECISION
+) -> tuple[np.ndarray, np.ndarray]:
+    """Decode an encoded polyline into latitudes and longitudes"""
+    if not encoded:
+        return np.empty(0), np.empty(0)
+    chunks = np.frombuffer(encoded.encode("ascii"), dtype=np.uint8).astype(np.int64)
+    chunks -= 63
+    is_last = (chunks & 0x20) == 0
+    value_index = np.concatenate(([0], np.cumsum(is_last)[:-1]))
+    start_index = np.concatenate(([0], np.flatnonzero(is_last)[:-1] + 1))
+    position = np.arange(len(chunks)) - start_index[value_index]
+    values = np.zeros(int(is_last.sum()), dtype=np.int64)
+    np.add.at(values, value_index, (chunks & 0x1F) << (5 * position))
+    deltas = (values >> 1) ^ -(values & 1)
+    coordinates = np.cumsum(deltas.reshape(-1, 2), axis=0) / 10**precision
+    return coordinates[:, 0], coordinates[:, 1]
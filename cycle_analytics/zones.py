@@ -0,0 +1,60 @@
+"""
+Process wide registry of the configured zones. The zones are loaded once and only
+reloaded after update_zones changed the zones version. The version is shared
+through the cache, so all workers reload the zones after a change.
+"""
+
+import logging
+import threading
+
+from flask import Flask, current_app
+from geo_track_analyzer.model import Zones
+
+from .cache import entity_tag, get_tag_version
+from .database.retriever import get_zones as load_zones
+
+logger = logging.getLogger(__name__)
+
+EXTENSION_KEY = "zone_registry"
+# Invalidated by update_zones
+ZONES_TAG = entity_tag("zones")
+
+
+def get_zones_version() -> str:
+    """Version of the zones. Use it in cache keys of data that depends on zones."""
+    return get_tag_version(ZONES_TAG)
+
+
+class ZoneRegistry:
+    def __init__(self) -> None:
+        self._zones: dict[str, Zones] = {}
+        self._version: None | str = None
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, metric: str) -> None | Zones:
+        """Zones of the metric or None if no zones are configured"""
+        version = get_zones_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._zones = load_zones()
+                    self._version = version
+                    self.loads += 1
+                    logger.debug(
+                        "Loaded zones of %s with version %s", list(self._zones), version
+                    )
+        return self._zones.get(metric)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._zones = {}
+            self._version = None
+
+
+def init_zone_registry(app: Flask) -> None:
+    app.extensions[EXTENSION_KEY] = ZoneRegistry()
+
+
+def get_zones(metric: str) -> None | Zones:
+    return current_app.extensions[EXTENSION_KEY].get(metric)
@@ -0,0 +1,160 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+from time import perf_counter
+from typing import Any, Callable, Generator, TypeVar
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from cycle_analytics import create_app
+from cycle_analytics.cache import cache
+from cycle_analytics.database.creator import sync_categorical_values
+from cycle_analytics.database.model import db as orm_db
+from tests.synthetic_data import DATASET_SIZES, DatasetSummary, create_synthetic_data
+
+R = TypeVar("R")
+
+
+def pytest_collection_modifyitems(
+    config: pytest.Config, items: list[pytest.Item]
+) -> None:
+    # Skipped at collection because the session fixtures (dataset creation) would
+    # run before a skip in a function scoped fixture
+    if config.getoption("--run-benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="Benchmarks only run with --run-benchmarks")
+    benchmark_dir = os.path.dirname(__file__)
+    for item in items:
+        if str(item.path).startswith(benchmark_dir):
+            item.add_marker(skip)
+
+
+class Benchmark:
+    """
+    Time a callable over several rounds after one warmup call. With cold, the cache
+    is cleared before each call.
+    """
+
+    def __init__(self, app: Flask, name: str, rounds: int, results: list[dict]) -> None:
+        self.app = app
+        self.name = name
+        self.rounds = rounds
+        self.results = results
+
+    def __call__(
+        self, func: Callable[..., R], *args: object, cold: bool = True, **kwargs: object
+    ) -> R:
+        timings = []
+        for i in range(self.rounds + 1):
+            if cold:
+                with self.app.app_context():
+                    cache.clear()
+            start = perf_counter()
+            result = func(*args, **kwargs)
+            if i > 0:
+                timings.append(perf_counter() - start)
+        timings.sort()
+        self.results.append(
+            dict(
+                name=self.name,
+                rounds=self.rounds,
+                min=timings[0],
+                max=timings[-1],
+                mean=statistics.mean(timings),
+                median=statistics.median(timings),
+                stddev=statistics.stdev(timings) if len(timings) > 1 else 0.0,
+            )
+        )
+        return result
+
+
+def _git_commit() -> None | str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@pytest.fixture(scope="session")
+def benchmark_data(
+    request: pytest.FixtureRequest,
+) -> Generator[tuple[Flask, DatasetSummary], None, None]:
+    database_uri = request.config.getoption("--benchmark-database-uri")
+    db_fd, db_path = None, None
+    test_config: dict[str, Any] = {"TESTING": True, "WTF_CSRF_ENABLED": False}
+    if database_uri is None:
+        db_fd, db_path = tempfile.mkstemp()
+        test_config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+        test_config["database_schema"] = None
+    else:
+        test_config["SQLALCHEMY_DATABASE_URI"] = database_uri
+
+    app = create_app({"FORCE_ENV_FOR_DYNACONF": "testing"}, test_config)
+    with app.app_context():
+        orm_db.drop_all()
+        orm_db.create_all()
+        sync_categorical_values(orm_db)
+        summary = create_synthetic_data(
+            orm_db,
+            DATASET_SIZES[request.config.getoption("--benchmark-size")],
+            seed=request.config.getoption("--benchmark-seed"),
+        )
+
+    yield app, summary
+
+    if db_fd is not None and db_path is not None:
+        os.close(db_fd)
+        os.unlink(db_path)
+
+
+@pytest.fixture(scope="session")
+def benchmark_app(benchmark_data: tuple[Flask, DatasetSummary]) -> Flask:
+    return benchmark_data[0]
+
+
+@pytest.fixture(scope="session")
+def benchmark_client(benchmark_app: Flask) -> FlaskClient:
+    return benchmark_app.test_client()
+
+
+@pytest.fixture(scope="session")
+def benchmark_results(
+    request: pytest.FixtureRequest, benchmark_data: tuple[Flask, DatasetSummary]
+) -> Generator[list[dict], None, None]:
+    results: list[dict] = []
+    yield results
+
+    output = dict(
+        created=datetime.now().isoformat(),
+        commit=_git_commit(),
+        machine=dict(
+            python=platform.python_version(),
+            platform=platform.platform(),
+            processor=platform.processor(),
+        ),
+        size=request.config.getoption("--benchmark-size"),
+        dataset=benchmark_data[1].to_dict(),
+        benchmarks=results,
+    )
+    with open(request.config.getoption("--benchmark-json"), "w") as f:
+        json.dump(output, f, indent=2)
+
+
+@pytest.fixture()
+def benchmark(
+    request: pytest.FixtureRequest, benchmark_app: Flask, benchmark_results: list[dict]
+) -> Benchmark:
+    return Benchmark(
+        benchmark_app,
+        request.node.name,
+        request.config.getoption("--benchmark-rounds"),
+        benchmark_results,
+    )
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from geo_track_analyzer import ByteTrack
+from sqlalchemy import select
+
+from cycle_analytics.database.model import DatabaseTrack, Ride
+from cycle_analytics.database.model import db as orm_db
+from cycle_analytics.database.retriever import get_locations
+from cycle_analytics.utils.track import check_location_in_track
+from tests.benchmarks.conftest import Benchmark
+from tests.synthetic_data import HOME_LOCATIONS
+
+
+@pytest.fixture(scope="module")
+def id_ride_with_track(benchmark_app: Flask) -> int:
+    with benchmark_app.app_context():
+        return orm_db.session.execute(
+            select(Ride.id).join(Ride.tracks).order_by(Ride.ride_date.desc()).limit(1)
+        ).scalar_one()
+
+
+@pytest.mark.parametrize(
+    "route",
+    [
+        "/",
+        "/overview/",
+        "/overview/journal",
+        "/overview/heatmap",
+    ],
+)
+def test_views(benchmark: Benchmark, benchmark_client: FlaskClient, route: str) -> None:
+    response = benchmark(benchmark_client.get, route)
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("cold", [True, False])
+def test_ride_display(
+    benchmark: Benchmark,
+    benchmark_client: FlaskClient,
+    id_ride_with_track: int,
+    cold: bool,
+) -> None:
+    response = benchmark(
+        benchmark_client.get, f"/ride/{id_ride_with_track}/", cold=cold
+    )
+    assert response.status_code == 200
+
+
+def test_segments_in_bounds(
+    benchmark: Benchmark, benchmark_client: FlaskClient
+) -> None:
+    lat, lng = HOME_LOCATIONS[0]
+    response = benchmark(
+        benchmark_client.post,
+        "/segments/segments-in-bounds",
+        json={
+            "ids_on_map": [],
+            "ne_latitude": lat + 0.1,
+            "ne_longitude": lng + 0.1,
+            "sw_latitude": lat - 0.1,
+            "sw_longitude": lng - 0.1,
+        },
+    )
+    assert response.status_code == 200
+    assert json.loads(response.text)["segments"]
+
+
+def test_location_matching(
+    benchmark: Benchmark, benchmark_app: Flask, id_ride_with_track: int
+) -> None:
+    with benchmark_app.app_context():
+        ride = orm_db.get_or_404(Ride, id_ride_with_track)
+        database_track: DatabaseTrack = ride.database_track
+        track = ByteTrack(database_track.content)
+        locations = get_locations()
+        max_distance = benchmark_app.config.matching.distance
+
+        matches = benchmark(
+            check_location_in_track, track, locations, max_distance, cold=False
+        )
+    assert len(matches) == len(locations)
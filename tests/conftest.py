@@ -1,7 +1,9 @@
 import importlib.resources
 import os
 import tempfile
+from typing import Generator
 
+import pyroutelib3.datastore
 import pytest
 from flask import Flask
 from flask.testing import FlaskClient
@@ -14,6 +16,38 @@ from tests import resources
 from tests.generate_data import create_test_data
 
 
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup("benchmarks", "Benchmarks with synthetic datasets")
+    group.addoption(
+        "--run-benchmarks",
+        action="store_true",
+        default=False,
+        help="Run the benchmarks in tests/benchmarks",
+    )
+    group.addoption(
+        "--benchmark-size",
+        default="small",
+        help="Size of the synthetic dataset (see tests/synthetic_data.py)",
+    )
+    group.addoption("--benchmark-seed", type=int, default=42)
+    group.addoption(
+        "--benchmark-rounds",
+        type=int,
+        default=5,
+        help="Number of timed rounds per benchmark",
+    )
+    group.addoption(
+        "--benchmark-json",
+        default="benchmark.json",
+        help="File the benchmark results are written to",
+    )
+    group.addoption(
+        "--benchmark-database-uri",
+        default=None,
+        help="Database for the benchmarks. Defaults to a temporary SQLite database",
+    )
+
+
 # conftest.py
 def pytest_collection_modifyitems(items: list) -> None:
     """test items come to last"""
@@ -45,6 +79,18 @@ def pytest_collection_modifyitems(items: list) -> None:
     )
 
 
+@pytest.fixture(scope="session", autouse=True)
+def _tiles_dir(tmp_path_factory: pytest.TempPathFactory) -> Generator[None, None, None]:
+    """pyroutelib3 stores downloaded OSM tiles relative to the working directory"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(
+            pyroutelib3.datastore,
+            "TILES_DIR",
+            str(tmp_path_factory.mktemp("tilescache")),
+        )
+        yield
+
+
 @pytest.fixture(scope="session")
 def app(
     fr_track: Track, fr_track_sub_segment: Track, fr_track_top_segment: Track
@@ -0,0 +1,406 @@
+"""
+Load test harness: record request sequences and replay them with concurrent virtual
+users against a running server. Recordings are json lines with method, path, route,
+body, and the delay to the previous request. Client addresses, user agents, referrers,
+and absolute timestamps are not recorded. Text values in request bodies are replaced
+with empty strings unless the bodies are explicitly kept.
+
+Record from a gunicorn/nginx access log (common or combined log format):
+
+    python -m tests.loadtest record-log access.log recording.jsonl
+
+Replay with 8 concurrent users, 5 passes over the recording each:
+
+    python -m tests.loadtest replay recording.jsonl --url http://localhost:8543 \
+        --concurrency 8 --iterations 5
+
+Use --start-server to start gunicorn with the database from --database-uri (defaults
+to the configured database) before the replay.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Iterator
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import httpx
+from flask import Flask, Response, request, request_finished
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import MapAdapter
+
+from cycle_analytics.profiling import TOKEN_PARAMETER
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that must not end up in recordings
+SENSITIVE_PARAMETERS = {TOKEN_PARAMETER}
+REDACTED = ""
+STATIC_PREFIXES = ("/static/", "/favicon.ico")
+
+_log_line = re.compile(
+    r'\[(?P<time>[^\]]+)\] "(?P<method>[A-Z]+) (?P<target>\S+) HTTP/[\d.]+" '
+    r"(?P<status>\d{3})"
+)
+
+
+@dataclass
+class RecordedRequest:
+    method: str
+    path: str
+    route: str
+    delay: float = 0.0
+    json: Any = None
+    form: None | dict[str, str] = None
+
+    @classmethod
+    def from_dict(cls: type["RecordedRequest"], data: dict) -> "RecordedRequest":
+        return cls(**data)
+
+
+def anonymize_path(target: str) -> str:
+    parts = urlsplit(target)
+    query = [(k, v) for k, v in parse_qsl(parts.query) if k not in SENSITIVE_PARAMETERS]
+    return parts.path + (f"?{urlencode(query)}" if query else "")
+
+
+def redact_body(value: object) -> object:
+    """
+    Replace the text values in a request body. The structure, numbers, and flags
+    are kept so the replayed requests take the same code paths.
+    """
+    if isinstance(value, str):
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: redact_body(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact_body(v) for v in value]
+    return value
+
+
+def get_route(url_map: MapAdapter, method: str, path: str) -> str:
+    try:
+        rule, _ = url_map.match(urlsplit(path).path, method, return_rule=True)
+    except HTTPException:
+        return "unmatched"
+    return rule.rule
+
+
+def read_access_log(
+    lines: Iterator[str], app: Flask, include_static: bool = False
+) -> list[RecordedRequest]:
+    """Convert access log lines into a recording. Unparsable lines are skipped"""
+    url_map = app.url_map.bind("localhost")
+    recording = []
+    last_time = None
+    for line in lines:
+        match = _log_line.search(line)
+        if match is None:
+            continue
+        path = anonymize_path(match.group("target"))
+        if not include_static and path.startswith(STATIC_PREFIXES):
+            continue
+        timestamp = datetime.strptime(match.group("time"), "%d/%b/%Y:%H:%M:%S %z")
+        method = match.group("method")
+        recording.append(
+            RecordedRequest(
+                method=method,
+                path=path,
+                route=get_route(url_map, method, path),
+                delay=0.0
+                if last_time is None
+                else max((timestamp - last_time).total_seconds(), 0.0),
+            )
+        )
+        last_time = timestamp
+    return recording
+
+
+@contextmanager
+def record_requests(
+    app: Flask, keep_bodies: bool = False
+) -> Iterator[list[RecordedRequest]]:
+    """
+    Record the requests handled by the app within the block, e.g. while running a
+    test client session.
+
+    :param keep_bodies: Record the request bodies verbatim instead of replacing the
+        text values
+    """
+    recording: list[RecordedRequest] = []
+    last_time: list[float] = []
+
+    def _record(sender: Flask, response: Response, **kwargs: object) -> None:
+        path = anonymize_path(request.full_path.rstrip("?"))
+        if path.startswith(STATIC_PREFIXES):
+            return
+        now = time.monotonic()
+        body = request.get_json(silent=True) if request.is_json else None
+        form = request.form.to_dict() if request.form else None
+        if not keep_bodies:
+            body = redact_body(body)
+            form = None if form is None else {k: REDACTED for k in form}
+        recording.append(
+            RecordedRequest(
+                method=request.method,
+                path=path,
+                route=request.url_rule.rule if request.url_rule else "unmatched",
+                delay=now - last_time[0] if last_time else 0.0,
+                json=body,
+                form=form,
+            )
+        )
+        last_time[:] = [now]
+
+    request_finished.connect(_record, app)
+    try:
+        yield recording
+    finally:
+        request_finished.disconnect(_record, app)
+
+
+def save_recording(recording: list[RecordedRequest], path: str) -> None:
+    with open(path, "w") as f:
+        for entry in recording:
+            f.write(json.dumps(asdict(entry)) + "\n")
+
+
+def load_recording(path: str) -> list[RecordedRequest]:
+    with open(path) as f:
+        return [
+            RecordedRequest.from_dict(json.loads(line)) for line in f if line.strip()
+        ]
+
+
+@dataclass
+class RouteResult:
+    route: str
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    def percentile(self, p: float) -> float:
+        """Nearest-rank percentile of the latencies"""
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+@dataclass
+class LoadTestReport:
+    concurrency: int
+    duration: float
+    routes: dict[str, RouteResult]
+
+    @property
+    def total_requests(self) -> int:
+        return sum(r.count for r in self.routes.values())
+
+    @property
+    def throughput(self) -> float:
+        return self.total_requests / self.duration if self.duration else 0.0
+
+    def to_dict(self) -> dict[str, Any]:
+        return dict(
+            concurrency=self.concurrency,
+            duration=self.duration,
+            requests=self.total_requests,
+            throughput=self.throughput,
+            errors=sum(r.errors for r in self.routes.values()),
+            routes=[
+                dict(
+                    route=r.route,
+                    requests=r.count,
+                    error_rate=r.errors / r.count if r.count else 0.0,
+                    p50=r.percentile(50),
+                    p95=r.percentile(95),
+                    p99=r.percentile(99),
+                )
+                for r in sorted(self.routes.values(), key=lambda r: r.route)
+            ],
+        )
+
+    def format(self) -> str:
+        data = self.to_dict()
+        lines = [
+            f"{data['requests']} requests in {data['duration']:.1f}s with "
+            f"{self.concurrency} users: {data['throughput']:.1f} req/s, "
+            f"{data['errors']} errors",
+            f"{'route':<45} {'n':>6} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8}",
+        ]
+        lines.extend(
+            f"{row['route']:<45} {row['requests']:>6} "
+            f"{100 * row['error_rate']:>6.1f} {1000 * row['p50']:>6.0f}ms "
+            f"{1000 * row['p95']:>6.0f}ms {1000 * row['p99']:>6.0f}ms"
+            for row in data["routes"]
+        )
+        return "\n".join(lines)
+
+
+def replay(
+    recording: list[RecordedRequest],
+    base_url: str,
+    concurrency: int = 4,
+    iterations: int = 1,
+    use_delays: bool = False,
+    timeout: float = 60,
+) -> LoadTestReport:
+    """
+    Replay the recording with concurrent virtual users. Each user runs through the
+    full recording iterations times. Responses with status >= 500 and failed
+    connections count as errors.
+    """
+    results: dict[str, RouteResult] = {}
+    lock = threading.Lock()
+
+    def _user() -> None:
+        local: dict[str, RouteResult] = defaultdict(lambda: RouteResult(""))
+        with httpx.Client(base_url=base_url, timeout=timeout) as client:
+            for _ in range(iterations):
+                for entry in recording:
+                    if use_delays and entry.delay:
+                        time.sleep(entry.delay)
+                    route_result = local[f"{entry.method} {entry.route}"]
+                    start = time.perf_counter()
+                    try:
+                        response = client.request(
+                            entry.method, entry.path, json=entry.json, data=entry.form
+                        )
+                        failed = response.status_code >= 500
+                    except httpx.HTTPError as e:
+                        logger.debug("Request to %s failed: %s", entry.path, e)
+                        failed = True
+                    route_result.latencies.append(time.perf_counter() - start)
+                    route_result.errors += int(failed)
+        with lock:
+            for route, route_result in local.items():
+                merged = results.setdefault(route, RouteResult(route))
+                merged.latencies.extend(route_result.latencies)
+                merged.errors += route_result.errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(_user) for _ in range(concurrency)]:
+            future.result()
+    return LoadTestReport(concurrency, time.perf_counter() - start, results)
+
+
+@contextmanager
+def run_gunicorn(
+    bind: str, workers: int, database_uri: None | str = None
+) -> Iterator[str]:
+    """Start gunicorn with the app and wait until it responds"""
+    env = dict(os.environ)
+    if database_uri is not None:
+        env["FLASK_SQLALCHEMY_DATABASE_URI"] = database_uri
+        if database_uri.startswith("sqlite"):
+            env["FLASK_DATABASE_SCHEMA"] = "@none"
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--bind",
+            bind,
+            "--workers",
+            str(workers),
+            "--timeout",
+            "120",
+            "cycle_analytics:create_app()",
+        ],
+        env=env,
+    )
+    base_url = f"http://{bind}"
+    try:
+        for _ in range(120):
+            try:
+                httpx.get(base_url + "/", timeout=5)
+                break
+            except httpx.HTTPError:
+                if process.poll() is not None:
+                    raise RuntimeError("gunicorn exited during startup") from None
+                time.sleep(0.5)
+        else:
+            raise RuntimeError("gunicorn did not respond")
+        yield base_url
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record-log", help="Record an access log")
+    record_parser.add_argument("log")
+    record_parser.add_argument("output")
+    record_parser.add_argument("--include-static", action="store_true")
+
+    replay_parser = subparsers.add_parser("replay", help="Replay a recording")
+    replay_parser.add_argument("recording")
+    replay_parser.add_argument("--url", default="http://127.0.0.1:8543")
+    replay_parser.add_argument("--concurrency", type=int, default=4)
+    replay_parser.add_argument("--iterations", type=int, default=1)
+    replay_parser.add_argument(
+        "--use-delays",
+        action="store_true",
+        help="Wait the recorded time between the requests of a user",
+    )
+    replay_parser.add_argument("--json", help="Write the report to this file")
+    replay_parser.add_argument("--start-server", action="store_true")
+    replay_parser.add_argument("--workers", type=int, default=3)
+    replay_parser.add_argument("--database-uri")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "record-log":
+        from cycle_analytics import create_app
+
+        with open(args.log) as f:
+            recording = read_access_log(
+                iter(f), create_app(), include_static=args.include_static
+            )
+        save_recording(recording, args.output)
+        print(f"Recorded {len(recording)} requests")
+        return
+
+    recording = load_recording(args.recording)
+    if args.start_server:
+        with run_gunicorn(
+            urlsplit(args.url).netloc, args.workers, args.database_uri
+        ) as base_url:
+            report = replay(
+                recording, base_url, args.concurrency, args.iterations, args.use_delays
+            )
+    else:
+        report = replay(
+            recording, args.url, args.concurrency, args.iterations, args.use_delays
+        )
+    print(report.format())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report.to_dict(), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,422 @@
+"""
+Generator for large synthetic datasets. All values are derived from a seeded random
+generator so the same seed and size always produce the same database content (the
+rides end in the current year).
+
+Fill the database of the current environment with:
+
+    python -m tests.synthetic_data --size medium --seed 42
+"""
+
+import argparse
+import logging
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, time, timedelta
+from itertools import pairwise
+
+import numpy as np
+from flask_sqlalchemy import SQLAlchemy
+from geo_track_analyzer import PyTrack
+from sqlalchemy import select
+
+from cycle_analytics.database.converter import initialize_overviews
+from cycle_analytics.database.model import (
+    Bike,
+    DatabaseEvent,
+    DatabaseGoal,
+    DatabaseLocation,
+    DatabaseSegment,
+    DatabaseTrack,
+    DatabaseZoneInterval,
+    Difficulty,
+    EventType,
+    Material,
+    Ride,
+    SegmentType,
+    Severity,
+    TerrainType,
+    TypeSpecification,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rides start at one of these locations (Freiburg area)
+HOME_LOCATIONS = [(47.9959, 7.8522), (47.9823, 7.8870), (48.0201, 7.8305)]
+EARTH_RADIUS_M = 6_371_000
+
+
+@dataclass
+class DatasetSize:
+    years: int
+    rides_per_year: int
+    # Fraction of the rides with a gps track
+    track_fraction: float
+    points_per_track: int
+    n_bikes: int
+    n_segments: int
+    n_locations: int
+    n_events: int
+
+
+DATASET_SIZES = {
+    "tiny": DatasetSize(
+        years=1,
+        rides_per_year=20,
+        track_fraction=0.5,
+        points_per_track=200,
+        n_bikes=2,
+        n_segments=5,
+        n_locations=5,
+        n_events=5,
+    ),
+    "small": DatasetSize(
+        years=2,
+        rides_per_year=100,
+        track_fraction=0.8,
+        points_per_track=500,
+        n_bikes=3,
+        n_segments=20,
+        n_locations=20,
+        n_events=30,
+    ),
+    "medium": DatasetSize(
+        years=5,
+        rides_per_year=200,
+        track_fraction=0.9,
+        points_per_track=1500,
+        n_bikes=4,
+        n_segments=100,
+        n_locations=50,
+        n_events=150,
+    ),
+    # ~3000 rides with ~8M track points
+    "large": DatasetSize(
+        years=10,
+        rides_per_year=300,
+        track_fraction=0.9,
+        points_per_track=3000,
+        n_bikes=6,
+        n_segments=300,
+        n_locations=200,
+        n_events=500,
+    ),
+}
+
+
+@dataclass
+class DatasetSummary:
+    seed: int
+    rides: int
+    tracks: int
+    track_points: int
+    segments: int
+    locations: int
+    events: int
+    goals: int
+
+    def to_dict(self) -> dict[str, int]:
+        return asdict(self)
+
+
+def generate_track(
+    rng: np.random.Generator,
+    start: tuple[float, float],
+    start_time: datetime,
+    n_points: int,
+    interval_seconds: int = 5,
+) -> PyTrack:
+    """
+    Generate a ride as a random walk with smoothly changing heading and gradient.
+    Speed, heartrate, power and cadence follow the gradient.
+    """
+    heading = rng.uniform(0, 2 * np.pi) + np.cumsum(rng.normal(0, 0.08, n_points))
+    gradient = np.clip(
+        np.cumsum(rng.normal(0, 0.004, n_points)) + rng.normal(0, 0.01), -0.12, 0.12
+    )
+    speed = np.clip(rng.normal(7.5, 0.8, n_points) - 40 * gradient, 1.5, 18)  # m/s
+    step = speed * interval_seconds
+
+    lat = start[0] + np.degrees(np.cumsum(step * np.cos(heading)) / EARTH_RADIUS_M)
+    lng = start[1] + np.degrees(
+        np.cumsum(step * np.sin(heading))
+        / (EARTH_RADIUS_M * np.cos(np.radians(start[0])))
+    )
+    elevation = np.clip(250 + np.cumsum(step * gradient), 150, 1400)
+
+    heartrate = np.clip(125 + 400 * gradient + rng.normal(0, 6, n_points), 80, 195)
+    power = np.clip(190 + 1500 * gradient + rng.normal(0, 25, n_points), 0, 900)
+    cadence = np.clip(85 + rng.normal(0, 5, n_points), 60, 110)
+    coasting = gradient < -0.04
+    power[coasting] = 0
+    cadence[coasting] = 0
+
+    times = [
+        start_time + timedelta(seconds=i * interval_seconds) for i in range(n_points)
+    ]
+
+    return PyTrack(
+        points=list(zip(lat.tolist(), lng.tolist())),
+        elevations=elevation.round(1).tolist(),
+        times=times,
+        heartrate=heartrate.astype(int).tolist(),
+        cadence=cadence.astype(int).tolist(),
+        power=power.astype(int).tolist(),
+    )
+
+
+def create_synthetic_data(
+    database: SQLAlchemy,
+    size: DatasetSize,
+    seed: int = 42,
+    with_overviews: bool = True,
+    batch_size: int = 50,
+) -> DatasetSummary:
+    """
+    Add bikes, rides (with tracks), segments, locations, events, goals, and zones
+    to the database. The categorical values must already be synced.
+
+    :param database: Database the data is added to
+    :param size: Size of the generated dataset
+    :param seed: Seed of the random generator
+    :param with_overviews: If False, no overviews are computed for the tracks
+    :param batch_size: Number of rides added per commit
+    """
+    rng = np.random.default_rng(seed)
+    last_year = datetime.now().year
+    first_year = last_year - size.years + 1
+
+    materials = database.session.scalars(select(Material)).all()
+    terrain_types = database.session.scalars(select(TerrainType)).all()
+    specifications = database.session.scalars(select(TypeSpecification)).all()
+    event_types = database.session.scalars(select(EventType)).all()
+    severities = database.session.scalars(select(Severity)).all()
+    segment_types = database.session.scalars(select(SegmentType)).all()
+    difficulties = database.session.scalars(select(Difficulty)).all()
+
+    bikes = [
+        Bike(
+            name=f"Bike {i + 1}",
+            brand=f"Brand {i % 3 + 1}",
+            model=f"Model {i + 1}",
+            material=materials[i % len(materials)],
+            specification=specifications[i % len(specifications)],
+            terrain_type=terrain_types[i % 3],
+            commission_date=date(first_year, 1, 1),
+        )
+        for i in range(size.n_bikes)
+    ]
+    database.session.add_all(bikes)
+    database.session.commit()
+
+    n_rides = 0
+    n_tracks = 0
+    n_points = 0
+    sampled_points: list[tuple[float, float]] = []
+    for year in range(first_year, last_year + 1):
+        days = np.sort(rng.integers(0, 365, size.rides_per_year))
+        for day in days:
+            ride_date = date(year, 1, 1) + timedelta(days=int(day))
+            start_time = time(int(rng.integers(6, 19)), int(rng.integers(0, 60)))
+            bike_idx = int(rng.integers(0, len(bikes)))
+            with database.session.no_autoflush:
+                ride = Ride(
+                    ride_date=ride_date,
+                    start_time=start_time,
+                    ride_duration=None,
+                    total_duration=timedelta(seconds=0),
+                    distance=0,
+                    terrain_type=bikes[bike_idx].terrain_type,
+                    bike=bikes[bike_idx],
+                )
+                database.session.add(ride)
+            if rng.random() < size.track_fraction:
+                n_track_points = int(size.points_per_track * rng.uniform(0.5, 1.5))
+                start = HOME_LOCATIONS[int(rng.integers(0, len(HOME_LOCATIONS)))]
+                track = generate_track(
+                    rng,
+                    start,
+                    datetime.combine(ride_date, start_time),
+                    n_track_points,
+                )
+                overview = track.get_track_overview()
+                ride.distance = round(overview.total_distance_km, 2)
+                ride.total_duration = timedelta(seconds=overview.total_time_seconds)
+                ride.ride_duration = timedelta(seconds=overview.moving_time_seconds)
+                ride.tracks.append(
+                    DatabaseTrack(
+                        content=track.get_xml().encode(),
+                        added=datetime.combine(ride_date, start_time),
+                        is_enhanced=False,
+                        overviews=initialize_overviews(track) if with_overviews else [],
+                    )
+                )
+                segment = track.track.segments[0]
+                idx = int(rng.integers(0, len(segment.points)))
+                sampled_points.append(
+                    (segment.points[idx].latitude, segment.points[idx].longitude)
+                )
+                n_tracks += 1
+                n_points += n_track_points
+            else:
+                distance = float(rng.gamma(4, 10))
+                ride.distance = round(distance, 2)
+                ride.total_duration = timedelta(seconds=int(distance / 25 * 3600))
+            n_rides += 1
+            if n_rides % batch_size == 0:
+                database.session.commit()
+    database.session.commit()
+    logger.info("Created %s rides with %s track points", n_rides, n_points)
+
+    segments = []
+    for i in range(size.n_segments):
+        start = HOME_LOCATIONS[i % len(HOME_LOCATIONS)]
+        start = (start[0] + rng.normal(0, 0.02), start[1] + rng.normal(0, 0.02))
+        track = generate_track(rng, start, datetime(first_year, 1, 1), 60)
+        bounds = track.track.segments[0].get_bounds()
+        overview = track.get_track_overview()
+        segments.append(
+            DatabaseSegment(
+                name=f"Segment {i + 1}",
+                segment_type=segment_types[i % len(segment_types)],
+                difficulty=difficulties[i % len(difficulties)],
+                distance=overview.total_distance_km,
+                min_elevation=overview.min_elevation,
+                max_elevation=overview.max_elevation,
+                uphill_elevation=overview.uphill_elevation,
+                downhill_elevation=overview.downhill_elevation,
+                bounds_min_lat=bounds.min_latitude,  # type: ignore
+                bounds_max_lat=bounds.max_latitude,  # type: ignore
+                bounds_min_lng=bounds.min_longitude,  # type: ignore
+                bounds_max_lng=bounds.max_longitude,  # type: ignore
+                gpx=track.get_xml().encode(),
+            )
+        )
+    database.session.add_all(segments)
+    database.session.commit()
+
+    # Half of the locations are on tracks so location matching finds them
+    locations = []
+    for i in range(size.n_locations):
+        if i % 2 == 0 and sampled_points:
+            lat, lng = sampled_points[int(rng.integers(0, len(sampled_points)))]
+        else:
+            home = HOME_LOCATIONS[i % len(HOME_LOCATIONS)]
+            lat, lng = home[0] + rng.normal(0, 0.05), home[1] + rng.normal(0, 0.05)
+        locations.append(
+            DatabaseLocation(latitude=lat, longitude=lng, name=f"Location {i + 1}")
+        )
+    database.session.add_all(locations)
+    database.session.commit()
+
+    events = []
+    for i in range(size.n_events):
+        event_date = date(first_year, 1, 1) + timedelta(
+            days=int(rng.integers(0, 365 * size.years))
+        )
+        located = rng.random() < 0.5
+        home = HOME_LOCATIONS[i % len(HOME_LOCATIONS)]
+        events.append(
+            DatabaseEvent(
+                event_date=event_date,
+                event_type=event_types[int(rng.integers(0, len(event_types)))],
+                short_description=f"Event {i + 1}",
+                latitude=home[0] + rng.normal(0, 0.05) if located else None,
+                longitude=home[1] + rng.normal(0, 0.05) if located else None,
+                bike=bikes[int(rng.integers(0, len(bikes)))],
+                severity=severities[int(rng.integers(0, len(severities)))],
+            )
+        )
+    database.session.add_all(events)
+    database.session.commit()
+
+    goals = []
+    for year in range(first_year, last_year + 1):
+        goals.extend(
+            [
+                DatabaseGoal(
+                    year=year,
+                    month=None,
+                    name="Yearly distance",
+                    goal_type="ride",
+                    aggregation_type="total_distance",
+                    threshold=5000,
+                    is_upper_bound=True,
+                ),
+                DatabaseGoal(
+                    year=year,
+                    month=0,
+                    name="Rides every month",
+                    goal_type="ride",
+                    aggregation_type="count",
+                    threshold=10,
+                    is_upper_bound=True,
+                ),
+                DatabaseGoal(
+                    year=year,
+                    month=None,
+                    name="Visit location",
+                    goal_type="location",
+                    aggregation_type="count",
+                    threshold=5,
+                    is_upper_bound=True,
+                    constraints={"id_location": locations[0].id} if locations else None,
+                ),
+            ]
+        )
+    database.session.add_all(goals)
+    database.session.commit()
+
+    for metric, bounds in [
+        ("heartrate", [None, 120, 150, 170, None]),
+        ("power", [None, 150, 250, None]),
+    ]:
+        database.session.add_all(
+            [
+                DatabaseZoneInterval(
+                    id=i,
+                    metric=metric,
+                    interval_start=start,
+                    interval_end=end,
+                    name=f"Zone {i + 1}",
+                    color=None,
+                )
+                for i, (start, end) in enumerate(pairwise(bounds))
+            ]
+        )
+    database.session.commit()
+
+    return DatasetSummary(
+        seed=seed,
+        rides=n_rides,
+        tracks=n_tracks,
+        track_points=n_points,
+        segments=len(segments),
+        locations=len(locations),
+        events=len(events),
+        goals=len(goals),
+    )
+
+
+if __name__ == "__main__":
+    from cycle_analytics import create_app
+    from cycle_analytics.database.creator import sync_categorical_values
+    from cycle_analytics.database.model import db as orm_db
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", choices=list(DATASET_SIZES), default="small")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-overviews", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    app = create_app()
+    with app.app_context():
+        orm_db.create_all()
+        sync_categorical_values(orm_db)
+        summary = create_synthetic_data(
+            orm_db,
+            DATASET_SIZES[args.size],
+            seed=args.seed,
+            with_overviews=not args.no_overviews,
+        )
+    print(summary.to_dict())
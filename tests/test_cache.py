@@ -0,0 +1,68 @@
+from flask import Flask
+
+from cycle_analytics.cache import (
+    cache,
+    get_tagged,
+    invalidate_tags,
+    memoize_tagged,
+    ride_tag,
+    set_tagged,
+    track_tag,
+)
+
+
+def test_tagged_invalidation(app: Flask) -> None:
+    with app.app_context():
+        set_tagged("test_tagged_a", "a", [ride_tag(1000), track_tag(2000)])
+        set_tagged("test_tagged_b", "b", [ride_tag(1001)])
+        set_tagged("test_untagged_c", "c", [])
+
+        assert get_tagged("test_tagged_a") == "a"
+        assert get_tagged("test_tagged_b") == "b"
+
+        invalidate_tags(track_tag(2000))
+
+        assert get_tagged("test_tagged_a") is None
+        assert get_tagged("test_tagged_b") == "b"
+        assert get_tagged("test_untagged_c") == "c"
+
+
+def test_tagged_evicted_version(app: Flask) -> None:
+    with app.app_context():
+        set_tagged("test_tagged_evict", "a", [ride_tag(1002)])
+        cache.delete(f"tag_version_{ride_tag(1002)}")
+
+        assert get_tagged("test_tagged_evict") is None
+
+
+def test_tagged_invalid_entry(app: Flask) -> None:
+    with app.app_context():
+        # Entries written without set_tagged are misses
+        cache.set("test_tagged_plain", "value")
+        cache.set("test_tagged_tuple", ("a", "b"))
+        cache.set("test_tagged_triple", ({}, "a", "b"))
+
+        assert get_tagged("test_tagged_plain") is None
+        assert get_tagged("test_tagged_tuple") is None
+        assert get_tagged("test_tagged_triple") is None
+
+
+def test_memoize_tagged(app: Flask) -> None:
+    calls = []
+
+    @memoize_tagged(lambda id_ride: [ride_tag(id_ride)])
+    def func(id_ride: int) -> list[int]:
+        calls.append(id_ride)
+        return [id_ride]
+
+    with app.app_context():
+        assert func(1003) == [1003]
+        assert func(1003) == [1003]
+        assert func(1004) == [1004]
+        assert calls == [1003, 1004]
+
+        invalidate_tags(ride_tag(1003))
+
+        assert func(1003) == [1003]
+        assert func(1004) == [1004]
+        assert calls == [1003, 1004, 1003]
@@ -0,0 +1,249 @@
+import os
+import time
+from collections.abc import Callable
+
+import pytest
+from flask import Flask
+
+from cycle_analytics.cache_backend import _MISSING, LocalLRU, TwoTierCache
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis client methods used by TwoTierCache"""
+
+    def __init__(self) -> None:
+        self.data: dict[str, bytes] = {}
+        self.published: list[tuple[str, str]] = []
+        # Called before a value is read, e.g. to simulate concurrent writes
+        self.on_read: None | Callable[[], None] = None
+
+    def get(self, name: str) -> None | bytes:
+        if self.on_read is not None:
+            self.on_read()
+        return self.data.get(name)
+
+    def mget(self, names: list[str]) -> list[None | bytes]:
+        if self.on_read is not None:
+            self.on_read()
+        return [self.data.get(name) for name in names]
+
+    def set(self, name: str, value: bytes) -> bool:
+        self.data[name] = value
+        return True
+
+    def setex(self, name: str, value: bytes, time: int) -> bool:
+        return self.set(name, value)
+
+    def delete(self, *names: str) -> int:
+        return sum(self.data.pop(name, None) is not None for name in names)
+
+    def exists(self, *names: str) -> int:
+        return sum(name in self.data for name in names)
+
+    def publish(self, channel: str, message: str) -> int:
+        self.published.append((channel, message))
+        return 0
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    def pubsub(self, ignore_subscribe_messages: bool = False) -> None:
+        raise ConnectionError("No redis server")
+
+
+class FakePipeline:
+    def __init__(self, client: FakeRedis) -> None:
+        self.client = client
+        self.calls: list[Callable[[], object]] = []
+
+    def set(self, name: str, value: bytes) -> None:
+        self.calls.append(lambda: self.client.set(name, value))
+
+    def setex(self, name: str, value: bytes, time: int) -> None:
+        self.calls.append(lambda: self.client.setex(name, value, time))
+
+    def publish(self, channel: str, message: str) -> None:
+        self.calls.append(lambda: self.client.publish(channel, message))
+
+    def execute(self) -> list[object]:
+        return [call() for call in self.calls]
+
+
+@pytest.fixture()
+def redis_client() -> FakeRedis:
+    return FakeRedis()
+
+
+@pytest.fixture()
+def two_tier_cache(redis_client: FakeRedis) -> TwoTierCache:
+    cache = TwoTierCache(local_max_bytes=1000, channel="test")
+    cache._read_client = redis_client
+    cache._write_client = redis_client
+    return cache
+
+
+def _message(sender: str, key: str) -> dict:
+    return {"type": "message", "data": f"{sender}:{key}".encode()}
+
+
+def test_local_lru_byte_accounting() -> None:
+    lru = LocalLRU(max_bytes=100)
+    lru.set("a", "A", 40)
+    lru.set("b", "B", 40)
+    assert lru.current_bytes == 80
+
+    # Access a so b is the least recently used entry
+    assert lru.get("a") == "A"
+    lru.set("c", "C", 40)
+
+    assert lru.get("b") is _MISSING
+    assert lru.get("a") == "A"
+    assert lru.get("c") == "C"
+    assert lru.current_bytes == 80
+
+    lru.set("a", "AA", 10)
+    assert lru.current_bytes == 50
+
+
+def test_local_lru_too_large() -> None:
+    lru = LocalLRU(max_bytes=100)
+    lru.set("a", "A", 40)
+    lru.set("a", "A", 101)
+
+    assert lru.get("a") is _MISSING
+    assert lru.current_bytes == 0
+
+
+def test_local_lru_timeout() -> None:
+    lru = LocalLRU(max_bytes=100, default_timeout=300)
+    lru.set("a", "A", 10, timeout=1)
+    lru.set("b", "B", 10)
+    assert lru.get("a") == "A"
+
+    time.sleep(1.1)
+
+    assert lru.get("a") is _MISSING
+    assert lru.get("b") == "B"
+    assert len(lru) == 1
+
+
+def test_local_lru_generation() -> None:
+    lru = LocalLRU(max_bytes=100)
+    generation = lru.generation
+    lru.delete("a")
+    lru.set("a", "A", 10, generation=generation)
+    assert lru.get("a") is _MISSING
+
+    lru.set("a", "A", 10, generation=lru.generation)
+    assert lru.get("a") == "A"
+
+
+def test_two_tier_cache_get(
+    two_tier_cache: TwoTierCache, redis_client: FakeRedis
+) -> None:
+    assert two_tier_cache.set("a", {"value": 1})
+    assert two_tier_cache.get("a") == {"value": 1}
+
+    # The value is served from the local tier
+    redis_client.data.clear()
+    assert two_tier_cache.get("a") == {"value": 1}
+    assert two_tier_cache.get_many("a", "b") == [{"value": 1}, None]
+
+    two_tier_cache.local.clear()
+    assert two_tier_cache.get("a") is None
+
+
+def test_two_tier_cache_has(
+    two_tier_cache: TwoTierCache, redis_client: FakeRedis
+) -> None:
+    # Left over from before the listener was started, invalidations were missed
+    two_tier_cache.local.set("a", 1, 1)
+
+    assert not two_tier_cache.has("a")
+    assert two_tier_cache._listener_pid == os.getpid()
+
+    two_tier_cache.set("a", 1)
+    redis_client.data.clear()
+    assert two_tier_cache.has("a")
+
+
+def test_two_tier_cache_fills_local_tier(
+    two_tier_cache: TwoTierCache, redis_client: FakeRedis
+) -> None:
+    two_tier_cache.set_many({"a": 1, "b": 2})
+    two_tier_cache.local.clear()
+
+    assert two_tier_cache.get_many("a", "b", "c") == [1, 2, None]
+    assert len(two_tier_cache.local) == 2
+
+    redis_client.data.clear()
+    assert two_tier_cache.get("a") == 1
+    assert two_tier_cache.get_many("a", "b") == [1, 2]
+
+
+def test_two_tier_cache_invalidation_message(two_tier_cache: TwoTierCache) -> None:
+    two_tier_cache.set_many({"a": 1, "b": 2})
+
+    # Own messages are ignored
+    two_tier_cache._handle_message(_message(two_tier_cache._instance_id, "a"))
+    assert two_tier_cache.local.get("a") == 1
+
+    two_tier_cache._handle_message(_message("other", "a"))
+    assert two_tier_cache.local.get("a") is _MISSING
+    assert two_tier_cache.local.get("b") == 2
+
+    two_tier_cache._handle_message(_message("other", "*"))
+    assert len(two_tier_cache.local) == 0
+
+
+def test_two_tier_cache_publishes_without_listener(
+    two_tier_cache: TwoTierCache, redis_client: FakeRedis
+) -> None:
+    two_tier_cache.set("a", 1)
+    two_tier_cache.delete("a")
+
+    # Subscribing failed, but the other processes are still notified
+    assert two_tier_cache._listener is None
+    instance_id = two_tier_cache._instance_id
+    assert redis_client.published == [
+        ("test", f"{instance_id}:a"),
+        ("test", f"{instance_id}:a"),
+    ]
+
+
+def test_two_tier_cache_invalidation_during_read(
+    two_tier_cache: TwoTierCache, redis_client: FakeRedis
+) -> None:
+    two_tier_cache.set("a", 1)
+    two_tier_cache.local.clear()
+
+    def _invalidate() -> None:
+        # Another process writes a new value while the old one is read
+        redis_client.on_read = None
+        two_tier_cache._handle_message(_message("other", "a"))
+
+    redis_client.on_read = _invalidate
+    assert two_tier_cache.get("a") == 1
+    assert two_tier_cache.local.get("a") is _MISSING
+
+    redis_client.on_read = _invalidate
+    assert two_tier_cache.get_many("a") == [1]
+    assert two_tier_cache.local.get("a") is _MISSING
+
+
+def test_two_tier_cache_factory() -> None:
+    app = Flask(__name__)
+    config = {
+        "CACHE_LOCAL_MAX_BYTES": "2048",
+        "CACHE_LOCAL_TIMEOUT": 60,
+        "CACHE_INVALIDATION_CHANNEL": "channel",
+        "CACHE_KEY_PREFIX": "prefix_",
+    }
+
+    cache = TwoTierCache.factory(app, config, [], {})
+
+    assert isinstance(cache, TwoTierCache)
+    assert cache.local.max_bytes == 2048
+    assert cache.local.default_timeout == 60
+    assert cache.channel == "channel"
+    assert cache.key_prefix == "prefix_"
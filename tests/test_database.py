@@ -1,15 +1,38 @@
 from datetime import date, datetime, time, timedelta
+from typing import Generator
 
+import pandas as pd
 import pytest
 from flask import Flask, current_app
 from geo_track_analyzer import PyTrack, Track
-from sqlalchemy import select
-
-from cycle_analytics.database.converter import initialize_overviews
-from cycle_analytics.database.model import Bike, DatabaseTrack, Ride, TerrainType
+from sqlalchemy import delete, select
+
+from cycle_analytics.database.categories import get_category_registry
+from cycle_analytics.database.converter import (
+    convert_ride_overview_container_to_df,
+    convert_ride_overview_frame_to_df,
+    convert_rides_to_df,
+    initialize_overviews,
+)
+from cycle_analytics.database.model import (
+    Bike,
+    DatabaseTrack,
+    EventType,
+    Ride,
+    TerrainType,
+)
 from cycle_analytics.database.model import db as orm_db
 from cycle_analytics.database.modifier import update_track_content
-from cycle_analytics.database.retriever import get_segments_for_map_in_bounds
+from cycle_analytics.database.retriever import (
+    convert_to_indices,
+    get_possible_values,
+    get_ride_and_latest_track_overview,
+    get_ride_and_latest_track_overview_frame,
+    get_rides_df_in_timeframe,
+    get_rides_in_timeframe,
+    get_segments_for_map_in_bounds,
+)
+from cycle_analytics.query_budget import assert_query_budget
 
 
 def test_get_segments_for_map_in_bounds_nothing(app: Flask) -> None:
@@ -181,3 +204,118 @@ def test_updated_track_content_invalid_value(
         db_track = orm_db.session.get(DatabaseTrack, db_track_id)
         assert db_track is not None
         assert not update_track_content(db_track.id, 13873783543517)
+
+
+@pytest.mark.parametrize(
+    ("timeframe", "ride_type"),
+    [("All", "Any"), (datetime.now().year, "Any"), ("All", "MTB")],
+)
+def test_get_rides_df_in_timeframe(
+    app: Flask, timeframe: int | str, ride_type: str
+) -> None:
+    with app.app_context():
+        exp_data = convert_rides_to_df(get_rides_in_timeframe(timeframe, ride_type))
+        data = get_rides_df_in_timeframe(timeframe, ride_type)
+
+    assert not data.empty
+    pd.testing.assert_frame_equal(
+        data.sort_values("id_ride").reset_index(drop=True),
+        exp_data.sort_values("id_ride").reset_index(drop=True),
+        check_dtype=False,
+    )
+
+
+@pytest.fixture()
+def ride_without_bike(app: Flask) -> Generator[int, None, None]:
+    with app.app_context():
+        ride = Ride(
+            ride_date=date(2000, 6, 1),
+            start_time=time(12, 0),
+            total_duration=timedelta(seconds=60 * 60),
+            distance=10,
+            bike=None,  # type: ignore
+            terrain_type=orm_db.session.scalars(select(TerrainType)).first(),
+        )
+        orm_db.session.add(ride)
+        orm_db.session.commit()
+        ride_id = ride.id
+    yield ride_id
+
+    with app.app_context():
+        orm_db.session.execute(delete(Ride).where(Ride.id == ride_id))
+        orm_db.session.commit()
+
+
+def test_get_rides_df_in_timeframe_without_bike(
+    app: Flask, ride_without_bike: int
+) -> None:
+    with app.app_context():
+        exp_data = convert_rides_to_df(get_rides_in_timeframe(2000))
+        with assert_query_budget(max_queries=1):
+            data = get_rides_df_in_timeframe(2000)
+
+    assert data.id_ride.tolist() == [ride_without_bike]
+    assert data.bike.isna().all()
+    pd.testing.assert_frame_equal(data, exp_data, check_dtype=False)
+
+
+@pytest.mark.parametrize(
+    ("timeframe", "ride_type"),
+    [
+        ("All", "Any"),
+        (datetime.now().year, "Any"),
+        ("All", "MTB"),
+        ((date(1990, 1, 1), date(1990, 12, 31)), "Any"),
+    ],
+)
+def test_ride_overview_frame_to_df(
+    app: Flask, timeframe: int | str | tuple[date, date], ride_type: str
+) -> None:
+    with app.app_context():
+        exp_data = convert_ride_overview_container_to_df(
+            get_ride_and_latest_track_overview(timeframe, ride_type)
+        )
+        data = convert_ride_overview_frame_to_df(
+            get_ride_and_latest_track_overview_frame(timeframe, ride_type)
+        )
+
+    assert list(data.columns) == list(exp_data.columns)
+    pd.testing.assert_frame_equal(data, exp_data, check_dtype=False)
+
+
+def test_category_registry(app: Flask) -> None:
+    with app.app_context():
+        terrain_types = orm_db.session.scalars(
+            select(TerrainType).order_by(TerrainType.id)
+        ).all()
+        event_types = orm_db.session.scalars(select(EventType)).all()
+
+        with assert_query_budget(max_queries=0):
+            assert get_possible_values(TerrainType) == [t.text for t in terrain_types]
+            assert convert_to_indices(
+                [terrain_types[1].text, terrain_types[0].text], TerrainType
+            ) == [terrain_types[0].id, terrain_types[1].id]
+            assert convert_to_indices([event_types[0].text], EventType) == [
+                event_types[0].id
+            ]
+            registry = get_category_registry()
+            assert registry.get_text(TerrainType, terrain_types[0].id) == (
+                terrain_types[0].text
+            )
+
+
+def test_category_registry_refresh(app: Flask) -> None:
+    with app.app_context():
+        new_type = TerrainType(text="Registry Test")
+        orm_db.session.add(new_type)
+        orm_db.session.commit()
+        try:
+            # Unknown values are reloaded from the database
+            assert convert_to_indices(["Registry Test"], TerrainType) == [new_type.id]
+            assert "Registry Test" in get_possible_values(TerrainType)
+        finally:
+            orm_db.session.execute(
+                delete(TerrainType).where(TerrainType.text == "Registry Test")
+            )
+            orm_db.session.commit()
+            get_category_registry().load(TerrainType)
@@ -0,0 +1,301 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+import pytest
+from flask import Flask
+from geo_track_analyzer import PyTrack
+from sqlalchemy import event, select
+
+from cycle_analytics import create_app
+from cycle_analytics.database.creator import sync_categorical_values
+from cycle_analytics.database.model import (
+    Bike,
+    DatabaseSegment,
+    DatabaseTrack,
+    Difficulty,
+    Material,
+    Ride,
+    SegmentEffort,
+    SegmentType,
+    TerrainType,
+    TypeSpecification,
+)
+from cycle_analytics.database.model import db as orm_db
+from cycle_analytics.efforts import (
+    EffortSettings,
+    SegmentGeometry,
+    SegmentIndex,
+    TrackPoints,
+    find_efforts,
+    update_ride_efforts,
+)
+from cycle_analytics.leaderboards import get_leaderboard
+from tests.synthetic_data import generate_track
+
+START = datetime(2023, 5, 1, 10)
+
+
+@pytest.fixture(scope="module")
+def ride_points() -> TrackPoints:
+    rng = np.random.default_rng(11)
+    return TrackPoints.from_track(generate_track(rng, (47.5, 8.5), START, 200))
+
+
+def _track(latitudes: np.ndarray, longitudes: np.ndarray) -> PyTrack:
+    return PyTrack(
+        points=list(zip(latitudes.tolist(), longitudes.tolist())),
+        elevations=None,
+        times=[START + timedelta(seconds=5 * i) for i in range(len(latitudes))],
+    )
+
+
+def _segment(points: TrackPoints, start: int, end: int, id: int = 1) -> SegmentGeometry:
+    # Offset of a few meters so the segment does not share the track points
+    return SegmentGeometry(
+        id=id,
+        latitudes=points.latitudes[start:end] + 0.00003,
+        longitudes=points.longitudes[start:end] - 0.00002,
+    )
+
+
+def test_find_efforts(ride_points: TrackPoints) -> None:
+    segment = _segment(ride_points, 50, 121)
+
+    (effort,) = find_efforts(ride_points, [segment], EffortSettings())
+
+    assert effort.id_segment == 1
+    assert (effort.start_idx, effort.end_idx) == (50, 120)
+    assert effort.elapsed_time_seconds == pytest.approx(70 * 5)
+    assert effort.avg_velocity_kmh == pytest.approx(
+        effort.distance / effort.elapsed_time_seconds * 3.6
+    )
+
+
+def test_find_efforts_direction_and_repetition(ride_points: TrackPoints) -> None:
+    segment = _segment(ride_points, 50, 121)
+    reversed_points = TrackPoints(
+        ride_points.latitudes[::-1],
+        ride_points.longitudes[::-1],
+        ride_points.times,
+    )
+    twice = TrackPoints.from_track(
+        _track(
+            np.concatenate([ride_points.latitudes] * 2),
+            np.concatenate([ride_points.longitudes] * 2),
+        )
+    )
+
+    assert find_efforts(reversed_points, [segment], EffortSettings()) == []
+    assert [
+        (e.start_idx, e.end_idx)
+        for e in find_efforts(twice, [segment], EffortSettings())
+    ] == [(50, 120), (250, 320)]
+
+
+def test_find_efforts_detour(ride_points: TrackPoints) -> None:
+    segment = _segment(ride_points, 50, 121)
+    latitudes = ride_points.latitudes.copy()
+    # Shift part of the track by ~100m
+    latitudes[75:95] += 0.001
+    detour = TrackPoints(latitudes, ride_points.longitudes, ride_points.times)
+
+    assert find_efforts(detour, [segment], EffortSettings()) == []
+    assert len(find_efforts(detour, [segment], EffortSettings(max_deviation=150))) == 1
+
+
+def test_find_efforts_without_times(ride_points: TrackPoints) -> None:
+    points = TrackPoints(
+        ride_points.latitudes,
+        ride_points.longitudes,
+        np.full(len(ride_points.times), np.nan),
+    )
+
+    (effort,) = find_efforts(points, [_segment(ride_points, 50, 121)], EffortSettings())
+
+    assert effort.elapsed_time_seconds is None
+    assert effort.avg_velocity_kmh is None
+
+
+def test_segment_index_candidates(ride_points: TrackPoints) -> None:
+    close = _segment(ride_points, 10, 40, id=1)
+    far = SegmentGeometry(
+        id=2, latitudes=close.latitudes + 1, longitudes=close.longitudes
+    )
+    single_point = SegmentGeometry(
+        id=3, latitudes=close.latitudes[:1], longitudes=close.longitudes[:1]
+    )
+    index = SegmentIndex([close, far, single_point], margin=30)
+
+    assert len(index) == 2
+    assert [s.id for s in index.candidates(ride_points.bounds)] == [1]
+
+
+@pytest.fixture()
+def efforts_app(tmp_path: Path, ride_points: TrackPoints) -> Flask:
+    app = create_app(
+        {"FORCE_ENV_FOR_DYNACONF": "testing"},
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'efforts.db'}",
+            "database_schema": None,
+        },
+    )
+    with app.app_context():
+        orm_db.create_all()
+        sync_categorical_values(orm_db)
+        terrain_type = orm_db.session.scalars(select(TerrainType)).first()
+        bike = Bike(
+            name="Bike 1",
+            brand="Brand 1",
+            model="Model 1",
+            material=orm_db.session.scalars(select(Material)).first(),
+            specification=orm_db.session.scalars(select(TypeSpecification)).first(),
+            terrain_type=terrain_type,
+            commission_date=START.date(),
+        )
+        segment = _segment(ride_points, 50, 121)
+        segment_track = PyTrack(
+            points=list(zip(segment.latitudes, segment.longitudes)),
+            elevations=None,
+            times=None,
+        )
+        orm_db.session.add(
+            DatabaseSegment(
+                name="Segment",
+                segment_type=orm_db.session.scalars(select(SegmentType)).first(),
+                difficulty=orm_db.session.scalars(select(Difficulty)).first(),
+                distance=1000,
+                bounds_min_lat=segment.bounds[0],
+                bounds_max_lat=segment.bounds[1],
+                bounds_min_lng=segment.bounds[2],
+                bounds_max_lng=segment.bounds[3],
+                gpx=segment_track.get_xml().encode(),
+            )
+        )
+        for i in range(3):
+            latitudes = ride_points.latitudes
+            if i == 2:
+                # Somewhere else
+                latitudes = latitudes + 0.1
+            orm_db.session.add(
+                Ride(
+                    ride_date=START.date() + timedelta(days=i),
+                    start_time=START.time(),
+                    total_duration=timedelta(seconds=1000),
+                    distance=10,
+                    bike=bike,
+                    terrain_type=terrain_type,
+                    tracks=[
+                        DatabaseTrack(
+                            content=_track(latitudes, ride_points.longitudes)
+                            .get_xml()
+                            .encode(),
+                            added=datetime.now(),
+                            is_enhanced=False,
+                        )
+                    ],
+                )
+            )
+        orm_db.session.commit()
+    return app
+
+
+def _stored_efforts() -> list[tuple[int, int, int]]:
+    return [
+        (e.id_ride, e.start_idx, e.end_idx)
+        for e in orm_db.session.scalars(
+            select(SegmentEffort).order_by(SegmentEffort.id_ride)
+        )
+    ]
+
+
+def test_update_ride_efforts(efforts_app: Flask) -> None:
+    with efforts_app.app_context():
+        ride = orm_db.session.get(Ride, 1)
+        assert ride is not None
+
+        efforts = update_ride_efforts(ride)
+        # Updating again replaces the efforts
+        update_ride_efforts(ride)
+
+        assert len(efforts) == 1
+        assert efforts[0].id_track == ride.tracks[0].id
+        assert _stored_efforts() == [(1, 50, 120)]
+        segment = orm_db.session.get(DatabaseSegment, 1)
+        assert segment is not None
+        assert segment.visited
+
+
+def test_backfill_efforts_command(efforts_app: Flask) -> None:
+    runner = efforts_app.test_cli_runner()
+    args = ["cycle-analytics", "backfill-efforts", "--workers", "2", "--batch-size"]
+
+    result = runner.invoke(args=[*args, "2"])
+    assert result.exit_code == 0, result.output
+    assert "Found 2 efforts in 3 rides" in result.output
+
+    result = runner.invoke(args=[*args, "1", "--ride-id", "2"])
+    assert result.exit_code == 0, result.output
+    assert "Found 1 efforts in 1 rides" in result.output
+
+    with efforts_app.app_context():
+        assert _stored_efforts() == [(1, 50, 120), (2, 50, 120)]
+        assert get_leaderboard(1).n_efforts == 2
+
+
+def test_segment_leaderboard(efforts_app: Flask) -> None:
+    with efforts_app.app_context():
+        rides = [orm_db.session.get(Ride, id_ride) for id_ride in (1, 2)]
+        for ride in rides:
+            assert ride is not None
+            update_ride_efforts(ride)
+        # Replacing the efforts of a ride rebuilds the leaderboards
+        update_ride_efforts(rides[0])
+
+        leaderboard = get_leaderboard(1)
+        assert leaderboard.n_efforts == 2
+        assert [e.id_ride for e in leaderboard.recent] == [1, 2]
+        assert [e.id_ride for e in leaderboard.best] == [1, 2]
+        # Both rides have the same time
+        assert [e.id_ride for e in leaderboard.history] == [1]
+        assert get_leaderboard(1, id_bike=1).n_efforts == 2
+        assert get_leaderboard(1, id_bike=2).n_efforts == 0
+
+    response = efforts_app.test_client().get("/segments/show/1?bike=1")
+    assert response.status_code == 200
+    assert b"Best times" in response.data
+    assert b"2 efforts" in response.data
+
+
+def test_segment_leaderboard_replaced_track(efforts_app: Flask) -> None:
+    with efforts_app.app_context():
+        # Deleting a track with enforced foreign keys must not remove the efforts
+        # before the leaderboards are updated
+        event.listen(
+            orm_db.engine,
+            "connect",
+            lambda connection, _: connection.execute("PRAGMA foreign_keys=ON"),
+        )
+        orm_db.engine.dispose()
+
+        rides = [orm_db.session.get(Ride, id_ride) for id_ride in (1, 2)]
+        for ride in rides:
+            assert ride is not None
+            update_ride_efforts(ride)
+
+        ride = rides[0]
+        assert ride is not None
+        old_track = ride.tracks[0]
+        new_track = DatabaseTrack(
+            content=old_track.content, added=datetime.now(), is_enhanced=True
+        )
+        orm_db.session.delete(old_track)
+        ride.tracks = [new_track]
+        orm_db.session.commit()
+        update_ride_efforts(ride)
+
+        leaderboard = get_leaderboard(1)
+        assert leaderboard.n_efforts == 2
+        assert [e.id_ride for e in leaderboard.recent] == [1, 2]
+        assert _stored_efforts() == [(1, 50, 120), (2, 50, 120)]
@@ -0,0 +1,65 @@
+import csv
+import io
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import select
+
+from cycle_analytics.database.model import DatabaseTrack, Ride
+from cycle_analytics.database.model import db as orm_db
+from cycle_analytics.exporter import MANIFEST_COLUMNS, MANIFEST_NAME
+
+
+def _read_archive(data: bytes) -> tuple[list[dict], zipfile.ZipFile]:
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    manifest = list(csv.DictReader(io.StringIO(archive.read(MANIFEST_NAME).decode())))
+    return manifest, archive
+
+
+def test_download_archive(app: Flask, client: FlaskClient) -> None:
+    response = client.get("/download/archive")
+
+    assert response.status_code == 200
+    assert response.mimetype == "application/zip"
+    assert response.is_streamed
+    manifest, archive = _read_archive(response.data)
+    assert list(manifest[0]) == MANIFEST_COLUMNS
+    with app.app_context():
+        rides = orm_db.session.scalars(select(Ride)).all()
+        assert {int(row["ride_id"]) for row in manifest} == {r.id for r in rides}
+        for row in manifest:
+            if not row["track_id"]:
+                assert not row["file"]
+                continue
+            # Stored content is passed through unchanged
+            track = orm_db.session.get(DatabaseTrack, int(row["track_id"]))
+            assert archive.read(row["file"]) == track.content
+    assert len(archive.namelist()) == 1 + sum(bool(row["file"]) for row in manifest)
+
+
+def test_download_archive_filtered(client: FlaskClient) -> None:
+    this_year = datetime.now().year
+    response = client.get(f"/download/archive?year={this_year}&ride_type=Road")
+
+    manifest, _ = _read_archive(response.data)
+    assert manifest
+    assert all(row["ride_date"].startswith(str(this_year)) for row in manifest)
+    assert all(row["ride_type"] == "Road" for row in manifest)
+
+
+def test_export_command(app: Flask, client: FlaskClient, tmp_path: Path) -> None:
+    output = tmp_path / "export.zip"
+    result = app.test_cli_runner().invoke(
+        args=["cycle-analytics", "export", str(output), "--batch-size", "1"]
+    )
+
+    assert result.exit_code == 0, result.output
+    with output.open("rb") as f:
+        from_cli = f.read()
+    manifest, archive = _read_archive(from_cli)
+    assert archive.testzip() is None
+    expected, _ = _read_archive(client.get("/download/archive").data)
+    assert manifest == expected
@@ -0,0 +1,192 @@
+import gzip
+import struct
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fitparse.records import Crc
+from flask import Flask
+from geo_track_analyzer import PyTrack, Track
+from sqlalchemy import func, select
+
+from cycle_analytics import create_app
+from cycle_analytics.database.creator import sync_categorical_values
+from cycle_analytics.database.model import (
+    Bike,
+    Material,
+    Ride,
+    TerrainType,
+    TrackImport,
+    TypeSpecification,
+)
+from cycle_analytics.database.model import db as orm_db
+from cycle_analytics.importer import iter_source_files
+from tests.synthetic_data import generate_track
+
+
+@pytest.fixture()
+def import_app(tmp_path: Path) -> Flask:
+    app = create_app(
+        {"FORCE_ENV_FOR_DYNACONF": "testing"},
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'import.db'}",
+            "database_schema": None,
+        },
+    )
+    with app.app_context():
+        orm_db.create_all()
+        sync_categorical_values(orm_db)
+        orm_db.session.add(
+            Bike(
+                name="Bike 1",
+                brand="Brand 1",
+                model="Model 1",
+                material=orm_db.session.scalars(select(Material)).first(),
+                specification=orm_db.session.scalars(select(TypeSpecification)).first(),
+                terrain_type=orm_db.session.scalars(select(TerrainType)).first(),
+                commission_date=datetime.now().date(),
+            )
+        )
+        orm_db.session.commit()
+    return app
+
+
+@pytest.fixture()
+def track_dir(tmp_path: Path) -> Path:
+    rng = np.random.default_rng(7)
+    directory = tmp_path / "export"
+    (directory / "activities").mkdir(parents=True)
+    for i in range(3):
+        track = generate_track(
+            rng, (47.5, 8.5), datetime(2023, 5, 1 + i, 10, 0, 0), n_points=50
+        )
+        (directory / "activities" / f"ride_{i}.gpx").write_text(track.get_xml())
+    track = generate_track(rng, (47.5, 8.5), datetime(2023, 6, 1, 10, 0, 0), 50)
+    (directory / "activities" / "ride_3.gpx.gz").write_bytes(
+        gzip.compress(track.get_xml().encode())
+    )
+    no_times = PyTrack(
+        points=[(47.5, 8.5), (47.51, 8.51), (47.52, 8.52)], elevations=None, times=None
+    )
+    (directory / "no_times.gpx").write_text(no_times.get_xml())
+    (directory / "notes.txt").write_text("Not a track")
+    return directory
+
+
+def _encode_fit(track: Track) -> bytes:
+    """Minimal FIT activity file with the positions, elevations and times"""
+    fit_epoch = datetime(1989, 12, 31, tzinfo=timezone.utc)
+    semicircles = 2**31 / 180
+    # Definition of the record message (global number 20) with the field number,
+    # size and base type of timestamp, position_lat, position_long and
+    # enhanced_altitude
+    fields = [(253, 4, 0x86), (0, 4, 0x85), (1, 4, 0x85), (78, 4, 0x86)]
+    data = struct.pack("<BBBHB", 0x40, 0, 0, 20, len(fields))
+    for field in fields:
+        data += struct.pack("<3B", *field)
+    for point in track.track.segments[0].points:
+        data += struct.pack(
+            "<BIiiI",
+            0,
+            int((point.time - fit_epoch).total_seconds()),
+            round(point.latitude * semicircles),
+            round(point.longitude * semicircles),
+            round((point.elevation + 500) * 5),
+        )
+    header = struct.pack("<BBHI4s", 14, 0x10, 2100, len(data), b".FIT")
+    header += struct.pack("<H", Crc.calculate(header))
+    return header + data + struct.pack("<H", Crc.calculate(header + data))
+
+
+def _invoke(app: Flask, source: Path) -> str:
+    result = app.test_cli_runner().invoke(
+        args=[
+            "cycle-analytics",
+            "import",
+            str(source),
+            "--bike",
+            "Bike 1",
+            "--workers",
+            "2",
+            "--batch-size",
+            "2",
+        ]
+    )
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_iter_source_files(track_dir: Path) -> None:
+    names = [name for name, _ in iter_source_files(str(track_dir), ["gpx", "fit"])]
+
+    assert sorted(names) == [
+        "activities/ride_0.gpx",
+        "activities/ride_1.gpx",
+        "activities/ride_2.gpx",
+        "activities/ride_3.gpx",
+        "no_times.gpx",
+    ]
+
+
+def test_import_directory(import_app: Flask, track_dir: Path) -> None:
+    output = _invoke(import_app, track_dir)
+
+    assert "Imported 4 rides, skipped 0 duplicates, 1 failed" in output
+    assert "no_times.gpx: Track has no timestamps" in output
+    with import_app.app_context():
+        rides = orm_db.session.scalars(select(Ride).order_by(Ride.ride_date)).all()
+        assert len(rides) == 4
+        assert [r.ride_date.month for r in rides] == [5, 5, 5, 6]
+        assert all(len(r.tracks) == 1 for r in rides)
+        assert all(r.distance > 0 for r in rides)
+        assert all(r.tracks[0].overviews for r in rides)
+        assert orm_db.session.scalar(select(func.count(TrackImport.content_hash))) == 4
+
+    output = _invoke(import_app, track_dir)
+
+    assert "Imported 0 rides, skipped 4 duplicates, 1 failed" in output
+    with import_app.app_context():
+        assert orm_db.session.scalar(select(func.count(Ride.id))) == 4
+
+
+def test_import_zip(import_app: Flask, track_dir: Path, tmp_path: Path) -> None:
+    archive = tmp_path / "export.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        for path in track_dir.rglob("*"):
+            zf.write(path, path.relative_to(track_dir))
+        # The same file twice in one archive is only imported once
+        zf.write(track_dir / "activities" / "ride_0.gpx", "copy/ride_0.gpx")
+
+    output = _invoke(import_app, archive)
+
+    assert "Imported 4 rides, skipped 1 duplicates, 1 failed" in output
+
+
+def test_import_uppercase_fit(import_app: Flask, tmp_path: Path) -> None:
+    rng = np.random.default_rng(7)
+    track = generate_track(
+        rng, (47.5, 8.5), datetime(2023, 7, 1, 10, tzinfo=timezone.utc), n_points=50
+    )
+    archive = tmp_path / "export.zip"
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("activities/ride.FIT", _encode_fit(track))
+
+    output = _invoke(import_app, archive)
+
+    assert "Imported 1 rides, skipped 0 duplicates, 0 failed" in output
+    with import_app.app_context():
+        (ride,) = orm_db.session.scalars(select(Ride)).all()
+        assert ride.ride_date.month == 7
+        assert ride.distance > 0
+
+
+def test_import_unknown_bike(import_app: Flask, track_dir: Path) -> None:
+    result = import_app.test_cli_runner().invoke(
+        args=["cycle-analytics", "import", str(track_dir), "--bike", "Unknown"]
+    )
+
+    assert result.exit_code != 0
+    assert "No bike with name Unknown" in result.output
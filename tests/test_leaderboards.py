@@ -0,0 +1,65 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from cycle_analytics.leaderboards import (
+    ANY,
+    Leaderboard,
+    LeaderboardEntry,
+    LeaderboardSizes,
+    get_leaderboard_keys,
+)
+
+SIZES = LeaderboardSizes(best=3, recent=4, history=50)
+
+
+def _entry(i: int, seconds: None | float) -> LeaderboardEntry:
+    return LeaderboardEntry(
+        id_effort=i,
+        id_ride=i,
+        ride_date=(date(2023, 1, 1) + timedelta(days=i)).isoformat(),
+        start_time="10:00:00",
+        start_idx=0,
+        elapsed_time_seconds=seconds,
+        avg_velocity_kmh=None if seconds is None else 3600 / seconds,
+    )
+
+
+@pytest.fixture()
+def entries() -> list[LeaderboardEntry]:
+    times = [300, 320, 290, None, 295, 280, 310, 280, 260, 270]
+    return [_entry(i, t) for i, t in enumerate(times)]
+
+
+def test_leaderboard_add(entries: list[LeaderboardEntry]) -> None:
+    leaderboard = Leaderboard()
+    for entry in entries:
+        leaderboard.add(entry, SIZES)
+
+    assert leaderboard.n_efforts == 10
+    assert [e.id_effort for e in leaderboard.best] == [8, 9, 5]
+    assert [e.id_effort for e in leaderboard.recent] == [6, 7, 8, 9]
+    # Equal time does not set a new personal best
+    assert [e.id_effort for e in leaderboard.history] == [0, 2, 5, 8]
+
+
+def test_leaderboard_add_unordered(entries: list[LeaderboardEntry]) -> None:
+    expected = Leaderboard()
+    for entry in entries:
+        expected.add(entry, SIZES)
+
+    rng = random.Random(5)
+    for _ in range(20):
+        shuffled = entries.copy()
+        rng.shuffle(shuffled)
+        leaderboard = Leaderboard()
+        for entry in shuffled:
+            leaderboard.add(entry, SIZES)
+
+        assert leaderboard == expected
+
+
+def test_leaderboard_keys() -> None:
+    assert get_leaderboard_keys(None, 2) == [(ANY, ANY), (ANY, 2)]
+    assert get_leaderboard_keys(1, 2) == [(ANY, ANY), (ANY, 2), (1, ANY), (1, 2)]
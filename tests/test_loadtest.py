@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from werkzeug.serving import make_server
+
+from tests.loadtest import (
+    RouteResult,
+    load_recording,
+    read_access_log,
+    record_requests,
+    redact_body,
+    replay,
+    save_recording,
+)
+
+LOG_LINES = [
+    '10.0.0.1 - - [01/Jun/2024:10:00:00 +0000] "GET /overview/?profile=secret&year=2024 HTTP/1.1" 200 512 "-" "Mozilla/5.0"',  # noqa: E501
+    '10.0.0.1 - - [01/Jun/2024:10:00:00 +0000] "GET /static/style.css HTTP/1.1" 200 512 "-" "Mozilla/5.0"',  # noqa: E501
+    "garbage",
+    '10.0.0.2 - - [01/Jun/2024:10:00:02 +0000] "GET /ride/12/ HTTP/1.1" 200 1024',
+    '10.0.0.2 - - [01/Jun/2024:10:00:03 +0000] "GET /does/not/exist HTTP/1.1" 404 0',
+]
+
+
+def test_read_access_log(app: Flask) -> None:
+    recording = read_access_log(iter(LOG_LINES), app)
+
+    assert [(r.method, r.path, r.route) for r in recording] == [
+        ("GET", "/overview/?year=2024", "/overview/"),
+        ("GET", "/ride/12/", "/ride/<int:id_ride>/"),
+        ("GET", "/does/not/exist", "unmatched"),
+    ]
+    assert [r.delay for r in recording] == [0, 2, 1]
+
+
+@pytest.mark.parametrize(("p", "exp"), [(50, 0.3), (95, 1.0), (99, 1.0), (0, 0.1)])
+def test_route_result_percentile(p: float, exp: float) -> None:
+    result = RouteResult("/", latencies=[1.0, 0.5, 0.1, 0.3])
+    assert result.percentile(p) == exp
+
+
+def test_redact_body() -> None:
+    body = {"name": "Home", "ids": [1, 2], "nested": [{"note": "text", "flag": True}]}
+
+    assert redact_body(body) == {
+        "name": "",
+        "ids": [1, 2],
+        "nested": [{"note": "", "flag": True}],
+    }
+
+
+def test_record_redacts_bodies(app: Flask, client: FlaskClient) -> None:
+    with record_requests(app) as recording:
+        client.post("/events/", data={"title": "Private note"})
+
+    assert recording[0].form == {"title": ""}
+
+
+def test_record_and_replay(app: Flask, client: FlaskClient, tmp_path: str) -> None:
+    with record_requests(app) as recording:
+        client.get("/overview/")
+        client.get("/events/")
+        client.post(
+            "/segments/segments-in-bounds",
+            json={
+                "ids_on_map": [],
+                "ne_latitude": 48.1,
+                "ne_longitude": 7.9,
+                "sw_latitude": 47.9,
+                "sw_longitude": 7.8,
+            },
+        )
+    client.get("/goals/")
+
+    assert [r.route for r in recording] == [
+        "/overview/",
+        "/events/",
+        "/segments/segments-in-bounds",
+    ]
+    assert recording[2].json["ne_latitude"] == 48.1
+
+    path = tmp_path / "recording.jsonl"
+    save_recording(recording, str(path))
+    loaded = load_recording(str(path))
+    assert loaded == recording
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        report = replay(
+            loaded, f"http://127.0.0.1:{server.port}", concurrency=2, iterations=2
+        )
+    finally:
+        server.shutdown()
+
+    assert report.total_requests == 12
+    data = report.to_dict()
+    assert data["errors"] == 0
+    assert {r["route"] for r in data["routes"]} == {
+        "GET /overview/",
+        "GET /events/",
+        "POST /segments/segments-in-bounds",
+    }
+    assert all(r["requests"] == 4 for r in data["routes"])
+    assert "req/s" in report.format()
@@ -0,0 +1,122 @@
+import pytest
+from flask import Flask, redirect, request
+from flask.testing import FlaskClient
+from sqlalchemy import create_engine, text
+from werkzeug import Response
+
+from cycle_analytics.metrics import Histogram, Metrics, init_metrics, metrics
+
+
+def test_histogram() -> None:
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in [0.05, 0.1, 0.5, 2.0]:
+        histogram.observe(value)
+
+    assert histogram.count == 4
+    assert histogram.sum == 2.65
+    assert histogram.cumulative_counts() == [("0.1", 2), ("1.0", 3), ("+Inf", 4)]
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.75) == 1.0
+
+
+def test_render_prometheus() -> None:
+    _metrics = Metrics()
+    _metrics.observe_request("ride.display", "GET", 200, 0.2, queries=1)
+    _metrics.observe_function("module.func", 0.01)
+    _metrics.observe_query("ride.display", 0.001)
+    _metrics.count_cache_access("track_for_ride_12", "hit")
+    _metrics.count_cache_access("track_for_ride_13", "miss")
+
+    text = _metrics.render_prometheus()
+
+    assert (
+        "cycle_analytics_request_duration_seconds_count"
+        '{endpoint="ride.display",method="GET",status="200"} 1'
+    ) in text
+    assert (
+        'cycle_analytics_function_duration_seconds_bucket{function="module.func",'
+        'le="0.01"} 1'
+    ) in text
+    assert (
+        'cycle_analytics_sql_query_duration_seconds_count{endpoint="ride.display"} 1'
+        in text
+    )
+    assert (
+        'cycle_analytics_cache_access_total{family="track_for_ride",result="hit"} 1'
+        in text
+    )
+
+    summary = _metrics.summary()
+    assert summary["requests"][0]["queries_per_request"] == 1
+    assert summary["cache"] == [
+        dict(family="track_for_ride", hit=1, miss=1, stale=0, hit_ratio=0.5)
+    ]
+
+
+def test_request_metrics(client: FlaskClient) -> None:
+    metrics.reset()
+    client.get("/ride/1/")
+
+    summary = metrics.summary()
+    (ride_row,) = [r for r in summary["requests"] if r["endpoint"] == "ride.display"]
+    assert ride_row["count"] == 1
+    assert ride_row["queries_per_request"] > 0
+
+    response = client.get("/metrics")
+    assert 'endpoint="ride.display"' in response.text
+
+
+def test_request_metrics_exception() -> None:
+    app = Flask(__name__)
+    app.config["PROPAGATE_EXCEPTIONS"] = True
+    init_metrics(app)
+
+    @app.route("/fail")
+    def fail() -> str:
+        raise ValueError("Request failed")
+
+    metrics.reset()
+    with pytest.raises(ValueError, match="Request failed"):
+        app.test_client().get("/fail")
+
+    (row,) = metrics.summary()["requests"]
+    assert (row["endpoint"], row["status"], row["count"]) == ("fail", 500, 1)
+
+
+def test_request_metrics_queries_per_status() -> None:
+    app = Flask(__name__)
+    init_metrics(app)
+    engine = create_engine("sqlite://")
+
+    @app.route("/form", methods=["GET", "POST"])
+    def form() -> Response | str:
+        if request.method == "POST":
+            return redirect("/form")
+        with engine.connect() as conn:
+            for _ in range(3):
+                conn.execute(text("SELECT 1"))
+        return "form"
+
+    metrics.reset()
+    client = app.test_client()
+    client.get("/form")
+    client.post("/form")
+    client.post("/form")
+
+    rows = {
+        (r["method"], r["status"]): r["queries_per_request"]
+        for r in metrics.summary()["requests"]
+    }
+    assert rows == {("GET", 200): 3, ("POST", 302): 0}
+
+
+def test_disabled_metrics(client: FlaskClient) -> None:
+    metrics.reset()
+    metrics.enabled = False
+    try:
+        client.get("/ride/1/")
+    finally:
+        metrics.enabled = True
+
+    assert metrics.summary()["functions"] == []
+    assert metrics.summary()["cache"] == []
@@ -0,0 +1,101 @@
+import os
+import pstats
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+
+from cycle_analytics import create_app
+from cycle_analytics.profiling import (
+    LISTING_ENDPOINT,
+    TOKEN_HEADER,
+    create_token,
+    get_profile_dir,
+    list_profiles,
+)
+
+
+@pytest.fixture(scope="module")
+def profiling_app(app: Flask, tmp_path_factory: pytest.TempPathFactory) -> Flask:
+    profiling_app = create_app(
+        {"FORCE_ENV_FOR_DYNACONF": "testing"},
+        {
+            "TESTING": True,
+            "WTF_CSRF_ENABLED": False,
+            "profiling": {
+                "enabled": True,
+                "endpoints": ["events.overview"],
+                "token_max_age": 60,
+            },
+        },
+    )
+    profiling_app.instance_path = str(tmp_path_factory.mktemp("instance"))
+    return profiling_app
+
+
+def test_request_without_token_is_not_profiled(profiling_app: Flask) -> None:
+    client = profiling_app.test_client()
+    response = client.get("/events/", query_string={"profile": "invalid"})
+
+    assert response.status_code == 200
+    assert list_profiles(profiling_app) == []
+
+
+def test_token_is_bound_to_endpoint(profiling_app: Flask) -> None:
+    client = profiling_app.test_client()
+    token = create_token(profiling_app, "goals.overview")
+    response = client.get("/events/", headers={TOKEN_HEADER: token})
+
+    assert response.status_code == 200
+    assert list_profiles(profiling_app) == []
+
+
+def test_profile_request(profiling_app: Flask) -> None:
+    client = profiling_app.test_client()
+    token = create_token(profiling_app, "events.overview")
+    response = client.get("/events/", query_string={"profile": token})
+
+    assert response.status_code == 200
+    profiles = list_profiles(profiling_app)
+    assert len(profiles) == 1
+    assert profiles[0]["name"].endswith("_events.overview.pstats")
+    stats = pstats.Stats(
+        os.path.join(get_profile_dir(profiling_app), profiles[0]["name"])
+    )
+    assert stats.total_calls > 0  # type: ignore
+
+    # Listing and download need a token for the listing
+    assert (
+        client.get("/debug/profiles", query_string={"profile": token}).status_code
+        == 404
+    )
+    listing_token = create_token(profiling_app, LISTING_ENDPOINT)
+    response = client.get("/debug/profiles", query_string={"profile": listing_token})
+    assert response.status_code == 200
+    assert profiles[0]["name"] in response.text
+    response = client.get(
+        f"/debug/profiles/{profiles[0]['name']}",
+        headers={TOKEN_HEADER: listing_token},
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"].startswith("attachment")
+
+
+def test_profiles_disabled(client: FlaskClient) -> None:
+    assert client.get("/debug/profiles").status_code == 404
+
+
+def test_profiling_requires_secret_key() -> None:
+    with pytest.raises(RuntimeError, match="SECRET_KEY"):
+        create_app(
+            {"FORCE_ENV_FOR_DYNACONF": "testing"},
+            {
+                "TESTING": True,
+                "SECRET_KEY": None,
+                "profiling": {
+                    "enabled": True,
+                    "endpoints": ["events.overview"],
+                    "token_max_age": 60,
+                },
+            },
+        )
@@ -0,0 +1,117 @@
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import select
+
+from cycle_analytics import create_app
+from cycle_analytics.database.model import Ride
+from cycle_analytics.database.model import db as orm_db
+from cycle_analytics.query_budget import (
+    QueryBudgetExceededError,
+    assert_query_budget,
+    count_queries,
+    normalize_statement,
+)
+
+
+def _budget_app(**budget: object) -> Flask:
+    return create_app(
+        {"FORCE_ENV_FOR_DYNACONF": "testing"},
+        {
+            "TESTING": True,
+            "WTF_CSRF_ENABLED": False,
+            "query_budget": {
+                "enabled": True,
+                "max_queries": 50,
+                "max_repeats": 10,
+                "action": "raise",
+                "endpoints": {},
+                **budget,
+            },
+        },
+    )
+
+
+@pytest.mark.parametrize(
+    ("statement", "exp_shape"),
+    [
+        ("SELECT a\n  FROM b WHERE c = %(c_1)s", "SELECT a FROM b WHERE c = ?"),
+        ("SELECT a FROM b WHERE c IN (?, ?, ?)", "SELECT a FROM b WHERE c IN (?)"),
+        ("SELECT a FROM b WHERE c = :c_1", "SELECT a FROM b WHERE c = ?"),
+    ],
+)
+def test_normalize_statement(statement: str, exp_shape: str) -> None:
+    assert normalize_statement(statement) == exp_shape
+
+
+def test_count_queries_detects_repeats(app: Flask) -> None:
+    with app.app_context():
+        ids = orm_db.session.execute(select(Ride.id)).scalars().all()[:3]
+        with count_queries() as outer, count_queries() as inner:
+            for id_ride in ids:
+                orm_db.session.execute(
+                    select(Ride).filter(Ride.id == id_ride)
+                ).scalar_one()
+
+    assert inner.count == len(ids)
+    assert outer.count == len(ids)
+    assert inner.most_repeated()[1] == len(ids)
+    assert inner.violations(max_queries=len(ids), max_repeats=len(ids)) == []
+    violations = inner.violations(max_queries=1, max_repeats=1)
+    assert len(violations) == 2
+    assert violations[1].startswith(f"Statement repeated {len(ids)} times")
+
+
+def _run_queries(n: int, max_queries: int) -> None:
+    with assert_query_budget(max_queries=max_queries):
+        for _ in range(n):
+            orm_db.session.execute(select(Ride.id)).all()
+
+
+def test_assert_query_budget(app: Flask) -> None:
+    with app.app_context():
+        _run_queries(1, 1)
+        with pytest.raises(AssertionError, match="2 queries exceed budget of 1"):
+            _run_queries(2, 1)
+
+
+def test_request_query_budget(app: Flask) -> None:
+    client = _budget_app(max_queries=0).test_client()
+    with pytest.raises(QueryBudgetExceededError, match=r"events\.overview"):
+        client.get("/events/")
+
+    client = _budget_app(max_queries=0, endpoints={"events.overview": 5}).test_client()
+    assert client.get("/events/").status_code == 200
+
+
+# Budgets leave some room for the data added by other tests in the session
+@pytest.mark.parametrize(
+    ("route", "max_queries", "max_repeats"),
+    [
+        ("/", 25, 5),
+        ("/overview/", 3, 1),
+        ("/overview/heatmap", 10, 5),
+        ("/events/", 2, 1),
+        ("/goals/", 6, 1),
+        ("/locations/", 1, 1),
+        ("/segments/", 0, 0),
+    ],
+)
+def test_view_query_budget(
+    client: FlaskClient, route: str, max_queries: int, max_repeats: int
+) -> None:
+    with assert_query_budget(max_queries, max_repeats):
+        response = client.get(route)
+    assert response.status_code == 200
+
+
+def test_ride_display_query_budget(app: Flask, client: FlaskClient) -> None:
+    with app.app_context():
+        ride = next(
+            r for r in orm_db.session.execute(select(Ride)).scalars() if r.tracks
+        )
+        id_ride = ride.id
+
+    with assert_query_budget(max_queries=10, max_repeats=3):
+        response = client.get(f"/ride/{id_ride}/")
+    assert response.status_code == 200
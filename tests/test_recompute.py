@@ -0,0 +1,185 @@
+import json
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pytest
+from flask import Flask
+from geo_track_analyzer import ByteTrack
+from sqlalchemy import delete, select
+
+from cycle_analytics import create_app
+from cycle_analytics.database.converter import initialize_overviews
+from cycle_analytics.database.creator import sync_categorical_values
+from cycle_analytics.database.model import DatabaseTrack, TrackOverview
+from cycle_analytics.database.model import db as orm_db
+from cycle_analytics.recompute import (
+    CheckpointMismatchError,
+    RecomputeCheckpoint,
+    get_track_ids,
+    recompute_overviews,
+)
+from tests.synthetic_data import generate_track
+
+
+@pytest.fixture()
+def recompute_app(tmp_path: Path) -> Flask:
+    app = create_app(
+        {"FORCE_ENV_FOR_DYNACONF": "testing"},
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'recompute.db'}",
+            "database_schema": None,
+        },
+    )
+    rng = np.random.default_rng(3)
+    with app.app_context():
+        orm_db.create_all()
+        sync_categorical_values(orm_db)
+        for i in range(3):
+            track = generate_track(rng, (47.5, 8.5), datetime(2023, 5, 1 + i), 40)
+            orm_db.session.add(
+                DatabaseTrack(
+                    content=track.get_xml().encode(),
+                    added=datetime.now(),
+                    is_enhanced=False,
+                    overviews=initialize_overviews(track),
+                )
+            )
+        orm_db.session.commit()
+    return app
+
+
+def _make_stale(app: Flask) -> tuple[int, int]:
+    with app.app_context():
+        first, second, _ = get_track_ids()
+        overview = orm_db.session.scalars(
+            select(TrackOverview).filter(TrackOverview.id_track == first)
+        ).one()
+        overview.moving_time_seconds += 100
+        overview.of_interest = False
+        orm_db.session.execute(
+            delete(TrackOverview).filter(TrackOverview.id_track == second)
+        )
+        orm_db.session.commit()
+    return first, second
+
+
+def test_recompute_overviews_command(recompute_app: Flask, tmp_path: Path) -> None:
+    first, second = _make_stale(recompute_app)
+    checkpoint = tmp_path / "checkpoint.json"
+    runner = recompute_app.test_cli_runner()
+    args = [
+        "cycle-analytics",
+        "recompute-overviews",
+        "--workers",
+        "2",
+        "--batch-size",
+        "2",
+        "--checkpoint",
+        str(checkpoint),
+    ]
+
+    result = runner.invoke(args=[*args, "--dry-run"])
+    assert result.exit_code == 0, result.output
+    assert "Would update 2 of 3 tracks (1 updated, 1 inserted" in result.output
+
+    result = runner.invoke(args=args)
+    assert result.exit_code == 0, result.output
+    assert "Updated 2 of 3 tracks (1 updated, 1 inserted, 0 deleted" in result.output
+    assert "tracks/s" in result.output
+    assert not checkpoint.exists()
+    with recompute_app.app_context():
+        first_track = orm_db.session.get(DatabaseTrack, first)
+        expected = initialize_overviews(ByteTrack(first_track.content))[0]
+        (overview,) = first_track.overviews
+        assert overview.moving_time_seconds == pytest.approx(
+            expected.moving_time_seconds
+        )
+        # Values that are not computed are kept
+        assert not overview.of_interest
+        assert len(orm_db.session.get(DatabaseTrack, second).overviews) == 1
+
+    result = runner.invoke(args=args)
+    assert "Updated 0 of 3 tracks" in result.output
+
+
+def test_recompute_overviews_resume(recompute_app: Flask, tmp_path: Path) -> None:
+    first, _ = _make_stale(recompute_app)
+    checkpoint = tmp_path / "checkpoint.json"
+    checkpoint.write_text(json.dumps({"last_track_id": first, "processed": 1}))
+
+    with recompute_app.app_context():
+        result = recompute_overviews(
+            get_track_ids(), checkpoint_path=str(checkpoint), workers=1
+        )
+
+        assert result.processed == 2
+        assert result.changed_tracks == 1
+        # The first track was skipped and is still stale
+        first_track = orm_db.session.get(DatabaseTrack, first)
+        expected = initialize_overviews(ByteTrack(first_track.content))[0]
+        assert first_track.overviews[0].moving_time_seconds == pytest.approx(
+            expected.moving_time_seconds + 100
+        )
+
+
+def test_recompute_overviews_retry_failed(recompute_app: Flask, tmp_path: Path) -> None:
+    checkpoint = str(tmp_path / "checkpoint.json")
+    with recompute_app.app_context():
+        _, second, _ = get_track_ids()
+        track = orm_db.session.get(DatabaseTrack, second)
+        content = track.content
+        track.content = b"invalid"
+        orm_db.session.commit()
+
+        result = recompute_overviews(get_track_ids(), checkpoint, workers=1)
+
+        assert result.failed == [second]
+        # The checkpoint is kept so the failed track is retried
+        assert RecomputeCheckpoint.load(checkpoint).failed == [second]
+
+        orm_db.session.get(DatabaseTrack, second).content = content
+        orm_db.session.commit()
+        result = recompute_overviews(get_track_ids(), checkpoint, workers=1)
+
+        assert result.processed == 1
+        assert result.failed == []
+        assert not Path(checkpoint).exists()
+
+
+def test_recompute_overviews_selection(recompute_app: Flask, tmp_path: Path) -> None:
+    checkpoint = tmp_path / "checkpoint.json"
+    RecomputeCheckpoint(
+        last_track_id=1, selection={"years": [2022], "track_ids": []}
+    ).save(str(checkpoint))
+
+    with recompute_app.app_context(), pytest.raises(CheckpointMismatchError):
+        recompute_overviews(
+            get_track_ids(),
+            str(checkpoint),
+            workers=1,
+            selection={"years": [], "track_ids": []},
+        )
+
+    runner = recompute_app.test_cli_runner()
+    args = ["cycle-analytics", "recompute-overviews", "--checkpoint", str(checkpoint)]
+    result = runner.invoke(args=args)
+    assert result.exit_code != 0
+    assert "--restart" in result.output
+
+    result = runner.invoke(args=[*args, "--year", "2022"])
+    assert result.exit_code == 0, result.output
+    assert not checkpoint.exists()
+
+
+def test_checkpoint_roundtrip(tmp_path: Path) -> None:
+    path = str(tmp_path / "checkpoint.json")
+    RecomputeCheckpoint(last_track_id=5, processed=5, failed=[2]).save(path)
+
+    assert RecomputeCheckpoint.load(path) == RecomputeCheckpoint(
+        last_track_id=5, processed=5, failed=[2]
+    )
+    assert RecomputeCheckpoint.load(str(tmp_path / "missing.json")) == (
+        RecomputeCheckpoint()
+    )
@@ -3,13 +3,24 @@ from typing import Generator
 import pytest
 from flask import Flask
 from flask.testing import FlaskClient
+from geo_track_analyzer.model import ZoneInterval, Zones
 from pytest_mock import MockerFixture
+from sqlalchemy import delete
 from werkzeug.datastructures import MultiDict
 
 from cycle_analytics import ride
-from cycle_analytics.database.model import Ride, TrackOverview, ride_track
+from cycle_analytics.cache import cache, invalidate_tags
+from cycle_analytics.database.model import (
+    DatabaseZoneInterval,
+    Ride,
+    TrackOverview,
+    ride_track,
+)
 from cycle_analytics.database.model import db as orm_db
+from cycle_analytics.database.modifier import update_zones
+from cycle_analytics.database.retriever import get_zones_for_metric
 from cycle_analytics.utils.base import unwrap
+from cycle_analytics.zones import ZONES_TAG
 
 
 @pytest.fixture()
@@ -131,3 +142,92 @@ def test_visualize_segments(
         follow_redirects=True,
     )
     assert response.status_code == 200
+
+
+def test_ride_plots(
+    client: FlaskClient, ride_id_and_overview_ids: tuple[int, list[int]]
+) -> None:
+    id_ride, _ = ride_id_and_overview_ids
+    response = client.get(f"/ride/{id_ride}/")
+    assert response.status_code == 200
+    # Plots are not part of the page
+    assert b'"layout"' not in response.data
+    assert f"/ride/{id_ride}/plot/elevation".encode() in response.data
+
+    for kind in ["elevation", "slope"]:
+        response = client.get(f"/ride/{id_ride}/plot/{kind}")
+        assert response.status_code == 200
+        assert response.mimetype == "application/json"
+        assert response.json is not None
+        assert {"data", "layout"} <= response.json.keys()
+
+    response = client.get(f"/ride/{id_ride}/plot/elevation?segments=0,1")
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize(
+    ("route", "exp_status_code"),
+    [
+        ("/ride/{id_ride}/plot/map", 404),
+        ("/ride/{id_ride}/plot/elevation?segments=a", 400),
+        ("/ride/100000/plot/elevation", 404),
+    ],
+)
+def test_ride_plots_invalid(
+    client: FlaskClient,
+    ride_id_and_overview_ids: tuple[int, list[int]],
+    route: str,
+    exp_status_code: int,
+) -> None:
+    id_ride, _ = ride_id_and_overview_ids
+    response = client.get(route.format(id_ride=id_ride))
+    assert response.status_code == exp_status_code
+
+
+def test_ride_plots_cached(
+    mocker: MockerFixture,
+    app: Flask,
+    client: FlaskClient,
+    ride_id_and_overview_ids: tuple[int, list[int]],
+) -> None:
+    id_ride, _ = ride_id_and_overview_ids
+    with app.app_context():
+        cache.clear()
+    spy_figure = mocker.spy(ride, "get_plot_figure")
+
+    for _ in range(2):
+        for kind in ["elevation", "heartrate_zones"]:
+            client.get(f"/ride/{id_ride}/plot/{kind}")
+    assert spy_figure.call_count == 2
+
+    client.get(f"/ride/{id_ride}/plot/elevation?segments=0")
+    assert spy_figure.call_count == 3
+
+    with app.app_context():
+        initial_zones = get_zones_for_metric("heartrate")
+        update_zones(
+            Zones(
+                intervals=[
+                    ZoneInterval(start=None, end=100),
+                    ZoneInterval(start=100, end=None),
+                ]
+            ),
+            "heartrate",
+        )
+
+    # Only plots with zones are created again
+    for kind in ["elevation", "heartrate_zones"]:
+        client.get(f"/ride/{id_ride}/plot/{kind}")
+    assert spy_figure.call_count == 4
+
+    with app.app_context():
+        if initial_zones is None:
+            orm_db.session.execute(
+                delete(DatabaseZoneInterval).where(
+                    DatabaseZoneInterval.metric == "heartrate"
+                )
+            )
+            orm_db.session.commit()
+            invalidate_tags(ZONES_TAG)
+        else:
+            update_zones(initial_zones, "heartrate")
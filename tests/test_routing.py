@@ -0,0 +1,160 @@
+import threading
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from pyroutelib3 import Router
+
+from cycle_analytics.routing import RouterCache, get_profile_key, get_router_cache
+
+OSM_DATA = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="47.9684" lon="7.8435"/>
+  <node id="2" lat="47.9686" lon="7.8425"/>
+  <node id="3" lat="47.9689" lon="7.8408"/>
+  <way id="10">
+    <nd ref="1"/>
+    <nd ref="2"/>
+    <nd ref="3"/>
+    <tag k="highway" v="residential"/>
+  </way>
+</osm>
+"""
+
+
+@pytest.fixture()
+def osm_file(tmp_path: Path) -> str:
+    path = tmp_path / "map.osm"
+    path.write_text(OSM_DATA)
+    return str(path)
+
+
+@pytest.fixture()
+def transport() -> dict:
+    return {
+        "name": "Requested",
+        "access": ["access", "vehicle", "bicycle"],
+        "weights": {"residential": 1, "primary": 0.5},
+    }
+
+
+def test_profile_key(transport: dict) -> None:
+    renamed = {**transport, "name": "Other"}
+    reordered = {"weights": transport["weights"], **transport}
+    changed = {**transport, "weights": {"residential": 2, "primary": 0.5}}
+
+    assert get_profile_key(transport) == get_profile_key(renamed)
+    assert get_profile_key(transport) == get_profile_key(reordered)
+    assert get_profile_key(transport) != get_profile_key(changed)
+
+
+def test_router_cache_reuses_router(osm_file: str, transport: dict) -> None:
+    created = []
+
+    def factory(t: str | dict) -> Router:
+        created.append(t)
+        return Router(t, localfile=osm_file)
+
+    cache = RouterCache(factory=factory)
+    with cache.router(transport) as router:
+        status, route = router.doRoute(
+            router.findNode(47.9684, 7.8435), router.findNode(47.9689, 7.8408)
+        )
+        assert status == "success"
+        assert route == [1, 2, 3]
+    with cache.router({**transport, "name": "Second request"}) as second_router:
+        assert second_router is router
+
+    assert len(created) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_router_cache_lru_eviction(transport: dict) -> None:
+    cache = RouterCache(max_size=2, factory=lambda t: Router(t, localfile=None))
+    profiles = [
+        {**transport, "weights": {"residential": weight}} for weight in (1, 2, 3)
+    ]
+    for profile in profiles[:2]:
+        with cache.router(profile):
+            pass
+    # Use the first profile again so the second one is the least recently used
+    with cache.router(profiles[0]):
+        pass
+    with cache.router(profiles[2]):
+        pass
+
+    assert len(cache) == 2
+    assert profiles[0] in cache
+    assert profiles[1] not in cache
+    assert profiles[2] in cache
+
+
+def test_router_cache_locks_router(transport: dict) -> None:
+    cache = RouterCache(factory=lambda t: Router(t))
+    active = []
+    overlaps = []
+
+    def _use() -> None:
+        with cache.router(transport):
+            overlaps.append(bool(active))
+            active.append(1)
+            threading.Event().wait(0.01)
+            active.pop()
+
+    threads = [threading.Thread(target=_use) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == [False] * 4
+    assert cache.misses == 1
+
+
+def test_router_cache_persistence(tmp_path: Path, transport: dict) -> None:
+    directory = str(tmp_path / "routers")
+    cache = RouterCache(directory=directory, factory=Router)
+    with cache.router(transport) as router:
+        # Simulates a downloaded tile
+        router.tiles.add((1, 2))
+        router.rnodes[1] = (47.0, 7.0)
+
+    def _fail(t: str | dict) -> Router:
+        raise AssertionError("Router should be loaded from disk")
+
+    restored_cache = RouterCache(directory=directory, factory=_fail)
+    with restored_cache.router(transport) as restored:
+        assert restored.tiles == {(1, 2)}
+        assert restored.rnodes == {1: (47.0, 7.0)}
+
+    expired_cache = RouterCache(directory=directory, max_age=-1, factory=Router)
+    with expired_cache.router(transport) as new_router:
+        assert new_router.tiles == set()
+
+
+def test_router_cache_drops_failed_router(tmp_path: Path, transport: dict) -> None:
+    directory = tmp_path / "routers"
+    cache = RouterCache(directory=str(directory), factory=Router)
+
+    def _route() -> None:
+        with cache.router(transport) as router:
+            # Simulates a tile that was only partially loaded
+            router.tiles.add((1, 2))
+            raise ConnectionError
+
+    with pytest.raises(ConnectionError):
+        _route()
+
+    assert transport not in cache
+    assert not directory.exists()
+
+    with cache.router(transport) as router:
+        assert router.tiles == set()
+
+
+def test_app_router_cache(app: Flask) -> None:
+    with app.app_context():
+        cache = get_router_cache()
+        assert isinstance(cache, RouterCache)
+        assert cache.max_size == app.config.routing_cache.max_size
+        assert cache.directory is None
@@ -0,0 +1,199 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from flask.testing import FlaskClient
+
+from cycle_analytics import create_app
+from cycle_analytics.routing import get_router_cache
+from cycle_analytics.routing_graph import CompiledRouter, RoutingGraph, compile_graph
+
+OSM_DATA = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  <node id="1" lat="47.9684" lon="7.8435"/>
+  <node id="2" lat="47.9686" lon="7.8425"/>
+  <node id="3" lat="47.9689" lon="7.8408"/>
+  <node id="4" lat="47.9680" lon="7.8420"/>
+  <node id="5" lat="47.9695" lon="7.8415"/>
+  <node id="6" lat="47.9700" lon="7.8450"/>
+  <way id="10">
+    <nd ref="1"/><nd ref="2"/><nd ref="3"/>
+    <tag k="highway" v="residential"/>
+  </way>
+  <way id="11">
+    <nd ref="1"/><nd ref="4"/><nd ref="3"/>
+    <tag k="highway" v="primary_link"/>
+  </way>
+  <way id="12">
+    <nd ref="3"/><nd ref="5"/>
+    <tag k="highway" v="cycleway"/>
+    <tag k="oneway" v="yes"/>
+  </way>
+  <way id="13">
+    <nd ref="5"/><nd ref="1"/>
+    <tag k="highway" v="track"/>
+    <tag k="access" v="private"/>
+  </way>
+  <way id="14">
+    <nd ref="1"/><nd ref="6"/>
+    <tag k="building" v="yes"/>
+  </way>
+</osm>
+"""
+
+POSITIONS = {
+    1: (47.9684, 7.8435),
+    2: (47.9686, 7.8425),
+    3: (47.9689, 7.8408),
+    4: (47.9680, 7.8420),
+    5: (47.9695, 7.8415),
+}
+
+
+@pytest.fixture()
+def graph_file(tmp_path: Path) -> str:
+    osm_file = tmp_path / "map.osm"
+    osm_file.write_text(OSM_DATA)
+    output = str(tmp_path / "map.graph")
+    compile_graph(str(osm_file), output, ["access", "vehicle", "bicycle"])
+    return output
+
+
+def _transport(**weights: float) -> dict:
+    return {
+        "name": "Test",
+        "access": ["access"],
+        "weights": {"residential": 1, "primary": 1, "cycleway": 1, **weights},
+    }
+
+
+def _route(router: CompiledRouter, start: int, end: int) -> tuple[str, list[int]]:
+    """Route between OSM node ids and return the route as OSM node ids"""
+    status, route = router.doRoute(
+        router.findNode(*POSITIONS[start]), router.findNode(*POSITIONS[end])
+    )
+    lookup = {pos: node for node, pos in POSITIONS.items()}
+    return status, [lookup[router.nodeLatLon(node)] for node in route]
+
+
+def test_compile_graph(graph_file: str) -> None:
+    graph = RoutingGraph.load(graph_file)
+
+    # Node 6 is only part of a building
+    assert graph.info.n_nodes == 5
+    # Two directions for ways 10 and 11, one direction for the oneway
+    assert graph.info.n_edges == 2 * 4 + 1
+    assert graph.info.tags == ["residential", "primary", "cycleway"]
+    assert isinstance(graph.edge_target, np.memmap)
+    assert graph.indptr[-1] == graph.info.n_edges
+
+
+def test_compiled_router(graph_file: str) -> None:
+    graph = RoutingGraph.load(graph_file)
+
+    assert _route(graph.router(_transport()), 1, 3) == ("success", [1, 2, 3])
+    assert _route(graph.router(_transport(residential=0)), 1, 3) == (
+        "success",
+        [1, 4, 3],
+    )
+    assert _route(graph.router(_transport()), 1, 5) == ("success", [1, 2, 3, 5])
+    # Oneway and private access
+    assert _route(graph.router(_transport()), 5, 1) == ("no_route", [])
+    assert _route(graph.router(_transport()), 2, 2) == ("success", [2])
+
+
+def test_load_invalid_file(tmp_path: Path) -> None:
+    path = tmp_path / "invalid.graph"
+    path.write_bytes(b"something else")
+
+    with pytest.raises(ValueError, match="not a compiled routing graph"):
+        RoutingGraph.load(str(path))
+
+
+def test_calc_route_with_graph_file(graph_file: str) -> None:
+    app = create_app(
+        {"FORCE_ENV_FOR_DYNACONF": "testing"},
+        {
+            "TESTING": True,
+            "WTF_CSRF_ENABLED": False,
+            "routing_cache": {
+                "max_size": 2,
+                "graph_file": graph_file,
+                "leg_workers": 2,
+            },
+        },
+    )
+    client: FlaskClient = app.test_client()
+
+    response = client.post(
+        "segments/calc-route",
+        headers={"Content-Type": "application/json"},
+        data=json.dumps(
+            {
+                "waypoints": [
+                    list(POSITIONS[1]),
+                    list(POSITIONS[3]),
+                    list(POSITIONS[5]),
+                ],
+                "transport_settings": _transport()["weights"],
+            }
+        ),
+    )
+
+    assert response.status_code == 200
+    assert response.json is not None
+    route = response.json["route"]
+    assert route[0] == pytest.approx(list(POSITIONS[1]))
+    assert route[-1] == pytest.approx(list(POSITIONS[5]))
+    with app.app_context():
+        assert len(get_router_cache()) == 1
+
+
+def test_compile_graph_command(tmp_path: Path) -> None:
+    osm_file = tmp_path / "map.osm"
+    osm_file.write_text(OSM_DATA)
+    output = tmp_path / "map.graph"
+    app = create_app(
+        {"FORCE_ENV_FOR_DYNACONF": "testing"},
+        {"TESTING": True, "WTF_CSRF_ENABLED": False},
+    )
+
+    result = app.test_cli_runner().invoke(
+        args=["cycle-analytics", "compile-graph", str(osm_file), str(output)]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert "Compiled 5 nodes and 9 edges" in result.output
+    assert RoutingGraph.load(str(output)).info.n_nodes == 5
+
+
+def test_find_node(graph_file: str) -> None:
+    graph = RoutingGraph.load(graph_file)
+
+    for lat, lon in POSITIONS.values():
+        node = graph.find_node(lat + 0.00001, lon - 0.00001)
+        assert graph.node_lat[node] == lat
+        assert graph.node_lon[node] == lon
+
+
+def test_route_legs_concurrent(graph_file: str) -> None:
+    router = RoutingGraph.load(graph_file).router(_transport())
+    legs = [
+        (POSITIONS[1], POSITIONS[3]),
+        (POSITIONS[3], POSITIONS[5]),
+        (POSITIONS[5], POSITIONS[1]),
+        (POSITIONS[4], POSITIONS[2]),
+    ]
+
+    sequential = router.route_legs(legs, max_workers=1)
+    concurrent = router.route_legs(legs, max_workers=2)
+
+    assert concurrent == sequential
+    assert [status for status, _ in concurrent] == [
+        "success",
+        "success",
+        "no_route",
+        "success",
+    ]
+    assert concurrent[0][1] == [POSITIONS[1], POSITIONS[2], POSITIONS[3]]
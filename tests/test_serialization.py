@@ -0,0 +1,55 @@
+import pickle
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+from geo_track_analyzer import ByteTrack, PyTrack, Track
+
+from cycle_analytics.database.serialization import (
+    SerializationError,
+    deserialize_track,
+    serialize_track,
+)
+
+
+def test_serialize_track(fr_track: Track) -> None:
+    data = serialize_track(fr_track)
+    track = deserialize_track(data)
+
+    assert len(data) < len(pickle.dumps(fr_track)) / 5
+    assert track.n_segments == fr_track.n_segments
+    pd.testing.assert_frame_equal(track.get_track_data(), fr_track.get_track_data())
+
+
+def test_serialize_track_extensions_and_timezone() -> None:
+    tz = timezone(timedelta(hours=2))
+    orig_track = ByteTrack(
+        PyTrack(
+            points=[(47.99, 7.85), (47.991, 7.851), (47.992, 7.853)],
+            elevations=[300, 301, None],
+            times=[
+                datetime(2023, 8, 1, 10, 0, 0, tzinfo=tz),
+                datetime(2023, 8, 1, 10, 0, 10, tzinfo=tz),
+                datetime(2023, 8, 1, 10, 0, 20, tzinfo=tz),
+            ],
+            heartrate=[120, 130, 140],
+            power=[200, None, 220],
+        )
+        .get_xml()
+        .encode()
+    )
+
+    track = deserialize_track(serialize_track(orig_track))
+
+    assert track.track.segments[0].points[0].time == datetime(
+        2023, 8, 1, 10, 0, 0, tzinfo=tz
+    )
+    pd.testing.assert_frame_equal(track.get_track_data(), orig_track.get_track_data())
+
+
+def test_deserialize_track_version_mismatch(fr_track: Track) -> None:
+    data = bytearray(serialize_track(fr_track))
+    data[4] += 1
+
+    with pytest.raises(SerializationError):
+        deserialize_track(bytes(data))
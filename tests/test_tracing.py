@@ -0,0 +1,118 @@
+from typing import Generator
+
+import pytest
+from flask import Flask
+from sqlalchemy import select
+
+from cycle_analytics import create_app
+from cycle_analytics.database.model import Ride
+from cycle_analytics.database.model import db as orm_db
+from cycle_analytics.tracing import (
+    NonRecordingSpan,
+    Span,
+    _state,
+    get_recent_traces,
+    get_tracer,
+)
+
+
+@pytest.fixture()
+def _tracing_enabled(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(_state, "enabled", True)
+
+
+@pytest.fixture(scope="module")
+def tracing_app(app: Flask) -> Generator[Flask, None, None]:
+    tracing_app = create_app(
+        {"FORCE_ENV_FOR_DYNACONF": "testing"},
+        {
+            "TESTING": True,
+            "WTF_CSRF_ENABLED": False,
+            "tracing": {
+                "enabled": True,
+                "exporter": "none",
+                "file": "traces.jsonl",
+                "n_recent": 10,
+            },
+        },
+    )
+    tracing_app.debug = True
+    yield tracing_app
+    _state.enabled = False
+
+
+def test_tracing_disabled() -> None:
+    tracer = get_tracer(__name__)
+    with tracer.start_as_current_span("disabled") as span:
+        assert isinstance(span, NonRecordingSpan)
+        assert not span.is_recording()
+
+
+@pytest.mark.usefixtures("_tracing_enabled")
+def test_nested_spans() -> None:
+    tracer = get_tracer(__name__)
+
+    with tracer.start_as_current_span("root") as root:
+        with (
+            tracer.start_as_current_span("child", {"key": 1}) as child,
+            pytest.raises(ValueError, match="Error in span"),
+            tracer.start_as_current_span("grandchild"),
+        ):
+            raise ValueError("Error in span")
+        with tracer.start_as_current_span("second_child"):
+            pass
+
+    assert isinstance(root, Span)
+    assert isinstance(child, Span)
+    assert child.parent == root.span_id
+    assert child.attributes == {"key": 1}
+
+    trace = get_recent_traces()[0]
+    assert trace is root.trace
+    assert [s.name for s in trace.spans] == [
+        "grandchild",
+        "child",
+        "second_child",
+        "root",
+    ]
+    assert trace.spans[0].status == "ERROR"
+    assert trace.spans[0].events[0]["name"] == "exception"
+
+    rows = trace.to_waterfall()
+    assert [(r["name"], r["depth"]) for r in rows] == [
+        ("root", 0),
+        ("child", 1),
+        ("grandchild", 2),
+        ("second_child", 1),
+    ]
+    assert rows[0]["offset_pct"] == 0
+    assert rows[0]["width_pct"] == 100
+
+    span_json = root.to_json()
+    assert span_json["parent_id"] is None
+    assert span_json["context"]["trace_id"] == f"0x{trace.trace_id:032x}"
+
+
+def test_request_waterfall(tracing_app: Flask) -> None:
+    with tracing_app.app_context():
+        id_ride = next(
+            r.id for r in orm_db.session.execute(select(Ride)).scalars() if r.tracks
+        )
+    client = tracing_app.test_client()
+    response = client.get(f"/ride/{id_ride}/")
+    assert response.status_code == 200
+
+    trace = get_recent_traces()[0]
+    assert trace.root.name == "GET ride.display"
+    assert trace.root.attributes["http.status_code"] == 200
+    span_names = {s.name for s in trace.spans}
+    assert "load track" in span_names
+    assert "sql" in span_names
+    assert "render ride.html" in span_names
+
+    response = client.get("/debug/traces")
+    assert response.status_code == 200
+
+    response = client.get(f"/debug/traces/{trace.trace_id:032x}")
+    assert response.status_code == 200
+    assert "load track" in response.text
@@ -1,6 +1,7 @@
 from datetime import date
 from typing import Literal
 
+import numpy as np
 import pandas as pd
 import pytest
 from pandas import Timedelta
@@ -8,9 +9,11 @@ from pandas import Timedelta
 from cycle_analytics.utils import (
     compare_values,
     find_closest_elem_to_poi,
+    find_closest_elems_to_pois,
     get_date_range_from_year_month,
 )
 from cycle_analytics.utils.base import format_description, format_seconds
+from cycle_analytics.utils.spatial import KDTree, decode_polyline, encode_polyline
 
 
 @pytest.mark.parametrize(
@@ -80,6 +83,46 @@ def test_find_closest_elem_to_poi(
     assert find_closest_elem_to_poi(data, poi_lat, poi_lng, greedy) == exp_idx
 
 
+def test_find_closest_elem_to_poi_loop() -> None:
+    # The track passes the poi twice and the second pass is closer. Stopping at the
+    # first local minimum would return the first pass.
+    data = pd.DataFrame(
+        {
+            "latitude": [47.0, 47.001, 47.002, 47.003, 47.002, 47.0011, 47.0],
+            "longitude": [7.0, 7.001, 7.002, 7.003, 7.004, 7.0011, 7.0],
+        }
+    )
+
+    assert find_closest_elem_to_poi(data, 47.0011, 7.00105) == 5
+
+
+def test_find_closest_elems_to_pois() -> None:
+    rng = np.random.default_rng(42)
+    data = pd.DataFrame(
+        {
+            "latitude": 47 + rng.uniform(0, 0.1, 2000),
+            "longitude": 7 + rng.uniform(0, 0.1, 2000),
+        }
+    )
+    pois = [(47 + lat, 7 + lng) for lat, lng in rng.uniform(0, 0.1, (20, 2))]
+    scale = np.cos(np.radians(data.latitude.mean()))
+
+    expected = [
+        int(
+            np.argmin(
+                (data.latitude - lat) ** 2 + ((data.longitude - lng) * scale) ** 2
+            )
+        )
+        for lat, lng in pois
+    ]
+
+    assert find_closest_elems_to_pois(data, pois) == expected
+    assert find_closest_elems_to_pois(data, []) == []
+    assert find_closest_elems_to_pois(data.iloc[:0], []) == []
+    with pytest.raises(RuntimeError):
+        find_closest_elems_to_pois(data.iloc[:0], pois)
+
+
 def test_format_descirption_url_single() -> None:
     raw_string = "Some link https://www.domain.com/sub"
     fmt_string = format_description(raw_string)
@@ -142,3 +185,45 @@ def test_format_seconds_zero(
     format: Literal["minimal", "complete", "truncated"],
 ) -> None:
     assert format_seconds(0, to, format) == "0 seconds"
+
+
+@pytest.mark.parametrize("n_points", [1, 10, 1000])
+def test_kdtree(n_points: int) -> None:
+    rng = np.random.default_rng(42)
+    points = rng.uniform(-1, 1, (n_points, 2))
+    tree = KDTree(points, leaf_size=4)
+
+    for query in rng.uniform(-1.2, 1.2, (50, 2)):
+        distance, idx = tree.query(query)
+        distances = np.linalg.norm(points - query, axis=1)
+        assert idx == np.argmin(distances)
+        assert distance == pytest.approx(distances.min())
+
+
+def test_kdtree_empty() -> None:
+    with pytest.raises(ValueError, match="empty tree"):
+        KDTree(np.zeros((0, 2))).query((0, 0))
+
+
+def test_encode_polyline() -> None:
+    # Example of the encoded polyline algorithm documentation
+    assert (
+        encode_polyline(
+            np.array([38.5, 40.7, 43.252]), np.array([-120.2, -120.95, -126.453])
+        )
+        == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    )
+    assert encode_polyline(np.array([]), np.array([])) == ""
+
+
+def test_encode_polyline_roundtrip() -> None:
+    rng = np.random.default_rng(7)
+    latitudes = np.concatenate(([-90, 90], rng.uniform(-90, 90, 500)))
+    longitudes = np.concatenate(([180, -180], rng.uniform(-180, 180, 500)))
+
+    decoded_latitudes, decoded_longitudes = decode_polyline(
+        encode_polyline(latitudes, longitudes)
+    )
+
+    np.testing.assert_allclose(decoded_latitudes, latitudes, atol=5e-6)
+    np.testing.assert_allclose(decoded_longitudes, longitudes, atol=5e-6)
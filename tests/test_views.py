@@ -71,6 +71,8 @@ def test_views_empty_database(
         ("/settings/modify_zones/power", 200),
         ("/settings/modify_zones/cadence", 200),
         ("/settings/modify_zones/velocity", 200),
+        ("/metrics", 200),
+        ("/debug/perf", 200),
     ],
 )
 def test_views(client: FlaskClient, route: str, exp_status_code: int) -> None:
@@ -0,0 +1,34 @@
+from flask import Flask
+from geo_track_analyzer.model import ZoneInterval, Zones
+
+from cycle_analytics.database.modifier import update_zones
+from cycle_analytics.database.retriever import get_zones_for_metric
+from cycle_analytics.zones import EXTENSION_KEY, get_zones, get_zones_version
+
+
+def test_zone_registry(app: Flask) -> None:
+    with app.app_context():
+        registry = app.extensions[EXTENSION_KEY]
+        registry.clear()
+        loads = registry.loads
+        initial_zones = get_zones_for_metric("power")
+        assert initial_zones is not None
+
+        for metric in ["heartrate", "power", "cadence", "velocity"]:
+            assert get_zones(metric) == get_zones_for_metric(metric)
+        assert registry.loads == loads + 1
+
+        version = get_zones_version()
+        zones = Zones(
+            intervals=[
+                ZoneInterval(start=None, end=150),
+                ZoneInterval(start=150, end=None),
+            ]
+        )
+        update_zones(zones, "power")
+        try:
+            assert get_zones_version() != version
+            assert get_zones("power") == get_zones_for_metric("power")
+            assert registry.loads == loads + 2
+        finally:
+            update_zones(initial_zones, "power")